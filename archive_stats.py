@@ -0,0 +1,309 @@
+import os
+import json
+import hashlib
+
+from records import PostRecord
+
+
+# -------------------------
+# Archive statistics (one streaming pass, cached per scrape date)
+# -------------------------
+# `cli.py stats` reads the record store line by line and the image directory once,
+# and folds everything into small count maps per scrape date (the partition):
+#   posts, images, images-per-post counts, caption-length counts, hashtags, bytes per MIME type,
+#   image hashes (for duplicate content across posts) and files/bytes per extension
+#   on disk.
+# Count maps merge by addition, so the report over the whole archive is the sum of
+# the partitions, and percentiles come straight from the length counts.
+#
+# The partitions are cached next to the store (<records>.stats.json) together with
+# the byte offset already read. The store is append-only, so the next run only parses
+# the lines added since. When an added line updates a post that was counted before
+# (uploads published later, a repair), the dates involved are recomputed from the
+# store; when the store was rewritten (reindex), everything is. Image files are
+# grouped by their date prefix (YYYYMMDD_...) and a date is only stat()ed again when
+# its list of file names changed. `--full` ignores the cache.
+
+CACHE_VERSION = 2
+TAIL_CHECK = 4096
+HASH_PREFIX = 16
+
+
+def new_partition():
+    return {"posts": 0, "images": 0, "per_post": {}, "caption": {}, "prompts": 0, "tags": {},
+            "formats": {}, "hashes": {}}
+
+
+def _bump(counts, key, n=1):
+    counts[key] = counts.get(key, 0) + n
+
+
+def add_record(part, record):
+    """Fold one (latest) record into a partition."""
+    part["posts"] += 1
+    part["images"] += len(record.media)
+    _bump(part["per_post"], str(len(record.media)))
+    _bump(part["caption"], str(len(record.caption or "")))
+    if record.prompt:
+        part["prompts"] += 1
+    for tag in record.hashtags:
+        _bump(part["tags"], tag)
+    for m in record.media:
+        fmt = part["formats"].setdefault(m.mime or "unknown", [0, 0])
+        fmt[0] += 1
+        fmt[1] += m.size or 0
+        if m.sha256:
+            h = part["hashes"].setdefault(m.sha256[:HASH_PREFIX], [0, m.size or 0])
+            h[0] += 1
+
+
+def merge_partitions(parts):
+    total = new_partition()
+    for part in parts:
+        total["posts"] += part["posts"]
+        total["images"] += part["images"]
+        total["prompts"] += part["prompts"]
+        for k, n in part["per_post"].items():
+            _bump(total["per_post"], k, n)
+        for k, n in part["caption"].items():
+            _bump(total["caption"], k, n)
+        for k, n in part["tags"].items():
+            _bump(total["tags"], k, n)
+        for k, (n, size) in part["formats"].items():
+            fmt = total["formats"].setdefault(k, [0, 0])
+            fmt[0] += n
+            fmt[1] += size
+        for k, (n, size) in part["hashes"].items():
+            h = total["hashes"].setdefault(k, [0, size])
+            h[0] += n
+    return total
+
+
+def duplicates(part):
+    """(duplicate image copies, bytes they take): every copy of a hash beyond the first."""
+    copies = wasted = 0
+    for n, size in part["hashes"].values():
+        if n > 1:
+            copies += n - 1
+            wasted += (n - 1) * size
+    return copies, wasted
+
+
+def percentile(counts, q):
+    """q-th percentile (0..1) of integer values given as {value: count}."""
+    items = sorted((int(k), n) for k, n in counts.items())
+    total = sum(n for _v, n in items)
+    if not total:
+        return 0
+    rank = q * (total - 1)
+    seen = 0
+    for value, n in items:
+        seen += n
+        if seen > rank:
+            return value
+    return items[-1][0]
+
+
+def record_date(record):
+    return (record.scraped_at or "")[:10] or "unknown"
+
+
+def _file_date(name):
+    prefix = name.split("_", 1)[0]
+    if len(prefix) == 8 and prefix.isdigit():
+        return f"{prefix[:4]}-{prefix[4:6]}-{prefix[6:]}"
+    return "unknown"
+
+
+class ArchiveStats:
+    def __init__(self, records_path, images_dir=None, cache_path=None, full=False):
+        self.records_path = records_path
+        self.images_dir = images_dir
+        self.cache_path = cache_path if cache_path is not None else records_path + ".stats.json"
+        self.cache = None if full else self._load_cache()
+        self.parsed = 0          # store lines parsed by this run
+        self.recomputed = []     # dates rebuilt from the whole store
+        self.dirs_scanned = []   # image dates stat()ed by this run
+
+    def _load_cache(self):
+        if not self.cache_path or not os.path.isfile(self.cache_path):
+            return None
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+        except Exception as e:
+            print(f"Ignoring unreadable stats cache {self.cache_path}: {e}")
+            return None
+        return cache if cache.get("version") == CACHE_VERSION else None
+
+    def _save_cache(self, cache):
+        if not self.cache_path:
+            return
+        tmp = self.cache_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            # dumps() uses the C encoder; dump() to a stream does not
+            f.write(json.dumps(cache, separators=(",", ":")))
+        os.replace(tmp, self.cache_path)
+
+    def _tail_digest(self, f, offset):
+        start = max(0, offset - TAIL_CHECK)
+        f.seek(start)
+        return hashlib.sha1(f.read(offset - start)).hexdigest()
+
+    # -- record store --------------------------------------------------------
+    def _scan_store(self, cache):
+        store = cache["store"]
+        posts = cache["posts"]
+        dates = cache["dates"]
+        dirty = set()
+        if not os.path.isfile(self.records_path):
+            return dirty
+        with open(self.records_path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if store["offset"] and (size < store["offset"] or self._tail_digest(f, store["offset"]) != store["tail"]):
+                # rewritten (reindex, repair): nothing cached can be trusted
+                print("Record store was rewritten; recomputing all statistics")
+                posts.clear()
+                dates.clear()
+                store.update(offset=0, tail="", lines=0)
+            f.seek(store["offset"])
+            offset = store["offset"]
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # a run is still appending this line; pick it up next time
+                offset += len(line)
+                if not line.strip():
+                    continue
+                record = PostRecord.loads(line.decode("utf-8"))
+                self.parsed += 1
+                store["lines"] += 1
+                date = record_date(record)
+                old = posts.get(record.post_key)
+                posts[record.post_key] = date
+                if old is not None:
+                    dirty.update((old, date))
+                elif date not in dirty:
+                    add_record(dates.setdefault(date, new_partition()), record)
+            store["offset"] = offset
+            store["tail"] = self._tail_digest(f, offset)
+        return dirty
+
+    def _recompute(self, cache, dirty):
+        """Rebuild the given dates from the newest line of each of their posts."""
+        posts = cache["posts"]
+        latest = {}
+        remaining = cache["store"]["offset"]
+        with open(self.records_path, "rb") as f:
+            for line in f:
+                remaining -= len(line)
+                if remaining < 0:
+                    break  # appended after the scan; counted next run
+                if not line.strip():
+                    continue
+                record = PostRecord.loads(line.decode("utf-8"))
+                if posts.get(record.post_key) in dirty and record_date(record) == posts[record.post_key]:
+                    latest[record.post_key] = record
+        for date in dirty:
+            cache["dates"][date] = new_partition()
+        for record in latest.values():
+            add_record(cache["dates"][record_date(record)], record)
+        for date in dirty:
+            if not cache["dates"][date]["posts"]:
+                del cache["dates"][date]
+        self.recomputed = sorted(dirty)
+
+    # -- image directory -----------------------------------------------------
+    def _scan_images(self, cache):
+        cached = cache.get("files", {})
+        if not self.images_dir or not os.path.isdir(self.images_dir):
+            cache["files"] = {}
+            return
+        by_date = {}
+        with os.scandir(self.images_dir) as it:
+            for entry in it:
+                if entry.is_file(follow_symlinks=False) and not entry.name.endswith(".tmp"):
+                    by_date.setdefault(_file_date(entry.name), []).append(entry)
+        files = {}
+        for date, entries in by_date.items():
+            names = hashlib.sha1("\n".join(sorted(e.name for e in entries)).encode("utf-8")).hexdigest()
+            if cached.get(date, {}).get("names") == names:
+                files[date] = cached[date]
+                continue
+            ext = {}
+            for e in entries:
+                try:
+                    size = e.stat(follow_symlinks=False).st_size
+                except OSError:
+                    continue
+                slot = ext.setdefault(os.path.splitext(e.name)[1].lower() or "(none)", [0, 0])
+                slot[0] += 1
+                slot[1] += size
+            files[date] = {"names": names, "ext": ext}
+            self.dirs_scanned.append(date)
+        cache["files"] = files
+
+    def compute(self):
+        """Bring the per-date partitions up to date. Returns the cache dict."""
+        cache = self.cache or {"version": CACHE_VERSION, "store": {"offset": 0, "tail": "", "lines": 0},
+                               "posts": {}, "dates": {}, "files": {}}
+        files_before = cache.get("files")
+        dirty = self._scan_store(cache)
+        if dirty:
+            self._recompute(cache, dirty)
+        self._scan_images(cache)
+        if self.parsed or dirty or self.dirs_scanned or cache["files"] != files_before or self.cache is None:
+            self._save_cache(cache)
+        self.cache = cache
+        return cache
+
+
+def partitions_from_records(records):
+    """Partitions for records that are not in a store (CSV fallback; nothing cached)."""
+    dates = {}
+    for r in records:
+        add_record(dates.setdefault(record_date(r), new_partition()), r)
+    return dates
+
+
+def _mb(n):
+    return f"{n / 1024 / 1024:.1f} MB"
+
+
+def print_report(dates, files=None, store_lines=None):
+    total = merge_partitions(dates.values())
+    posts, images = total["posts"], total["images"]
+    if not posts:
+        print("No posts")
+        return
+    copies, wasted = duplicates(total)
+    hashed = sum(n for n, _size in total["hashes"].values())
+    print(f"Posts: {posts}" + (f" ({store_lines} store lines, {store_lines - posts} superseded)" if store_lines else ""))
+    print(f"Images: {images} ({images / posts:.2f} per post)")
+    print("Images per post: " + "  ".join(f"{k}:{n}" for k, n in sorted(total["per_post"].items(), key=lambda kv: int(kv[0]))))
+    print(f"Posts with a prompt: {total['prompts']}")
+    if total["tags"]:
+        top = sorted(total["tags"].items(), key=lambda kv: (-kv[1], kv[0]))[:10]
+        print(f"Hashtags: {len(total['tags'])} distinct; top " + ", ".join(f"#{k} {n}" for k, n in top))
+    if hashed:
+        print(f"Duplicate images: {copies} of {hashed} hashed ({copies / hashed:.1%}), {_mb(wasted)} in repeated copies")
+    cap = total["caption"]
+    print(f"Caption length: empty {cap.get('0', 0)}, median {percentile(cap, 0.5)}, p90 {percentile(cap, 0.9)}, "
+          f"p99 {percentile(cap, 0.99)}, max {percentile(cap, 1.0)}")
+    print("Stored by format:")
+    for mime, (n, size) in sorted(total["formats"].items(), key=lambda kv: -kv[1][1]):
+        print(f"  {mime:<12} {n:>7}  {_mb(size):>10}")
+    if files:
+        ext = {}
+        for entry in files.values():
+            for k, (n, size) in entry["ext"].items():
+                slot = ext.setdefault(k, [0, 0])
+                slot[0] += n
+                slot[1] += size
+        print(f"On disk: {sum(v[0] for v in ext.values())} files, {_mb(sum(v[1] for v in ext.values()))}")
+        for k, (n, size) in sorted(ext.items(), key=lambda kv: -kv[1][1]):
+            print(f"  {k:<12} {n:>7}  {_mb(size):>10}")
+    print("Per scrape date:        posts  images  dup  stored")
+    for date in sorted(dates):
+        part = dates[date]
+        stored = sum(size for _n, size in part["formats"].values())
+        print(f"  {date:<20} {part['posts']:>6} {part['images']:>7} {duplicates(part)[0]:>4}  {_mb(stored):>10}")
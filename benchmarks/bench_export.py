@@ -0,0 +1,76 @@
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from exporters import write_csv_and_xlsx, iter_dataframe_rows
+
+
+# -------------------------
+# Export benchmark: pandas to_csv + to_excel vs streaming writer
+# -------------------------
+#   python benchmarks/bench_export.py --rows 20000
+
+COLUMNS = ["source_url", "text", "image_paths", "num_images", "scraped_at"]
+
+
+def make_rows(n, seed=7):
+    rnd = random.Random(seed)
+    words = ["neon", "forest", "portrait", "cinematic", "watercolor", "prompt", "--ar", "3:4", "#aiart", "lighting"]
+    rows = []
+    for i in range(n):
+        k = rnd.randint(1, 4)
+        rows.append({
+            "source_url": f"https://www.threads.com/@user{i % 97}/post/C{i:08d}",
+            "text": " ".join(rnd.choice(words) for _ in range(rnd.randint(8, 60))),
+            "image_paths": ", ".join(f"pictures/20250101_000000_{i}_{j}.jpg" for j in range(k)),
+            "num_images": k,
+            "scraped_at": "2025-01-01T00:00:00+05:30",
+        })
+    return rows
+
+
+def measure(fn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1024 / 1024
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare pandas and streaming CSV/XLSX export")
+    ap.add_argument("--rows", type=int, default=20000)
+    ap.add_argument("--hyperlinks", action="store_true")
+    args = ap.parse_args()
+
+    import pandas as pd
+    rows = make_rows(args.rows)
+    df = pd.DataFrame(rows, columns=COLUMNS)
+    out = tempfile.mkdtemp(prefix="bench_export_")
+
+    def pandas_export():
+        df.to_csv(os.path.join(out, "pandas.csv"), index=False, encoding="utf-8-sig")
+        df.to_excel(os.path.join(out, "pandas.xlsx"), index=False)
+
+    def streaming_export():
+        write_csv_and_xlsx(iter_dataframe_rows(df), COLUMNS, os.path.join(out, "stream.csv"),
+                           os.path.join(out, "stream.xlsx"),
+                           hyperlink_columns=["source_url", "image_paths"] if args.hyperlinks else None)
+
+    print(f"{args.rows} rows, output in {out}")
+    print(f"{'exporter':<12} {'seconds':>10} {'peak MB':>10}")
+    for name, fn in (("pandas", pandas_export), ("streaming", streaming_export)):
+        secs, peak = measure(fn)
+        print(f"{name:<12} {secs:>10.2f} {peak:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from threads_saved_to_local import make_driver, SAVED_PAGE_URL, CHROME_PROFILE_DIR
+from browser_profiles import SCRAPE_PROFILES, browser_rss_mb
+
+
+# -------------------------
+# Page-load / memory benchmark per scrape profile
+# -------------------------
+# Loads the saved page N times under each profile and reports navigation timing
+# plus the resident memory of the Chrome process tree (requires psutil).
+#
+#   python benchmarks/bench_page_load.py --runs 5
+#   python benchmarks/bench_page_load.py --url https://www.threads.com/saved --use-profile
+
+NAV_TIMING_JS = """
+const n = performance.getEntriesByType('navigation')[0];
+return n ? {dcl: n.domContentLoadedEventEnd, load: n.loadEventEnd, bytes: n.transferSize} : null;
+"""
+RESOURCE_BYTES_JS = "return performance.getEntriesByType('resource').reduce((a, r) => a + (r.transferSize || 0), 0);"
+
+
+def bench_profile(profile, url, runs, use_profile):
+    driver = make_driver(use_profile=use_profile, profile_dir=CHROME_PROFILE_DIR, scrape_profile=profile)
+    loads, dcls, transferred, rss = [], [], [], []
+    try:
+        for _ in range(runs):
+            t0 = time.perf_counter()
+            driver.get(url)
+            wall = (time.perf_counter() - t0) * 1000
+            # let lazy content settle the same way the scrapers do
+            time.sleep(1.0)
+            timing = driver.execute_script(NAV_TIMING_JS) or {}
+            loads.append(timing.get("load") or wall)
+            dcls.append(timing.get("dcl") or wall)
+            transferred.append((driver.execute_script(RESOURCE_BYTES_JS) or 0) + (timing.get("bytes") or 0))
+            mem = browser_rss_mb(driver)
+            if mem is not None:
+                rss.append(mem)
+    finally:
+        driver.quit()
+
+    def avg(xs):
+        return sum(xs) / len(xs) if xs else float("nan")
+
+    return {
+        "profile": profile,
+        "load_ms": avg(loads),
+        "dcl_ms": avg(dcls),
+        "transfer_kb": avg(transferred) / 1024,
+        "rss_mb": avg(rss),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare page-load time and Chrome memory across scrape profiles")
+    ap.add_argument("--url", default=SAVED_PAGE_URL)
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--use-profile", action="store_true", help="reuse the logged-in Chrome profile")
+    args = ap.parse_args()
+
+    rows = [bench_profile(p, args.url, args.runs, args.use_profile) for p in SCRAPE_PROFILES]
+    print(f"{'profile':<12} {'load ms':>10} {'DCL ms':>10} {'xfer KB':>10} {'RSS MB':>10}")
+    for r in rows:
+        print(f"{r['profile']:<12} {r['load_ms']:>10.0f} {r['dcl_ms']:>10.0f} {r['transfer_kb']:>10.0f} {r['rss_mb']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
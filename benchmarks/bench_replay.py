@@ -0,0 +1,86 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+# Replay is local: lift the politeness limits so they do not hide what is being measured
+for _name in ("RATE_PAGE_RPS", "RATE_PAGE_MAX_RPS", "RATE_IMAGE_RPS", "RATE_IMAGE_MAX_RPS",
+              "RATE_UPLOAD_RPS", "RATE_UPLOAD_MAX_RPS"):
+    os.environ.setdefault(_name, "100000")
+os.environ.setdefault("RATE_GLOBAL_RPS", "0")
+
+from replay import Recording, ReplaySession, make_replay_driver
+from media_sinks import MediaPipeline, LocalSink
+from metrics import STAGE_SECONDS
+from scrape_engine import scrape_saved_page
+
+
+# -------------------------
+# Replay benchmark: the scrape engine on a recorded session, no network
+# -------------------------
+#   python cli.py scrape --target local --record recordings/saved_200 --max-posts 200   (once, live)
+#   python benchmarks/bench_replay.py recordings/saved_200 --runs 5
+#   python benchmarks/bench_replay.py recordings/saved_200 --long-list
+#
+# Every run loads the same recorded page in a Chrome that cannot reach the network
+# and scrapes it with the real engine and media pipeline (images come from the
+# recording). Reports wall time per run and where it went, so a change to
+# extraction or scrolling can be compared before/after on identical input.
+
+STAGES = ("extract", "scroll", "store_local")
+
+
+def run_once(driver, recording, args):
+    recording.open(driver, delay_ms=args.delay_ms)
+    before = {s: STAGE_SECONDS.totals(stage=s) for s in STAGES}
+    session = ReplaySession(recording, latency=args.image_latency)
+    out = tempfile.mkdtemp(prefix="bench_replay_")
+    t0 = time.perf_counter()
+    with MediaPipeline(LocalSink(out), workers=args.workers, session=session) as media:
+        results = scrape_saved_page(driver, media, "dom", max_posts=args.max_posts or None, long_list=args.long_list)
+    elapsed = time.perf_counter() - t0
+    stages = {}
+    for s in STAGES:
+        count, total = STAGE_SECONDS.totals(stage=s)
+        stages[s] = (count - before[s][0], total - before[s][1])
+    images = sum(len(r.media) for r in results)
+    return elapsed, len(results), images, len(session.misses), stages
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Time the scrape engine on a recorded saved-page session")
+    ap.add_argument("recording", help="directory written by `cli.py scrape --record`")
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--max-posts", type=int, default=0)
+    ap.add_argument("--long-list", action="store_true")
+    ap.add_argument("--workers", type=int, default=8)
+    ap.add_argument("--delay-ms", type=int, default=0, help="delay before each recorded step appears")
+    ap.add_argument("--image-latency", type=float, default=0.0, help="seconds per replayed image response")
+    ap.add_argument("--visible", action="store_true", help="show the browser")
+    args = ap.parse_args()
+
+    recording = Recording(args.recording)
+    print(f"Recording: {recording.posts} posts in {len(recording.steps)} steps, {len(recording.images)} images "
+          f"(from {recording.manifest.get('source_url')}, {recording.manifest.get('recorded_at')})")
+    driver = make_replay_driver(headless=not args.visible)
+    try:
+        times = []
+        print(f"{'run':>4} {'seconds':>9} {'posts':>6} {'images':>7} {'missing':>8}  " +
+              "  ".join(f"{s + ' ms/n':>16}" for s in STAGES))
+        for i in range(args.runs):
+            secs, posts, images, misses, stages = run_once(driver, recording, args)
+            times.append(secs)
+            per = "  ".join(f"{(t / n * 1000 if n else 0):>11.1f}/{n:<4}" for n, t in (stages[s] for s in STAGES))
+            print(f"{i + 1:>4} {secs:>9.2f} {posts:>6} {images:>7} {misses:>8}  {per}")
+        if len(times) > 1:
+            print(f"median {statistics.median(times):.2f}s  min {min(times):.2f}s  max {max(times):.2f}s")
+    finally:
+        driver.quit()
+
+
+if __name__ == "__main__":
+    main()
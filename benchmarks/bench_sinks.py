@@ -0,0 +1,109 @@
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from media_sinks import MediaPipeline, LocalSink, CloudinarySink, TeeSink, DirectoryUploader
+from records import new_record, digest_bytes, digest_file
+from rate_control import RateController, get_controller
+
+
+# -------------------------
+# Media sink benchmark: one pipeline, three sinks, serial vs threaded
+# -------------------------
+#   python benchmarks/bench_sinks.py --posts 60 --latency 0.05
+#
+# No network or credentials: images are synthetic bytes handed in as "captured"
+# data, and the Cloudinary sink uploads through DirectoryUploader with a fixed
+# per-upload latency. Checks that every item ends up stored with the right hash.
+# Rate limits are lifted unless --rate-limited is given (then uploads are capped by
+# RATE_UPLOAD_RPS / RATE_UPLOAD_MAX_RPS exactly as in a real run).
+# Every 5th post has no /post/ permalink (the saved-page URL, as when the scraper
+# finds no post link), so those posts must still get files of their own.
+
+
+def unlimited_controller():
+    cfg = dict(rate=1e6, min_rate=1e6, max_rate=1e6, target_latency=60.0, increase=0.0)
+    return RateController(limits={name: dict(cfg) for name in ("page", "image", "upload")}, global_rate=0)
+
+
+def make_posts(n, seed=11):
+    rnd = random.Random(seed)
+    posts = []
+    for i in range(n):
+        images = [rnd.randbytes(rnd.randint(20_000, 200_000)) for _ in range(rnd.randint(1, 4))]
+        link = "https://www.threads.com/saved" if i % 5 == 4 else f"https://www.threads.com/@user{i % 13}/post/C{i:08d}"
+        posts.append((link, images))
+    return posts
+
+
+def run_once(sink, posts, workers, rate):
+    records = []
+    t0 = time.perf_counter()
+    with MediaPipeline(sink, workers=workers, rate=rate) as media:
+        for permalink, images in posts:
+            record = new_record(permalink, "caption", "2025-01-01T00:00:00")
+            for j, data in enumerate(images):
+                media.submit(record, f"{permalink}/img{j}.jpg", data=data, content_type="image/jpeg")
+            records.append(record)
+    elapsed = time.perf_counter() - t0
+    return elapsed, records, media
+
+
+def check(records, posts, kind):
+    """Bad items: missing, wrong hash, or (name collision) a file/URL shared with another image."""
+    problems = 0
+    paths, urls = set(), set()
+    for record, (_permalink, images) in zip(records, posts):
+        if len(record.media) != len(images):
+            problems += 1
+            continue
+        for item, data in zip(record.media, images):
+            ok = item.sha256 == digest_bytes(data)[0]
+            if kind in ("local", "tee"):
+                ok = ok and bool(item.path) and item.path not in paths and digest_file(item.path)[0] == item.sha256
+                paths.add(item.path)
+            if kind in ("cloudinary", "tee"):
+                ok = ok and bool(item.remote_url) and item.remote_url not in urls
+                urls.add(item.remote_url)
+            problems += not ok
+    return problems
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare media sinks and worker counts")
+    ap.add_argument("--posts", type=int, default=60)
+    ap.add_argument("--latency", type=float, default=0.05, help="seconds per stand-in Cloudinary upload")
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 8])
+    ap.add_argument("--rate-limited", action="store_true", help="keep the scraper's upload rate limits")
+    args = ap.parse_args()
+
+    posts = make_posts(args.posts)
+    n_images = sum(len(images) for _p, images in posts)
+    total_mb = sum(len(d) for _p, images in posts for d in images) / 1024 / 1024
+    out = tempfile.mkdtemp(prefix="bench_sinks_")
+    print(f"{args.posts} posts, {n_images} images, {total_mb:.1f} MB, output in {out}")
+    print(f"{'sink':<12} {'workers':>8} {'seconds':>10} {'images/s':>10} {'bad':>5}")
+
+    for kind in ("local", "cloudinary", "tee"):
+        for workers in args.workers:
+            rate = get_controller() if args.rate_limited else unlimited_controller()
+            root = os.path.join(out, f"{kind}_{workers}")
+            uploader = DirectoryUploader(os.path.join(root, "cloud"), latency=args.latency)
+            if kind == "local":
+                sink = LocalSink(os.path.join(root, "pictures"))
+            elif kind == "cloudinary":
+                sink = CloudinarySink(uploader, rate=rate)
+            else:
+                sink = TeeSink(LocalSink(os.path.join(root, "pictures")), CloudinarySink(uploader, rate=rate))
+            secs, records, _media = run_once(sink, posts, workers, rate)
+            bad = check(records, posts, kind)
+            print(f"{kind:<12} {workers:>8} {secs:>10.2f} {n_images / secs:>10.0f} {bad:>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from records import RecordStore, new_record
+
+
+# -------------------------
+# Cold-start benchmark for the CLI
+# -------------------------
+# Runs each subcommand in a fresh interpreter N times and reports wall-clock time,
+# next to a bare `import` of each scraper script (what every run used to pay).
+# export/stats/reindex run against a generated record store in a temp dir.
+#
+#   python benchmarks/bench_startup.py --runs 5
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+CLI = os.path.join(ROOT, "cli.py")
+
+
+def make_store(path, n=500):
+    records = []
+    for i in range(n):
+        r = new_record(f"https://www.threads.com/@user{i % 37}/post/C{i:08d}", f"prompt {i}",
+                       f"2025-01-{1 + i % 28:02d}T10:00:00+05:30")
+        for j in range(1 + i % 3):
+            r.add_media(path=f"pictures/{r.media_prefix(j)}.jpg")
+        records.append(r)
+    RecordStore(path).append(records)
+
+
+def time_cmd(cmd, runs, env):
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        proc = subprocess.run(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        times.append(time.perf_counter() - t0)
+        if proc.returncode not in (0, 1):
+            return None, proc.stderr.decode(errors="replace").strip().splitlines()[-1:]
+    return times, None
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Measure cold-start time per CLI subcommand")
+    ap.add_argument("--runs", type=int, default=5)
+    args = ap.parse_args()
+
+    work = tempfile.mkdtemp(prefix="bench_startup_")
+    store = os.path.join(work, "bench.records.jsonl")
+    make_store(store)
+    env = dict(os.environ, OUTPUT_XLSX_LOCAL=os.path.join(work, "bench.xlsx"), RECORDS_PATH=store, PARQUET_DIR="")
+
+    py = sys.executable
+    cases = [
+        ("python -c pass", [py, "-c", "pass"]),
+        ("cli.py --help", [py, CLI, "--help"]),
+        ("cli.py scrape --help", [py, CLI, "scrape", "--help"]),
+        ("cli.py stats", [py, CLI, "stats"]),
+        ("cli.py export --replace", [py, CLI, "export", "--replace"]),
+        ("cli.py reindex", [py, CLI, "reindex"]),
+        ("import threads_saved_to_local", [py, "-c", "import threads_saved_to_local"]),
+        ("import threads_saved_to_cloudinary", [py, "-c", "import threads_saved_to_cloudinary"]),
+    ]
+    print(f"{args.runs} runs each, work dir {work}")
+    print(f"{'command':<36} {'median ms':>10} {'min ms':>10}")
+    for name, cmd in cases:
+        times, err = time_cmd(cmd, args.runs, env)
+        if times is None:
+            print(f"{name:<36} failed: {' '.join(err)}")
+            continue
+        print(f"{name:<36} {statistics.median(times) * 1000:>10.0f} {min(times) * 1000:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
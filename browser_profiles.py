@@ -0,0 +1,93 @@
+import os
+
+from metrics import BROWSER_RSS
+
+
+# -------------------------
+# Scrape profiles
+# -------------------------
+# "interactive": the original behaviour - visible window, every resource loaded.
+# "production": headless, smaller viewport, no image decoding in the browser (the
+# scrapers fetch image URLs themselves) and non-essential resource types blocked
+# through the DevTools protocol.
+PROFILE_INTERACTIVE = "interactive"
+PROFILE_PRODUCTION = "production"
+SCRAPE_PROFILES = (PROFILE_INTERACTIVE, PROFILE_PRODUCTION)
+
+PRODUCTION_WINDOW_SIZE = os.getenv("PRODUCTION_WINDOW_SIZE", "1024,768")
+
+# URL patterns blocked in production mode (Network.setBlockedURLs wildcards).
+# Video/audio, web fonts, analytics/telemetry beacons. Images are NOT blocked here:
+# their URLs must stay in the DOM (src/srcset) and they are simply not decoded.
+BLOCKED_URL_PATTERNS = [
+    # media
+    "*.mp4", "*.mp4?*", "*.webm", "*.webm?*", "*.m3u8", "*.m3u8?*", "*.m4s", "*.m4s?*", "*.mp3", "*.mp3?*",
+    # fonts
+    "*.woff", "*.woff?*", "*.woff2", "*.woff2?*", "*.ttf", "*.ttf?*", "*.otf", "*.otf?*",
+    # analytics / telemetry
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    "*connect.facebook.net*", "*/ajax/bz*", "*/logging_client_events*", "*/falco*",
+]
+
+
+def resolve_profile(profile):
+    profile = (profile or PROFILE_INTERACTIVE).strip().lower()
+    if profile not in SCRAPE_PROFILES:
+        raise ValueError(f"Unknown scrape profile '{profile}'. Expected one of: {', '.join(SCRAPE_PROFILES)}")
+    return profile
+
+
+def apply_production_options(opts, headless=True, load_images=False):
+    """Mutate ChromeOptions in place for the production profile. load_images=True keeps
+    image loading on (needed when media is captured from the browser's network traffic)."""
+    # Drop any window size set by the caller; the production viewport wins
+    opts.arguments[:] = [a for a in opts.arguments if not a.startswith("--window-size")]
+    if headless and "--headless=new" not in opts.arguments:
+        opts.add_argument("--headless=new")
+        opts.add_argument("--disable-gpu")
+    opts.add_argument(f"--window-size={PRODUCTION_WINDOW_SIZE}")
+    # Keep image URLs in the DOM but never fetch/decode them in the browser
+    if not load_images:
+        opts.add_argument("--blink-settings=imagesEnabled=false")
+    opts.add_argument("--mute-audio")
+    opts.add_argument("--autoplay-policy=user-gesture-required")
+    opts.add_argument("--disable-background-networking")
+    opts.add_argument("--disable-background-timer-throttling")
+    opts.add_argument("--disable-renderer-backgrounding")
+    opts.add_argument("--disable-features=Translate,MediaRouter,OptimizationHints")
+    return opts
+
+
+def enable_resource_blocking(driver, patterns=None):
+    """Block non-essential requests for every page this driver loads. Returns True on success."""
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": list(patterns or BLOCKED_URL_PATTERNS)})
+        return True
+    except Exception as e:
+        print(f"Resource blocking unavailable: {e}")
+        return False
+
+
+def finish_driver_setup(driver, profile):
+    """Apply the post-launch parts of a profile (DevTools settings)."""
+    if resolve_profile(profile) == PROFILE_PRODUCTION:
+        enable_resource_blocking(driver)
+    return driver
+
+
+def browser_rss_mb(driver):
+    """Resident memory of the driver's Chrome process tree in MB (None without psutil,
+    or when attached to a browser this process did not start)."""
+    try:
+        import psutil
+    except ImportError:
+        return None
+    try:
+        root = psutil.Process(driver.service.process.pid)
+        procs = [root] + root.children(recursive=True)
+        rss = sum(p.memory_info().rss for p in procs if p.is_running())
+        BROWSER_RSS.set(rss)
+        return rss / 1024 / 1024
+    except Exception:
+        return None
@@ -0,0 +1,159 @@
+from media_variants import DESCRIBE_IMAGE_JS, urls_from_infos
+
+
+# -------------------------
+# Carousel-aware media enumeration (one async script per post)
+# -------------------------
+# A multi-image post renders its slides in a horizontal scroller, and only the
+# slides the page has materialized are in the DOM; the later ones are often lazy
+# (no usable src yet) or not created until the scroller moves. Clicking "next" and
+# sleeping per slide is slow and misses slides when the sleep is too short.
+#
+# CAROUSEL_MEDIA_JS finds the scroller (an element that overflows horizontally and
+# holds media), takes its slides (the children of the innermost single-child track)
+# and describes their images like IMAGE_SOURCES_JS does, reading lazy data-src /
+# data-srcset attributes as well. Only slides that still have no usable URL are
+# visited: the script scrolls the carousel to the slide and waits for the next DOM
+# mutation in the scroller (at most step_wait_ms, usually one frame). If the track
+# ends before the scroll width (virtualized lists), it scrolls to the end of the
+# last known slide until no new slides appear. Slides are ordered by their offset
+# in the track, so the order does not depend on what was rendered when, and the
+# scroll position is restored afterwards. Carousels without a scroller but with a
+# "Next" button are stepped through with the same mutation wait.
+#
+# The result is every image of the post in order: images before the carousel, its
+# slides, images after it. The position in that list is the slide's index in the
+# post record (records.MediaItem.index), so file names stay stable across runs.
+
+CAROUSEL_MEDIA_JS = DESCRIBE_IMAGE_JS + r"""
+const root = arguments[0], maxSlides = arguments[1], stepWaitMs = arguments[2];
+const done = arguments[arguments.length - 1];
+const MEDIA = 'img, video[poster], [style*="background-image"]';
+const httpUrl = v => /^https?:\/\//.test(v || '');
+const describe = el => {
+  if (el.tagName === 'IMG') return describeImg(el);
+  if (el.tagName === 'VIDEO') return {kind: 'video', src: el.getAttribute('poster') || '', srcset: '', sizes: '', width: 0, sources: []};
+  return describeBackground(el);
+};
+const usable = info => info && (httpUrl(info.src) || httpUrl(info.lazy_src) || /https?:\/\//.test(
+  [info.srcset, info.lazy_srcset].concat((info.sources || []).map(s => s.srcset)).join(' ')));
+const mediaIn = el => [...(el.matches(MEDIA) ? [el] : []), ...el.querySelectorAll(MEDIA)].map(describe).filter(Boolean);
+
+// Resolves after the first DOM change under `el` has been painted, or after `cap` ms.
+const changed = (el, cap) => new Promise(resolve => {
+  let finished = false, timer = null;
+  const obs = new MutationObserver(() => requestAnimationFrame(finish));
+  function finish() {
+    if (finished) return;
+    finished = true;
+    obs.disconnect();
+    clearTimeout(timer);
+    resolve();
+  }
+  obs.observe(el, {childList: true, subtree: true, attributes: true, attributeFilter: ['src', 'srcset', 'style', 'poster']});
+  timer = setTimeout(finish, cap);
+});
+
+const findScroller = () => {
+  for (const el of root.querySelectorAll('*')) {
+    if (el.scrollWidth <= el.clientWidth + 8 || !el.querySelector(MEDIA)) continue;
+    if (/(auto|scroll)/.test(getComputedStyle(el).overflowX)) return el;
+  }
+  return null;
+};
+
+async function fromScroller(scroller) {
+  let track = scroller;
+  while (track.children.length === 1) track = track.children[0];
+  const slides = new Map();   // offset in the track -> image descriptions
+  const visited = new Set();
+  const read = () => {
+    const base = track.getBoundingClientRect().left;
+    let end = 0;
+    const pending = [];
+    for (const slide of track.children) {
+      const rect = slide.getBoundingClientRect();
+      if (!rect.width) continue;
+      const pos = Math.round(rect.left - base);
+      end = Math.max(end, pos + rect.width);
+      const infos = mediaIn(slide);
+      if (infos.some(usable)) { if (!slides.has(pos) || !slides.get(pos).some(usable)) slides.set(pos, infos); }
+      else if (!slides.has(pos)) pending.push(pos);
+    }
+    return {pending: pending.filter(p => !visited.has(p)), end: Math.round(end)};
+  };
+  const start = scroller.scrollLeft;
+  let state = read();
+  for (let step = 0; step < maxSlides; step++) {
+    let target = state.pending.length ? state.pending[0] : null;
+    if (target === null && state.end < scroller.scrollWidth - 8 && !visited.has(state.end)) target = state.end;
+    if (target === null) break;
+    visited.add(target);
+    scroller.scrollTo({left: target, behavior: 'instant'});
+    await changed(scroller, stepWaitMs);
+    state = read();
+  }
+  if (scroller.scrollLeft !== start) scroller.scrollTo({left: start, behavior: 'instant'});
+  return [...slides.keys()].sort((a, b) => a - b).slice(0, maxSlides)
+    .map((pos, i) => slides.get(pos).map(info => Object.assign(info, {slide: i})));
+}
+
+async function fromNextButton(button) {
+  const slides = [], seen = new Set();
+  const read = () => {
+    const fresh = mediaIn(root).filter(info => usable(info) && !seen.has(info.src + '|' + info.lazy_src + '|' + info.srcset));
+    fresh.forEach(info => seen.add(info.src + '|' + info.lazy_src + '|' + info.srcset));
+    if (fresh.length) slides.push(fresh.map(info => Object.assign(info, {slide: slides.length})));
+    return fresh.length;
+  };
+  read();
+  while (button && slides.length < maxSlides && !button.disabled && button.getAttribute('aria-disabled') !== 'true') {
+    button.click();
+    await changed(root, stepWaitMs);
+    if (!read()) break;
+    button = root.querySelector(NEXT);
+  }
+  return slides;
+}
+
+const NEXT = 'button[aria-label="Next"], [role="button"][aria-label="Next"]';
+(async () => {
+  const scroller = findScroller();
+  const button = scroller ? null : root.querySelector(NEXT);
+  if (!scroller && !button) return {carousel: '', items: [...root.querySelectorAll(MEDIA)].map(describe).filter(Boolean)};
+  const slides = scroller ? await fromScroller(scroller) : await fromNextButton(button);
+  const box = scroller || root;
+  const items = [];
+  let placed = !scroller;
+  if (!scroller) items.push(...[].concat(...slides));
+  for (const el of root.querySelectorAll(MEDIA)) {
+    if (!box.contains(el)) { items.push(describe(el)); continue; }
+    if (!placed) { items.push(...[].concat(...slides)); placed = true; }
+  }
+  return {carousel: scroller ? 'scroll' : 'next', slides: slides.length, items: items.filter(Boolean)};
+})().then(done, err => done({error: String(err)}));
+"""
+
+
+def carousel_media(driver, elem, max_slides=20, step_wait_ms=250):
+    """Raw result of CAROUSEL_MEDIA_JS for one post container (raises on script errors)."""
+    # the script timeout is driver-wide: put the caller's back afterwards
+    try:
+        previous = driver.timeouts.script
+    except Exception:
+        previous = None
+    driver.set_script_timeout(max_slides * step_wait_ms / 1000 + 5)
+    try:
+        res = driver.execute_async_script(CAROUSEL_MEDIA_JS, elem, max_slides, step_wait_ms) or {}
+    finally:
+        if previous is not None:
+            driver.set_script_timeout(previous)
+    if res.get("error"):
+        raise RuntimeError(f"carousel script failed: {res['error']}")
+    return res
+
+
+def carousel_image_urls(driver, elem, max_slides=20, step_wait_ms=250, policy="max", target_width=1080, min_width=320):
+    """One URL per image of the post, every carousel slide included, in slide order."""
+    res = carousel_media(driver, elem, max_slides, step_wait_ms)
+    return urls_from_infos(res.get("items") or [], policy, target_width, min_width)
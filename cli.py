@@ -0,0 +1,298 @@
+import time
+
+_STARTED = time.perf_counter()
+
+import os
+import sys
+import argparse
+
+
+# -------------------------
+# Unified command line
+# -------------------------
+# One entry point for both scrapers and the offline tools:
+#   python cli.py scrape --target local --max-posts 100 --headless
+#   python cli.py scrape --target cloudinary --daemon
+#   python cli.py export --target local --parquet-dir archive
+#   python cli.py reindex --target local
+#   python cli.py verify --target local --repair
+#   python cli.py upload --target cloudinary
+#   python cli.py stats --target cloudinary
+#
+# Only the standard library is imported up front. Each subcommand imports what it
+# needs when it runs, so `--help`, `stats` or an offline `export` never load
+# selenium, pandas or the Cloudinary SDK. `--timing` prints how long startup took.
+
+TARGETS = {
+    "local": {"module": "threads_saved_to_local", "image_column": "image_paths",
+              "output_env": "OUTPUT_XLSX_LOCAL", "output": "saved_posts_local.xlsx"},
+    "cloudinary": {"module": "threads_saved_to_cloudinary", "image_column": "image_urls",
+                   "output_env": "OUTPUT_XLSX", "output": "saved_posts_cloudinary.xlsx"},
+}
+
+
+def _output_xlsx(target, override=None):
+    t = TARGETS[target]
+    return override or os.getenv(t["output_env"], t["output"])
+
+
+def _records_path(target, override=None):
+    return override or os.getenv("RECORDS_PATH") or _output_xlsx(target).replace(".xlsx", ".records.jsonl")
+
+
+def cmd_scrape(args):
+    # The scripts read their settings from the environment at import time
+    if args.profile:
+        os.environ["SCRAPE_PROFILE"] = args.profile
+    if args.capture:
+        os.environ["CAPTURE_MODE"] = args.capture
+    if args.headless:
+        os.environ["HEADLESS"] = "1"
+    if args.comment_prompts:
+        os.environ["COMMENT_PROMPTS"] = "1"
+    if args.long_list:
+        os.environ["LONG_LIST"] = "1"
+    if args.watchdog:
+        os.environ["DRIVER_WATCHDOG"] = "1"
+    if args.sink:
+        os.environ["MEDIA_SINK"] = args.sink
+    if args.metrics_port:
+        os.environ["METRICS_PORT"] = str(args.metrics_port)
+    if args.record:
+        os.environ["RECORD_DIR"] = args.record
+    import importlib
+    module = importlib.import_module(TARGETS[args.target]["module"])
+    if args.daemon:
+        module.run_daemon(max_posts=args.max_posts or module.DAEMON_MAX_POSTS)
+    else:
+        module.run(headless=module.HEADLESS, max_posts=args.max_posts or 200)
+
+
+def cmd_export(args):
+    from records import RecordStore
+    from exporters import write_csv_and_xlsx, merge_with_existing_csv, append_parquet, csv_columns
+
+    image_col = TARGETS[args.target]["image_column"]
+    store = RecordStore(_records_path(args.target, args.records))
+    records = store.latest()
+    if not records:
+        print(f"No records in {store.path}")
+        return 1
+    rows = [r.to_row(image_col) for r in records]
+    if args.parquet_dir:
+        extra = tuple(c for c in ("account", "prompt") if any(getattr(r, c) for r in records))
+        n = append_parquet(rows, args.parquet_dir, list_columns=(image_col,), extra_columns=extra)
+        print(f"Appended {n} rows to Parquet archive {args.parquet_dir}")
+    xlsx_out = _output_xlsx(args.target, args.output)
+    csv_out = xlsx_out.replace(".xlsx", ".csv")
+    columns = ["source_url", "text", image_col, "num_images", "scraped_at"]
+    if any(r.account for r in records):
+        columns.insert(0, "account")
+    if not args.replace:
+        columns += [c for c in csv_columns(csv_out) if c not in columns]
+    if any(r.prompt for r in records) and "prompt" not in columns:
+        columns.append("prompt")
+    if not args.replace:
+        rows = merge_with_existing_csv(csv_out, rows, key_columns=["source_url", "text", image_col])
+    n = write_csv_and_xlsx(rows, columns, csv_out, xlsx_out,
+                           hyperlink_columns=["source_url", image_col] if args.hyperlinks else None)
+    print(f"Saved {n} total rows to {csv_out} and {xlsx_out}")
+
+
+def _load_records(args):
+    """(store, records): newest record per post from the store, or rebuilt from the CSV
+    when there is no store yet (records is None when neither exists)."""
+    import csv
+    from records import RecordStore, record_from_row, is_post_permalink
+
+    image_col = TARGETS[args.target]["image_column"]
+    store = RecordStore(_records_path(args.target, args.records))
+    if os.path.isfile(store.path):
+        return store, store.latest()
+    csv_path = _output_xlsx(args.target).replace(".xlsx", ".csv")
+    if not os.path.isfile(csv_path):
+        print(f"Neither {store.path} nor {csv_path} exists")
+        return store, None
+    with open(csv_path, newline="", encoding="utf-8-sig") as f:
+        records = {}
+        for i, row in enumerate(csv.DictReader(f)):
+            rec = record_from_row(row, image_col, row_number=i)
+            # only a real permalink identifies a post; other rows all share the saved-page link
+            records[rec.post_key if is_post_permalink(rec.permalink) else ("row", i)] = rec
+    print(f"Seeding {store.path} from {csv_path}")
+    return store, list(records.values())
+
+
+def cmd_reindex(args):
+    """Compact the record store to one (newest) record per post; seed it from the CSV if missing."""
+    from records import digest_file
+
+    store, records = _load_records(args)
+    if records is None:
+        return 1
+    hashed = 0
+    if args.hash:
+        for r in records:
+            for m in r.media:
+                if m.path and not m.sha256 and os.path.isfile(m.path):
+                    m.sha256, m.size = digest_file(m.path)
+                    hashed += 1
+    n = store.rewrite(records)
+    print(f"Wrote {n} records to {store.path}" + (f" ({hashed} images hashed)" if args.hash else ""))
+
+
+def cmd_verify(args):
+    """Check every local image the archive points at; optionally re-download the broken ones."""
+    from media_verify import MediaVerifier
+
+    store, records = _load_records(args)
+    if records is None:
+        return 1
+    verifier = MediaVerifier(workers=args.workers or None, full=args.full,
+                             state_path=args.state or store.path.replace(".jsonl", "") + ".verified.json")
+    problems = verifier.verify(records)
+    print(verifier.summary())
+    for _record, item, status, detail in problems[:args.show]:
+        print(f"  {status:<9} {item.path}  {detail}")
+    if len(problems) > args.show:
+        print(f"  ... and {len(problems) - args.show} more")
+    if args.repair and problems:
+        repaired = verifier.repair(problems)
+        store.rewrite(records)
+        print(f"Repaired {repaired} of {len(problems)} images; record store updated. "
+              f"Run `export --target {args.target}` to refresh the spreadsheet paths.")
+        return 0 if repaired == len(problems) else 2
+    return 2 if problems else 0
+
+
+def cmd_upload(args):
+    """Drain the upload spool; publish the Cloudinary URLs to the record store and sheet as they complete."""
+    from upload_spool import UploadSpool, publish_uploads
+    from media_sinks import make_uploader
+
+    image_col = TARGETS[args.target]["image_column"]
+    spool_dir = args.spool_dir or os.getenv("SPOOL_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "upload_spool")
+    if not os.path.isfile(os.path.join(spool_dir, "spool.db")):
+        print(f"No upload spool in {spool_dir}")
+        return 1
+    spool = UploadSpool(spool_dir, keep_files=args.keep_files)
+    if args.retry_failed:
+        print(f"Re-queued {spool.retry_failed()} failed uploads")
+    print(spool.summary())
+    xlsx_out = _output_xlsx(args.target, args.output)
+    csv_out = xlsx_out.replace(".xlsx", ".csv")
+
+    def publish(jobs):
+        n = publish_uploads(spool, jobs, _records_path(args.target, args.records), csv_out, xlsx_out,
+                            image_column=image_col, hyperlinks=args.hyperlinks)
+        print(f"Published URLs of {n} posts to {csv_out}")
+
+    done = spool.drain(make_uploader(), workers=args.workers, max_attempts=args.max_attempts, on_progress=publish)
+    print(f"Uploaded {len(done)} images")
+    print(spool.summary())
+    left = spool.counts()
+    spool.close()
+    return 2 if left.get("pending") or left.get("failed") else 0
+
+
+def cmd_stats(args):
+    """Archive statistics; only store lines and image dates added since the last run are read."""
+    from archive_stats import ArchiveStats, partitions_from_records, print_report
+
+    path = _records_path(args.target, args.records)
+    images_dir = args.images_dir or os.getenv("IMAGES_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "pictures")
+    if not os.path.isfile(path):
+        _store, records = _load_records(args)
+        if not records:
+            return 1
+        print_report(partitions_from_records(records))
+        return 0
+    stats = ArchiveStats(path, images_dir=images_dir, full=args.full)
+    cache = stats.compute()
+    print_report(cache["dates"], cache["files"], cache["store"]["lines"])
+    print(f"[stats] parsed {stats.parsed} new store lines, recomputed {len(stats.recomputed)} dates, "
+          f"scanned images of {len(stats.dirs_scanned)} dates")
+    return 0
+
+
+def build_parser():
+    ap = argparse.ArgumentParser(prog="cli.py", description="Threads saved posts scraper and archive tools")
+    ap.add_argument("--timing", action="store_true", help="report startup and total time")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    def add_target(p):
+        p.add_argument("--target", choices=sorted(TARGETS), default="local")
+
+    p = sub.add_parser("scrape", help="scrape the saved page (opens a browser)")
+    add_target(p)
+    p.add_argument("--max-posts", type=int, default=0, help="default 200 (50 per cycle in daemon mode)")
+    p.add_argument("--headless", action="store_true")
+    p.add_argument("--profile", choices=["interactive", "production"], help="SCRAPE_PROFILE")
+    p.add_argument("--capture", choices=["dom", "network", "feed"], help="CAPTURE_MODE")
+    p.add_argument("--comment-prompts", action="store_true", help="also read prompts from the author's replies")
+    p.add_argument("--long-list", action="store_true", help="prune harvested posts from the page while scrolling")
+    p.add_argument("--watchdog", action="store_true", help="recycle a hung, crashed or bloated browser and resume (DRIVER_WATCHDOG)")
+    p.add_argument("--sink", choices=["local", "cloudinary", "tee", "spool"], help="MEDIA_SINK (where images are stored)")
+    p.add_argument("--daemon", action="store_true", help="keep polling for new saves")
+    p.add_argument("--metrics-port", type=int, default=0, help="serve /metrics on this port (METRICS_PORT)")
+    p.add_argument("--record", metavar="DIR", help="record the page and images for offline replay instead of scraping")
+    p.set_defaults(func=cmd_scrape)
+
+    p = sub.add_parser("export", help="rewrite CSV/XLSX (and Parquet) from the record store, offline")
+    add_target(p)
+    p.add_argument("--records", help="record store path (default: next to the spreadsheet)")
+    p.add_argument("--output", help="XLSX path; the CSV goes next to it")
+    p.add_argument("--replace", action="store_true", help="do not merge with the existing CSV")
+    p.add_argument("--hyperlinks", action="store_true")
+    p.add_argument("--parquet-dir", default="")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("reindex", help="compact the record store, or build it from the CSV")
+    add_target(p)
+    p.add_argument("--records")
+    p.add_argument("--hash", action="store_true", help="hash local images that have no hash yet")
+    p.set_defaults(func=cmd_reindex)
+
+    p = sub.add_parser("verify", help="check local images (exists, size, header, hash); --repair re-downloads")
+    add_target(p)
+    p.add_argument("--records")
+    p.add_argument("--repair", action="store_true", help="re-download broken images from their source URL")
+    p.add_argument("--full", action="store_true", help="re-check files that passed before and did not change")
+    p.add_argument("--workers", type=int, default=0, help="default 4 per CPU core (max 32)")
+    p.add_argument("--state", help="verify state file (default: next to the record store)")
+    p.add_argument("--show", type=int, default=20, help="problems to list")
+    p.set_defaults(func=cmd_verify)
+
+    p = sub.add_parser("upload", help="upload spooled images to Cloudinary (resumable) and update the sheet")
+    p.add_argument("--target", choices=sorted(TARGETS), default="cloudinary")
+    p.add_argument("--records")
+    p.add_argument("--output", help="XLSX path; the CSV goes next to it")
+    p.add_argument("--spool-dir", help="default: SPOOL_DIR or ./upload_spool")
+    p.add_argument("--workers", type=int, default=4)
+    p.add_argument("--max-attempts", type=int, default=5)
+    p.add_argument("--retry-failed", action="store_true", help="re-queue uploads that gave up earlier")
+    p.add_argument("--keep-files", action="store_true", help="keep spooled files after upload")
+    p.add_argument("--hyperlinks", action="store_true")
+    p.set_defaults(func=cmd_upload)
+
+    p = sub.add_parser("stats", help="archive statistics (cached per scrape date)")
+    add_target(p)
+    p.add_argument("--records")
+    p.add_argument("--images-dir", help="default: IMAGES_DIR or ./pictures")
+    p.add_argument("--full", action="store_true", help="ignore the cache and read everything again")
+    p.set_defaults(func=cmd_stats)
+    return ap
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    ready = time.perf_counter()
+    code = args.func(args)
+    if args.timing:
+        print(f"[timing] startup {(ready - _STARTED) * 1000:.0f} ms, {args.command} total "
+              f"{(time.perf_counter() - _STARTED) * 1000:.0f} ms", file=sys.stderr)
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
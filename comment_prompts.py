@@ -0,0 +1,209 @@
+import re
+import time
+
+from rate_control import get_controller
+
+
+# -------------------------
+# Prompts from the comment thread
+# -------------------------
+# Many posts keep the actual prompt in the author's own reply rather than in the
+# caption. After the saved page has been scraped, each post's detail page is opened
+# and one async script (a single WebDriver round trip) expands the thread a bounded
+# number of times and returns the text of the author's replies.
+#
+# Posts are processed in a few extra tabs at once: navigation is started in every
+# free tab, and each tab is harvested as soon as its page is ready, so page loads
+# overlap instead of running back to back. Every post has a hard time budget.
+
+# arguments: author handle, max expansions, budget ms, done callback
+EXPAND_AND_COLLECT_JS = r"""
+const author = (arguments[0] || '').toLowerCase();
+const maxExpansions = arguments[1];
+const budgetMs = arguments[2];
+const done = arguments[arguments.length - 1];
+const started = Date.now();
+const MORE_RE = /^(view|show|see)\s+(more|all|\d+\s+more|\d+)?\s*(more\s+)?(replies|comments|answers)|^more replies$/i;
+
+function moreButtons() {
+  const out = [];
+  for (const el of document.querySelectorAll('[role="button"], button')) {
+    const t = (el.innerText || '').trim();
+    if (t && t.length < 40 && MORE_RE.test(t) && !el.dataset.psExpanded) out.push(el);
+  }
+  return out;
+}
+
+function waitForChange(ms) {
+  return new Promise(resolve => {
+    const obs = new MutationObserver(() => { obs.disconnect(); clearTimeout(t); setTimeout(resolve, 50); });
+    const t = setTimeout(() => { obs.disconnect(); resolve(); }, ms);
+    obs.observe(document.body, {childList: true, subtree: true});
+  });
+}
+
+function handleOf(container) {
+  const a = container.querySelector('a[href^="/@"]');
+  if (!a) return '';
+  const m = a.getAttribute('href').match(/^\/@([^/?#]+)/);
+  return m ? m[1].toLowerCase() : '';
+}
+
+function bodyText(container) {
+  const parts = [];
+  for (const s of container.querySelectorAll('span[dir="auto"]')) {
+    if (s.closest('a') || s.parentElement.closest('span[dir="auto"]')) continue;
+    const t = (s.innerText || '').trim();
+    if (t) parts.push(t);
+  }
+  return parts.join('\n');
+}
+
+(async () => {
+  let expansions = 0;
+  while (expansions < maxExpansions && Date.now() - started < budgetMs) {
+    const buttons = moreButtons();
+    if (!buttons.length) break;
+    const b = buttons[0];
+    b.dataset.psExpanded = '1';
+    b.click();
+    expansions++;
+    await waitForChange(Math.min(1500, Math.max(0, budgetMs - (Date.now() - started))));
+  }
+  let containers = Array.from(document.querySelectorAll('div[data-pressable-container], article, div[role="article"]'));
+  // innermost containers only; the first one is the post itself (its caption is already saved)
+  containers = containers.filter(c => !containers.some(o => o !== c && c.contains(o)));
+  const replies = [];
+  for (const c of containers.slice(1)) {
+    if (author && handleOf(c) !== author) continue;
+    const t = bodyText(c);
+    if (t && !replies.includes(t)) replies.push(t);
+  }
+  done({replies: replies, expansions: expansions, timed_out: Date.now() - started >= budgetMs});
+})().catch(e => done({replies: [], expansions: 0, timed_out: false, error: String(e)}));
+"""
+
+PROMPT_LABEL_RE = re.compile(r"^\s*prompt\s*[:\-]", re.I | re.M)
+
+
+def author_from_permalink(url):
+    m = re.search(r"/@([^/?#]+)/post/", url or "")
+    return m.group(1) if m else ""
+
+
+def pick_prompt(replies):
+    """Join the author's replies; if some are labelled "Prompt:", keep just those."""
+    labelled = [r for r in replies if PROMPT_LABEL_RE.search(r)]
+    return "\n\n".join(labelled or replies)
+
+
+class CommentPromptExtractor:
+    def __init__(self, driver, tabs=2, max_expansions=5, budget_s=8.0, rate=None):
+        self.driver = driver
+        self.tabs = max(1, int(tabs))
+        self.max_expansions = max_expansions
+        self.budget_s = budget_s
+        self.rate = rate or get_controller()
+        self.stats = {"posts": 0, "with_prompt": 0, "expansions": 0, "timed_out": 0, "errors": 0}
+
+    def _start(self, handle, record):
+        self.driver.switch_to.window(handle)
+        self.rate.acquire("page")
+        self.driver.execute_script("window.location.href = arguments[0];", record.permalink)
+        return time.monotonic()
+
+    def _ready(self, record):
+        try:
+            state, href = self.driver.execute_script("return [document.readyState, location.href]")
+        except Exception:
+            return False
+        # the old page reports "complete" until the navigation commits, so check the URL too;
+        # "interactive" is enough since replies render client-side anyway
+        return state in ("interactive", "complete") and f"/post/{record.slug}" in href
+
+    def _harvest(self, record, started):
+        author = record.author or author_from_permalink(record.permalink)
+        remaining = self.budget_s - (time.monotonic() - started)
+        if remaining <= 0:
+            self.stats["timed_out"] += 1
+            return
+        # the script timeout is driver-wide: put the caller's back afterwards
+        try:
+            previous = self.driver.timeouts.script
+        except Exception:
+            previous = None
+        self.driver.set_script_timeout(remaining + 2)
+        try:
+            res = self.driver.execute_async_script(EXPAND_AND_COLLECT_JS, author, self.max_expansions,
+                                                   int(remaining * 1000)) or {}
+        finally:
+            if previous is not None:
+                self.driver.set_script_timeout(previous)
+        self.rate.observe("page", latency=time.monotonic() - started)
+        self.stats["expansions"] += res.get("expansions", 0)
+        if res.get("timed_out"):
+            self.stats["timed_out"] += 1
+        prompt = pick_prompt(res.get("replies") or [])
+        if prompt:
+            record.prompt = prompt
+            self.stats["with_prompt"] += 1
+
+    def extract(self, records):
+        """Fill record.prompt for every record with a /post/ permalink that has none yet (a
+        "Prompt:" section in the caption wins). Returns the number found."""
+        todo = [r for r in records if "/post/" in (r.permalink or "") and not r.prompt]
+        if not todo:
+            return 0
+        main = self.driver.current_window_handle
+        handles = []
+        try:
+            for _ in range(min(self.tabs, len(todo))):
+                self.driver.switch_to.new_window("tab")
+                handles.append(self.driver.current_window_handle)
+            busy = {}
+            pending = list(reversed(todo))
+            while pending or busy:
+                for h in handles:
+                    if h not in busy and pending:
+                        rec = pending.pop()
+                        try:
+                            busy[h] = (rec, self._start(h, rec))
+                        except Exception as e:
+                            self.stats["errors"] += 1
+                            print(f"Could not open {rec.permalink}: {e}")
+                progressed = False
+                for h, (rec, started) in list(busy.items()):
+                    try:
+                        self.driver.switch_to.window(h)
+                        if self._ready(rec):
+                            self._harvest(rec, started)
+                        elif time.monotonic() - started > self.budget_s:
+                            self.stats["timed_out"] += 1
+                        else:
+                            continue
+                    except Exception as e:
+                        self.stats["errors"] += 1
+                        self.rate.observe("page", ok=False)
+                        print(f"Comment extraction failed for {rec.permalink}: {e}")
+                    self.stats["posts"] += 1
+                    del busy[h]
+                    progressed = True
+                if not progressed:
+                    time.sleep(0.05)
+        finally:
+            for h in handles:
+                try:
+                    self.driver.switch_to.window(h)
+                    self.driver.close()
+                except Exception:
+                    pass
+            try:
+                self.driver.switch_to.window(main)
+            except Exception:
+                pass
+        return self.stats["with_prompt"]
+
+    def summary(self):
+        s = self.stats
+        return (f"Comment prompts | posts={s['posts']} with_prompt={s['with_prompt']} "
+                f"expansions={s['expansions']} timed_out={s['timed_out']} errors={s['errors']}")
@@ -0,0 +1,104 @@
+import os
+import csv
+import time
+import random
+from datetime import datetime
+
+from metrics import CYCLES, ERRORS, LAST_SUCCESS, STAGE_SECONDS
+
+
+# -------------------------
+# Incremental scraping + scheduler
+# -------------------------
+# The saved page lists newest saves first. An incremental cycle reloads the page,
+# scrolls only until the first already-archived post shows up and processes all the
+# posts above it (no max_posts cap: the next cycle stops at the newest post of this
+# one, so anything left out would never be archived). Only /post/ permalinks count
+# as archived; a row whose link is the saved page or the author's profile says
+# nothing about which post it was. run_forever repeats that every `interval` seconds (+/- jitter)
+# on one long-lived browser, so each cycle costs a page load and a few scrolls.
+
+# Post permalink per container: prefer a /post/ link over the author's profile link
+POST_LINKS_JS = """
+return arguments[0].map(e => {
+  const a = e.querySelector("a[href*='/post/']") || e.querySelector('a');
+  return a ? a.href : '';
+});
+"""
+
+
+def normalize_post_key(url):
+    """Stable key for a post URL: no query/fragment, no trailing slash, threads.net == threads.com."""
+    if not url:
+        return ""
+    url = str(url).split("#")[0].split("?")[0].rstrip("/")
+    return url.replace("://www.threads.net/", "://www.threads.com/").replace("://threads.net/", "://www.threads.com/")
+
+
+def load_known_keys(csv_path, column="source_url"):
+    """Permalink keys of the posts already in the archive CSV (read with the csv module; no pandas needed)."""
+    keys = set()
+    if not csv_path or not os.path.isfile(csv_path):
+        return keys
+    try:
+        with open(csv_path, newline="", encoding="utf-8-sig") as f:
+            for row in csv.DictReader(f):
+                k = normalize_post_key(row.get(column))
+                if "/post/" in k:
+                    keys.add(k)
+    except Exception as e:
+        print(f"Could not read known posts from {csv_path}: {e}")
+    return keys
+
+
+def post_links(driver, elems):
+    try:
+        return driver.execute_script(POST_LINKS_JS, elems) or []
+    except Exception:
+        return []
+
+
+def first_known_index(links, known_keys):
+    """Index of the first post already archived, or None."""
+    if not known_keys:
+        return None
+    for i, link in enumerate(links):
+        key = normalize_post_key(link)
+        if "/post/" in key and key in known_keys:
+            return i
+    return None
+
+
+def run_forever(cycle, interval=600, jitter=60, max_cycles=None, max_backoff=3600):
+    """Call cycle() every interval +/- jitter seconds until interrupted. Failing cycles back off
+    exponentially (capped at max_backoff) instead of hammering the site."""
+    n = 0
+    failures = 0
+    while max_cycles is None or n < max_cycles:
+        n += 1
+        started = time.time()
+        print(f"[{datetime.now().isoformat(timespec='seconds')}] Cycle {n} starting")
+        try:
+            cycle()
+            failures = 0
+            CYCLES.inc(outcome="ok")
+            LAST_SUCCESS.set(time.time())
+        except KeyboardInterrupt:
+            raise
+        except Exception as e:
+            failures += 1
+            CYCLES.inc(outcome="failed")
+            ERRORS.inc(reason="cycle")
+            print(f"Cycle {n} failed: {e}")
+        STAGE_SECONDS.observe(time.time() - started, stage="cycle")
+        if max_cycles is not None and n >= max_cycles:
+            break
+        delay = interval + random.uniform(-jitter, jitter)
+        if failures:
+            delay = min(max_backoff, interval * (2 ** failures))
+        else:
+            # interval is measured start-to-start
+            delay -= time.time() - started
+        delay = max(1.0, delay)
+        print(f"Next cycle in {delay:.0f}s")
+        time.sleep(delay)
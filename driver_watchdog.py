@@ -0,0 +1,153 @@
+import threading
+
+from browser_profiles import browser_rss_mb
+from metrics import DRIVER_RECYCLES, ERRORS
+
+
+# -------------------------
+# Driver watchdog (recycle a slow, bloated or dead browser mid-run)
+# -------------------------
+# Over a multi-hour backfill Chrome keeps growing and eventually hangs or crashes;
+# without this, every post after the crash just fails. The watchdog owns the driver
+# and is asked between posts whether it is still fit:
+#   - every `check_every` posts: a `return 1` ping that must answer within
+#     ping_timeout seconds (run in a thread, a hung browser cannot block it), and the
+#     browser's RSS against max_rss_mb;
+#   - after `recycle_posts` posts on one browser (0 = never);
+#   - immediately when an error says the session is gone, or after max_errors
+#     failed posts in a row that a ping confirms.
+# recycle() quits the browser (killing the process tree if quit() hangs), starts a new
+# one with the factory and lets reopen() restore the session and open the saved page
+# again. The media pipeline is not tied to the browser, so queued downloads keep going;
+# the scrape engine skips the posts it already has and carries on (scrape_engine.
+# scrape_with_watchdog).
+
+FATAL_MARKERS = ("invalid session id", "no such window", "chrome not reachable", "disconnected",
+                 "target crashed", "tab crashed", "session deleted", "connection refused",
+                 "max retries exceeded", "timed out receiving message from renderer")
+
+
+class RecycleNeeded(Exception):
+    """Raised by the engine to leave a segment so the watchdog can replace the driver."""
+
+
+def is_fatal_driver_error(err):
+    text = f"{type(err).__name__}: {err}".lower()
+    return "invalidsessionid" in text or any(m in text for m in FATAL_MARKERS)
+
+
+def _call_with_timeout(fn, timeout):
+    """(ok, value) of fn() run in a daemon thread; ok is False on error or timeout."""
+    box = {}
+
+    def target():
+        try:
+            box["value"] = fn()
+        except Exception as e:
+            box["error"] = e
+
+    t = threading.Thread(target=target, name="watchdog-call", daemon=True)
+    t.start()
+    t.join(timeout)
+    if t.is_alive() or "error" in box:
+        return False, box.get("error")
+    return True, box.get("value")
+
+
+def kill_driver(driver, timeout=10.0):
+    """quit() the driver; if that hangs or fails, kill chromedriver and its browsers."""
+    ok, _ = _call_with_timeout(driver.quit, timeout)
+    if ok:
+        return
+    try:
+        import psutil
+        root = psutil.Process(driver.service.process.pid)
+        for p in root.children(recursive=True) + [root]:
+            try:
+                p.kill()
+            except Exception:
+                pass
+    except Exception as e:
+        print(f"Could not kill the browser process tree: {e}")
+
+
+class DriverWatchdog:
+    def __init__(self, factory, reopen=None, driver=None, capture_factory=None, capture=None, recycle_posts=500,
+                 max_rss_mb=2500.0, ping_timeout=20.0, check_every=10, max_errors=3, max_recycles=20):
+        self.factory = factory
+        self.reopen = reopen
+        self.capture_factory = capture_factory
+        self.recycle_posts = recycle_posts
+        self.max_rss_mb = max_rss_mb
+        self.ping_timeout = ping_timeout
+        self.check_every = max(1, check_every)
+        self.max_errors = max_errors
+        self.max_recycles = max_recycles
+        self.driver = driver if driver is not None else factory()
+        self.capture = capture if capture is not None or capture_factory is None else capture_factory(self.driver)
+        self.posts = 0           # posts handled on the current browser
+        self.errors = 0          # consecutive failed posts
+        self.recycles = []       # "kind: detail", in order
+
+    def ping(self):
+        ok, value = _call_with_timeout(lambda: self.driver.execute_script("return 1"), self.ping_timeout)
+        return ok and value == 1
+
+    def check(self, force=False):
+        """(kind, detail) if the browser should be replaced before the next post, else None.
+        The ping and RSS checks run every check_every posts, or now with force."""
+        if self.recycle_posts and self.posts >= self.recycle_posts:
+            return "posts", f"{self.posts} posts on this browser"
+        if not force and self.posts % self.check_every:
+            return None
+        if not self.ping():
+            return "unresponsive", f"no answer within {self.ping_timeout:.0f}s"
+        if self.max_rss_mb:
+            rss = browser_rss_mb(self.driver)
+            if rss is not None and rss > self.max_rss_mb:
+                return "rss", f"browser RSS {rss:.0f} MB > {self.max_rss_mb:.0f} MB"
+        return None
+
+    def note_ok(self):
+        self.posts += 1
+        self.errors = 0
+
+    def note_error(self, err):
+        """Count a failed post. Returns (kind, detail) if the browser must be replaced now, else None."""
+        self.posts += 1
+        self.errors += 1
+        if is_fatal_driver_error(err):
+            return "session_lost", str(err).strip().splitlines()[0][:120] if str(err).strip() else type(err).__name__
+        if self.errors >= self.max_errors and not self.ping():
+            return "unresponsive", f"{self.errors} failed posts in a row"
+        return None
+
+    @property
+    def exhausted(self):
+        return self.max_recycles is not None and len(self.recycles) >= self.max_recycles
+
+    def recycle(self, kind, detail=""):
+        """Replace the browser. Returns the new driver."""
+        rss = browser_rss_mb(self.driver)
+        print(f"Recycling the browser after {self.posts} posts ({kind}: {detail})" + (f", RSS {rss:.0f} MB" if rss else ""))
+        DRIVER_RECYCLES.inc(reason=kind)
+        self.recycles.append(f"{kind}: {detail}")
+        kill_driver(self.driver)
+        self.driver = self.factory()
+        self.capture = self.capture_factory(self.driver) if self.capture_factory is not None else None
+        self.posts = 0
+        self.errors = 0
+        if self.reopen is not None:
+            try:
+                self.reopen(self.driver)
+            except Exception as e:
+                ERRORS.inc(reason="reopen")
+                print(f"Reopening the saved page after recycling failed: {e}")
+        return self.driver
+
+    def close(self):
+        kill_driver(self.driver)
+
+    def summary(self):
+        return f"Watchdog | recycles={len(self.recycles)} posts on current browser={self.posts}" + \
+            ("".join(f"\n  {i + 1}. {r}" for i, r in enumerate(self.recycles)))
@@ -0,0 +1,253 @@
+import os
+import csv
+import math
+
+
+# -------------------------
+# Streaming CSV + XLSX export
+# -------------------------
+# Rows are written to the CSV and to a write-only (constant memory) openpyxl
+# workbook in the same pass, so the whole sheet never has to be built in memory.
+# Both files are written to a temp name first and swapped in at the end, so an
+# interrupted export never leaves a half-written spreadsheet behind.
+
+LIST_SEPARATOR = ", "
+
+
+def _cell_value(v):
+    if v is None:
+        return ""
+    if isinstance(v, float) and math.isnan(v):
+        return ""
+    if isinstance(v, (list, tuple)):
+        return LIST_SEPARATOR.join(str(x) for x in v)
+    return v
+
+
+def _first_link(v):
+    """Hyperlink target for a cell: first URL or local path in the value."""
+    if isinstance(v, (list, tuple)):
+        v = v[0] if v else ""
+    v = str(v or "").split(LIST_SEPARATOR)[0].strip()
+    if not v:
+        return ""
+    if v.startswith(("http://", "https://")):
+        return v
+    if os.path.isabs(v) or os.path.exists(v):
+        return "file:///" + os.path.abspath(v).replace("\\", "/").lstrip("/")
+    return ""
+
+
+def write_csv_and_xlsx(rows, columns, csv_path, xlsx_path=None, hyperlink_columns=None, sheet_title="posts"):
+    """Write an iterable of dict rows to CSV and (optionally) XLSX in one pass. List values are
+    joined with ", ". hyperlink_columns: columns whose first URL/path becomes a clickable link.
+    Returns the number of rows written."""
+    hyperlink_columns = set(hyperlink_columns or ())
+    csv_tmp = csv_path + ".tmp"
+    xlsx_tmp = (xlsx_path + ".tmp") if xlsx_path else None
+
+    wb = ws = link_style = None
+    if xlsx_path:
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet(title=sheet_title)
+        ws.append(list(columns))
+        link_style = "Hyperlink"
+
+    n = 0
+    try:
+        with open(csv_tmp, "w", newline="", encoding="utf-8-sig") as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            for row in rows:
+                values = [_cell_value(row.get(c)) for c in columns]
+                writer.writerow(values)
+                if ws is not None:
+                    if hyperlink_columns:
+                        cells = []
+                        for c, v in zip(columns, values):
+                            link = _first_link(row.get(c)) if c in hyperlink_columns else ""
+                            if link:
+                                cell = WriteOnlyCell(ws, value=v)
+                                cell.hyperlink = link
+                                cell.style = link_style
+                                cells.append(cell)
+                            else:
+                                cells.append(v)
+                        ws.append(cells)
+                    else:
+                        ws.append(values)
+                n += 1
+        if wb is not None:
+            wb.save(xlsx_tmp)
+            os.replace(xlsx_tmp, xlsx_path)
+        os.replace(csv_tmp, csv_path)
+    finally:
+        for tmp in (csv_tmp, xlsx_tmp):
+            if tmp and os.path.exists(tmp):
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+    return n
+
+
+def merge_with_existing_csv(csv_path, new_rows, key_columns):
+    """Yield rows of the existing CSV (if any) followed by new_rows, dropping old rows whose
+    key_columns match a new row (keep-last de-dup, like drop_duplicates(keep="last"))."""
+    new_rows = list(new_rows)
+
+    def key(row):
+        return tuple(str(_cell_value(row.get(c))) for c in key_columns)
+
+    new_keys = {key(r) for r in new_rows}
+    if os.path.isfile(csv_path):
+        with open(csv_path, newline="", encoding="utf-8-sig") as f:
+            for row in csv.DictReader(f):
+                if key(row) not in new_keys:
+                    yield row
+    for r in new_rows:
+        yield r
+
+
+def csv_row_key(source_url, scraped_at=""):
+    """Identifies one post's row: its /post/ permalink, else its link plus scrape time
+    (rows of posts without a permalink all share the saved-page or profile link)."""
+    from daemon import normalize_post_key
+    url = normalize_post_key(source_url)
+    return url if "/post/" in url else f"{url}|{scraped_at or ''}"
+
+
+def patch_csv_rows(csv_path, patches, key_column="source_url", key=str, row_key=None):
+    """Yield the existing CSV's rows, updating the ones whose key(row[key_column]) is in
+    `patches` ({key: {column: value}}) in place. Rows keep their order. With row_key, the
+    key is row_key(source_url, scraped_at) instead."""
+    if not os.path.isfile(csv_path):
+        return
+    with open(csv_path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            if row_key is not None:
+                k = row_key(row.get("source_url") or "", row.get("scraped_at") or "")
+            else:
+                k = key(row.get(key_column) or "")
+            update = patches.get(k)
+            if update:
+                row.update(update)
+            yield row
+
+
+def csv_columns(csv_path):
+    """Header of an existing CSV ([] if there is none)."""
+    if not os.path.isfile(csv_path):
+        return []
+    with open(csv_path, newline="", encoding="utf-8-sig") as f:
+        return next(csv.reader(f), [])
+
+
+def iter_dataframe_rows(df):
+    """Yield dict rows from a DataFrame without materializing df.to_dict('records')."""
+    cols = list(df.columns)
+    for values in df.itertuples(index=False, name=None):
+        yield dict(zip(cols, values))
+
+
+# -------------------------
+# Columnar archive (Parquet, partitioned by scrape date)
+# -------------------------
+# Typed columns instead of comma-joined strings: list<string> for images and a real
+# UTC timestamp for scraped_at. Each run appends new part files under
+# <root>/scrape_date=YYYY-MM-DD/, so earlier runs are never rewritten.
+
+def _parse_timestamp(value):
+    from datetime import datetime, timezone
+    if isinstance(value, datetime):
+        ts = value
+    else:
+        try:
+            ts = datetime.fromisoformat(str(value))
+        except ValueError:
+            return None
+    if ts.tzinfo is None:
+        # utcnow() timestamps from the Cloudinary script are naive UTC
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts
+
+
+def _as_list(v):
+    if v is None or (isinstance(v, float) and math.isnan(v)):
+        return []
+    if isinstance(v, (list, tuple)):
+        return [str(x) for x in v]
+    return [p.strip() for p in str(v).split(",") if p.strip()]
+
+
+def append_parquet(rows, root_dir, list_columns=("image_paths",), extra_columns=()):
+    """Append rows to a hive-partitioned Parquet dataset under root_dir. Requires pyarrow.
+    Returns the number of rows written."""
+    try:
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+    except ImportError:
+        raise RuntimeError("Parquet export requires pyarrow: pip install pyarrow")
+    import uuid
+    from datetime import timezone
+
+    list_columns = list(list_columns)
+    cols = {"source_url": [], "text": [], "num_images": [], "scraped_at": [], "scrape_date": []}
+    for c in list_columns:
+        cols[c] = []
+    for c in extra_columns:
+        cols[c] = []
+
+    for row in rows:
+        ts = _parse_timestamp(row.get("scraped_at"))
+        cols["source_url"].append(str(_cell_value(row.get("source_url"))))
+        cols["text"].append(str(_cell_value(row.get("text"))))
+        for c in list_columns:
+            cols[c].append(_as_list(row.get(c)))
+        num = row.get("num_images")
+        cols["num_images"].append(int(num) if num not in (None, "") and not (isinstance(num, float) and math.isnan(num)) else None)
+        cols["scraped_at"].append(ts.astimezone(timezone.utc) if ts else None)
+        # partition by the date the scrape ran, in the timestamp's own timezone
+        cols["scrape_date"].append(ts.date().isoformat() if ts else "unknown")
+        for c in extra_columns:
+            v = _cell_value(row.get(c))
+            cols[c].append(str(v) if v != "" else None)
+
+    n = len(cols["source_url"])
+    if not n:
+        return 0
+
+    fields = [
+        pa.field("source_url", pa.string()),
+        pa.field("text", pa.string()),
+    ] + [pa.field(c, pa.list_(pa.string())) for c in list_columns] + [
+        pa.field("num_images", pa.int32()),
+        pa.field("scraped_at", pa.timestamp("us", tz="UTC")),
+    ] + [pa.field(c, pa.string()) for c in extra_columns] + [
+        pa.field("scrape_date", pa.string()),
+    ]
+    schema = pa.schema(fields)
+    table = pa.table({f.name: cols[f.name] for f in fields}, schema=schema)
+    ds.write_dataset(
+        table, root_dir, format="parquet",
+        partitioning=ds.partitioning(pa.schema([pa.field("scrape_date", pa.string())]), flavor="hive"),
+        basename_template=f"part-{uuid.uuid4().hex[:12]}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+    return n
+
+
+def read_parquet_archive(root_dir, columns=None, scrape_dates=None):
+    """Load the archive (or selected columns / scrape dates) as a pandas DataFrame."""
+    import pyarrow.dataset as ds
+    import pyarrow as pa
+    dataset = ds.dataset(root_dir, format="parquet", partitioning="hive")
+    # runs may add columns (e.g. prompt); read every file against the union of their schemas
+    schema = pa.unify_schemas([f.physical_schema for f in dataset.get_fragments()] + [dataset.schema])
+    dataset = ds.dataset(root_dir, format="parquet", partitioning="hive", schema=schema)
+    flt = None
+    if scrape_dates:
+        flt = ds.field("scrape_date").isin(list(scrape_dates))
+    return dataset.to_table(columns=columns, filter=flt).to_pandas()
@@ -0,0 +1,304 @@
+import os
+import json
+from datetime import datetime, timezone
+
+from network_capture import NetworkEventReader, fetch_response_body
+from media_variants import pick_variant_url
+from daemon import normalize_post_key
+from rate_control import get_controller, wait_for_scroll_growth
+
+
+# -------------------------
+# JSON feed interception
+# -------------------------
+# The saved page is rendered from JSON the browser already receives: the initial
+# payload embedded in <script type="application/json"> tags and the GraphQL
+# responses fetched while scrolling. This module captures those bodies through the
+# DevTools performance log and turns them into posts (id, caption, permalink and the
+# full ordered media list, including every carousel slide) without walking the DOM.
+#
+# The parser is pure: parse_feed_text / parse_feed_file work on recorded bodies, so
+# feed layout changes can be checked offline against saved fixture files.
+
+THREADS_BASE_URL = os.getenv("THREADS_BASE_URL", "https://www.threads.com")
+
+# Requests whose responses may carry feed data
+FEED_URL_MARKERS = ("/graphql", "/api/graphql", "/ajax/bulk-route-definitions", "/api/v1/")
+FEED_MIME_TYPES = ("application/json", "text/javascript", "application/x-javascript", "text/plain")
+
+# Facebook-family endpoints prefix JSON with an anti-hijacking guard
+_JSON_GUARDS = ("for (;;);", "for(;;);", ")]}'")
+
+EMBEDDED_JSON_JS = """
+return Array.from(document.querySelectorAll('script[type="application/json"]'))
+  .map(s => s.textContent)
+  .filter(t => t && (t.indexOf('"caption"') !== -1 || t.indexOf('image_versions2') !== -1));
+"""
+
+
+# -------------------------
+# Parsing
+# -------------------------
+def _strip_guard(text):
+    text = text.lstrip()
+    for g in _JSON_GUARDS:
+        if text.startswith(g):
+            return text[len(g):]
+    return text
+
+
+def iter_json_documents(text):
+    """Yield every JSON document in a response body. Streaming GraphQL responses
+    send several documents separated by newlines."""
+    text = _strip_guard(text or "")
+    if not text.strip():
+        return
+    try:
+        yield json.loads(text)
+        return
+    except ValueError:
+        pass
+    decoder = json.JSONDecoder()
+    pos, n = 0, len(text)
+    while pos < n:
+        while pos < n and text[pos] in " \r\n\t":
+            pos += 1
+        if pos >= n:
+            break
+        try:
+            obj, end = decoder.raw_decode(text, pos)
+        except ValueError:
+            # skip to the next line and keep going
+            nl = text.find("\n", pos)
+            if nl == -1:
+                break
+            pos = nl + 1
+            continue
+        yield obj
+        pos = end
+
+
+def _image_variants(item):
+    """The item's image_versions2 candidates as media_variants candidate dicts."""
+    candidates = ((item or {}).get("image_versions2") or {}).get("candidates") or []
+    return [{"url": c["url"], "width": c.get("width") or None, "density": None}
+            for c in candidates if isinstance(c, dict) and c.get("url")]
+
+
+def _posted_at(taken_at):
+    # ISO-8601 like the <time datetime> DOM mode reads, not the feed's epoch seconds
+    if not isinstance(taken_at, (int, float)) or isinstance(taken_at, bool):
+        return ""
+    return datetime.fromtimestamp(taken_at, timezone.utc).isoformat()
+
+
+def _looks_like_post(d):
+    if not isinstance(d, dict):
+        return False
+    if not (d.get("pk") or d.get("id")) or not d.get("code"):
+        return False
+    return "caption" in d or "image_versions2" in d or "carousel_media" in d
+
+
+def _caption_text(post):
+    cap = post.get("caption")
+    if isinstance(cap, dict):
+        return cap.get("text") or ""
+    if isinstance(cap, str):
+        return cap
+    # Threads text posts may keep the body in text_post_app_info fragments
+    frags = (((post.get("text_post_app_info") or {}).get("text_fragments") or {}).get("fragments")) or []
+    return "".join(f.get("plaintext", "") for f in frags if isinstance(f, dict))
+
+
+def _counters(post):
+    info = post.get("text_post_app_info") or {}
+    out = {}
+    for name, value in (("likes", post.get("like_count")), ("replies", info.get("direct_reply_count")),
+                        ("reposts", info.get("repost_count")), ("quotes", info.get("quote_count")),
+                        ("shares", info.get("reshare_count"))):
+        if isinstance(value, int):
+            out[name] = value
+    return out
+
+
+def post_from_node(post):
+    """Map one feed post object to the scraper's post fields."""
+    user = post.get("user") or {}
+    username = user.get("username") or ""
+    code = post.get("code") or ""
+    permalink = f"{THREADS_BASE_URL}/@{username}/post/{code}" if username else f"{THREADS_BASE_URL}/post/{code}"
+
+    # one candidate list per image; scrape_engine picks the variant by IMAGE_VARIANT_POLICY
+    variants = [v for v in (_image_variants(slide) for slide in post.get("carousel_media") or []) if v]
+    if not variants:
+        variants = [v for v in [_image_variants(post)] if v]
+
+    return {
+        "post_id": str(post.get("pk") or post.get("id")).split("_")[0],
+        "code": code,
+        "username": username,
+        "permalink": permalink,
+        "caption": _caption_text(post),
+        "taken_at": post.get("taken_at"),
+        "posted_at": _posted_at(post.get("taken_at")),
+        "counters": _counters(post),
+        "image_variants": variants,
+        "image_urls": [pick_variant_url(v) for v in variants],
+    }
+
+
+def extract_posts(obj, out=None, seen=None):
+    """Walk any decoded JSON value and collect posts in document order (deduplicated by post id)."""
+    if out is None:
+        out, seen = [], set()
+    stack = [obj]
+    while stack:
+        cur = stack.pop()
+        if isinstance(cur, dict):
+            if _looks_like_post(cur):
+                p = post_from_node(cur)
+                if p["post_id"] not in seen:
+                    seen.add(p["post_id"])
+                    out.append(p)
+                # carousel children are already consumed by post_from_node
+                continue
+            stack.extend(reversed(list(cur.values())))
+        elif isinstance(cur, list):
+            stack.extend(reversed(cur))
+    return out
+
+
+def parse_feed_text(text):
+    posts, seen = [], set()
+    for doc in iter_json_documents(text):
+        extract_posts(doc, posts, seen)
+    return posts
+
+
+def parse_feed_file(path):
+    """Parse a recorded fixture: either one raw response body or a .jsonl file
+    written by FeedCapture.record_to (one {"url", "body"} object per line)."""
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    if not path.endswith(".jsonl"):
+        return parse_feed_text(text)
+    posts, seen = [], set()
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        try:
+            body = json.loads(line).get("body", "")
+        except ValueError:
+            continue
+        for doc in iter_json_documents(body):
+            extract_posts(doc, posts, seen)
+    return posts
+
+
+# -------------------------
+# Capture
+# -------------------------
+class FeedCapture:
+    """Collects feed JSON bodies from the browser and keeps the parsed posts in order."""
+
+    def __init__(self, driver, reader=None, record_to=None):
+        self.driver = driver
+        self.reader = reader or NetworkEventReader(driver)
+        self.reader.add_listener(self._on_event)
+        self.record_to = record_to
+        self.posts = []
+        self._seen = set()
+        self._pending = {}
+        self.bodies = 0
+
+    def _is_feed_response(self, url, mime):
+        return any(m in url for m in FEED_URL_MARKERS) and (mime or "").lower().startswith(FEED_MIME_TYPES)
+
+    def _on_event(self, method, params):
+        if method == "Network.responseReceived":
+            resp = params.get("response", {})
+            if self._is_feed_response(resp.get("url", ""), resp.get("mimeType", "")):
+                self._pending[params.get("requestId")] = resp.get("url", "")
+        elif method == "Network.loadingFinished":
+            url = self._pending.pop(params.get("requestId"), None)
+            if url is None:
+                return
+            try:
+                body = fetch_response_body(self.driver, params.get("requestId")).decode("utf-8", errors="ignore")
+            except Exception:
+                return
+            self.add_body(body, url)
+        elif method == "Network.loadingFailed":
+            self._pending.pop(params.get("requestId"), None)
+
+    def add_body(self, body, url=""):
+        self.bodies += 1
+        if self.record_to:
+            with open(self.record_to, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"url": url, "body": body}, ensure_ascii=False) + "\n")
+        before = len(self.posts)
+        for doc in iter_json_documents(body):
+            extract_posts(doc, self.posts, self._seen)
+        return len(self.posts) - before
+
+    def read_embedded(self):
+        """Parse the initial page payload that is inlined in the HTML (never seen on the network log)."""
+        try:
+            blobs = self.driver.execute_script(EMBEDDED_JSON_JS) or []
+        except Exception:
+            return 0
+        return sum(self.add_body(b, "embedded") for b in blobs)
+
+    def poll(self):
+        self.reader.poll()
+        return len(self.posts)
+
+
+def _first_known(posts, known_keys):
+    for i, p in enumerate(posts):
+        if normalize_post_key(p["permalink"]) in known_keys:
+            return i
+    return None
+
+
+def collect_feed_posts(driver, max_posts=None, scroll_wait_max=3.0, max_idle_scrolls=3, record_to=None, known_keys=None):
+    """Scroll the saved page only to make it fetch more feed pages; posts come from the JSON.
+    With known_keys, stop at the first already-archived post and return only the newer ones."""
+    rate = get_controller()
+    capture = FeedCapture(driver, record_to=record_to)
+    capture.read_embedded()
+    capture.poll()
+    idle = 0
+    stop_at = _first_known(capture.posts, known_keys) if known_keys else None
+    last_height = driver.execute_script("return document.body.scrollHeight")
+    while stop_at is None and (max_posts is None or len(capture.posts) < max_posts) and idle < max_idle_scrolls:
+        before = len(capture.posts)
+        rate.acquire("page")
+        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+        grown_height, waited = wait_for_scroll_growth(driver, last_height, timeout=scroll_wait_max)
+        if grown_height != last_height:
+            rate.observe("page", latency=waited)
+        capture.poll()
+        new_height = driver.execute_script("return document.body.scrollHeight")
+        if len(capture.posts) == before and new_height == last_height:
+            idle += 1
+        else:
+            idle = 0
+        last_height = new_height
+        if known_keys:
+            stop_at = _first_known(capture.posts, known_keys)
+    print(f"Feed capture: {len(capture.posts)} posts from {capture.bodies} JSON responses")
+    posts = capture.posts if stop_at is None else capture.posts[:stop_at]
+    return posts[:max_posts] if max_posts else posts
+
+
+if __name__ == "__main__":
+    # Check the parser against a recorded fixture:
+    #   python feed_capture.py fixtures/saved_feed_sample.jsonl
+    import sys
+    for path in sys.argv[1:]:
+        parsed = parse_feed_file(path)
+        print(f"{path}: {len(parsed)} posts")
+        for p in parsed:
+            print(f"  {p['post_id']}  {len(p['image_urls'])} images  {p['permalink']}  {p['caption'][:60]!r}")
@@ -0,0 +1,152 @@
+import os
+import threading
+import io
+from concurrent.futures import ProcessPoolExecutor
+
+
+# -------------------------
+# Image normalization / recompression
+# -------------------------
+# Optional post-download stage: re-encode every image to one target format and
+# quality, cap the longest side and drop EXIF/ICC/text metadata. The work is
+# CPU bound, so batches are spread over a process pool (one worker per core by
+# default). Pillow is imported lazily so the scrapers still run without it when
+# the stage is disabled.
+
+FORMAT_EXTENSIONS = {
+    "WEBP": ".webp",
+    "JPEG": ".jpg",
+    "PNG": ".png",
+    "AVIF": ".avif",
+}
+
+
+def _normalize_format(fmt):
+    fmt = (fmt or "WEBP").upper()
+    if fmt == "JPG":
+        fmt = "JPEG"
+    if fmt not in FORMAT_EXTENSIONS:
+        raise ValueError(f"Unsupported target format: {fmt}")
+    return fmt
+
+
+# im.info keys that carry metadata (EXIF/GPS, colour profile, XMP, comments)
+_METADATA_KEYS = ("exif", "icc_profile", "xmp", "XML:com.adobe.xmp", "comment", "photoshop")
+
+
+def _has_metadata(im):
+    return any(im.info.get(k) for k in _METADATA_KEYS) or bool(getattr(im, "text", None)) or bool(im.getexif())
+
+
+def normalize_image_bytes(data, fmt="WEBP", quality=82, max_dim=2048):
+    """Re-encode image bytes to fmt/quality, downscale so the longest side <= max_dim and strip metadata.
+    Returns (new_bytes, extension, changed); changed is True when the format differed, the image
+    was downscaled or it carried metadata."""
+    from PIL import Image, ImageOps
+
+    fmt = _normalize_format(fmt)
+    with Image.open(io.BytesIO(data)) as im:
+        im.load()
+        changed = im.format != fmt or _has_metadata(im)
+        # Bake the EXIF orientation into the pixels before the metadata is dropped
+        im = ImageOps.exif_transpose(im)
+        if max_dim and max(im.size) > max_dim:
+            im.thumbnail((max_dim, max_dim), Image.LANCZOS)
+            changed = True
+
+        has_alpha = im.mode in ("RGBA", "LA") or (im.mode == "P" and "transparency" in im.info)
+        if fmt == "JPEG" or not has_alpha:
+            im = im.convert("RGB")
+        else:
+            im = im.convert("RGBA")
+
+        # Copy pixels only: a fresh image carries no exif/icc/text chunks
+        clean = Image.new(im.mode, im.size)
+        clean.paste(im)
+
+        out = io.BytesIO()
+        save_kwargs = {"optimize": True}
+        if fmt in ("JPEG", "WEBP", "AVIF"):
+            save_kwargs["quality"] = int(quality)
+        if fmt == "JPEG":
+            save_kwargs["progressive"] = True
+        if fmt == "WEBP":
+            save_kwargs["method"] = 4
+        clean.save(out, format=fmt, **save_kwargs)
+    return out.getvalue(), FORMAT_EXTENSIONS[fmt], changed
+
+
+def _normalize_bytes_worker(data, fmt, quality, max_dim):
+    try:
+        new_data, ext, changed = normalize_image_bytes(data, fmt=fmt, quality=quality, max_dim=max_dim)
+        if not changed and len(new_data) >= len(data):
+            # Already clean, in the target format and within max_dim; re-encoding would not help
+            return data, None, None
+        return new_data, ext, None
+    except Exception as e:
+        return data, None, str(e)
+
+
+def new_stats():
+    return {"files": 0, "failed": 0, "bytes_before": 0, "bytes_after": 0}
+
+
+def format_stats(stats):
+    before = stats["bytes_before"]
+    after = stats["bytes_after"]
+    saved = before - after
+    pct = (100.0 * saved / before) if before else 0.0
+    return (f"Normalized {stats['files']} images ({stats['failed']} failed): "
+            f"{before / 1024 / 1024:.2f} MB -> {after / 1024 / 1024:.2f} MB, "
+            f"saved {saved / 1024 / 1024:.2f} MB ({pct:.1f}%)")
+
+
+class ImageNormalizer:
+    """Owns the worker process pool. Use as a context manager so the pool is shut down."""
+
+    def __init__(self, fmt="WEBP", quality=82, max_dim=2048, workers=None):
+        self.fmt = _normalize_format(fmt)
+        self.quality = quality
+        self.max_dim = max_dim
+        self.workers = workers or os.cpu_count() or 1
+        self.stats = new_stats()
+        self._pool = None
+        # normalize_bytes may be called from several media pipeline threads at once
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def _ensure_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self._pool
+
+    def normalize_bytes(self, blobs):
+        """Normalize a batch of image bytes in parallel. Returns [(bytes, ext_or_None)] in input order;
+        ext is None when the original bytes were kept."""
+        pool = self._ensure_pool()
+        n = len(blobs)
+        out = []
+        results = pool.map(_normalize_bytes_worker, blobs, [self.fmt] * n, [self.quality] * n, [self.max_dim] * n)
+        for original, (data, ext, err) in zip(blobs, results):
+            with self._lock:
+                if err:
+                    self.stats["failed"] += 1
+                else:
+                    self.stats["files"] += 1
+                    self.stats["bytes_before"] += len(original)
+                    self.stats["bytes_after"] += len(data)
+            out.append((data, ext))
+        return out
@@ -0,0 +1,153 @@
+import time
+
+from browser_profiles import browser_rss_mb
+from metrics import STAGE_SECONDS
+from daemon import post_links, first_known_index, normalize_post_key
+from rate_control import get_controller, wait_for_scroll_growth, looks_like_challenge
+
+
+# -------------------------
+# Long-list mode (memory-bounded scrolling)
+# -------------------------
+# The default DOM mode scrolls first and processes afterwards, so every rendered
+# post stays alive and each find_elements call walks a bigger document. Here the
+# page is harvested in batches instead: take the containers not seen yet, let the
+# caller extract them, then empty them (same height, no children) before the next
+# scroll. The document stays about the size of one screenful of posts, so each
+# scroll step costs about the same at post 5000 as at post 50.
+
+# arguments: candidate selectors. Picks the first selector that matches (once per
+# page) and returns only containers not harvested before, marking them.
+HARVEST_JS = """
+const sels = arguments[0];
+if (!window.__psSel) {
+  window.__psSel = sels.find(s => document.querySelector(s)) || '';
+}
+if (!window.__psSel) return [];
+const out = [];
+for (const el of document.querySelectorAll(window.__psSel + ':not([data-ps-seen])')) {
+  if (el.closest('[data-ps-seen]')) continue;
+  el.setAttribute('data-ps-seen', '1');
+  out.push(el);
+}
+return out;
+"""
+
+# Collapse harvested containers to empty placeholders of the same height: the outer
+# node stays (the page's own framework still owns it) and the scroll position does not jump.
+PRUNE_JS = """
+let n = 0;
+for (const el of arguments[0]) {
+  if (!el || !el.isConnected || el.dataset.psPruned) continue;
+  const h = el.getBoundingClientRect().height;
+  el.replaceChildren();
+  el.style.height = h + 'px';
+  el.style.contain = 'strict';
+  el.dataset.psPruned = '1';
+  n++;
+}
+return [n, document.getElementsByTagName('*').length];
+"""
+
+
+def resume_key(link, position):
+    """Identifies a container across reloads of the page: its /post/ permalink, else its
+    position in the list (a profile link would match every post of that author)."""
+    key = normalize_post_key(link)
+    return key if "/post/" in key else f"#{position}"
+
+
+class LongListStats:
+    def __init__(self):
+        self.posts = 0
+        self.skipped = 0
+        self.scrolls = 0
+        self.pruned = 0
+        self.step_ms = []
+        self.dom_nodes = []
+        self.rss_mb = []
+
+    def sample_rss(self, driver):
+        mb = browser_rss_mb(driver)
+        if mb is not None:
+            self.rss_mb.append(mb)
+
+    def summary(self):
+        def avg(xs):
+            return sum(xs) / len(xs) if xs else 0.0
+        head, tail = self.step_ms[:10], self.step_ms[-10:]
+        parts = [f"posts={self.posts}", f"scrolls={self.scrolls}", f"pruned={self.pruned}",
+                 *([f"skipped={self.skipped}"] if self.skipped else []),
+                 f"scroll step ms first10={avg(head):.0f} last10={avg(tail):.0f}"]
+        if self.dom_nodes:
+            parts.append(f"DOM nodes max={max(self.dom_nodes)} last={self.dom_nodes[-1]}")
+        if self.rss_mb:
+            parts.append(f"browser RSS start={self.rss_mb[0]:.0f}MB peak={max(self.rss_mb):.0f}MB end={self.rss_mb[-1]:.0f}MB")
+        return "Long list | " + " ".join(parts)
+
+
+def harvest_long_list(driver, selectors, max_posts=None, known_keys=None, max_scrolls=5000, max_idle_scrolls=3,
+                      scroll_wait_max=3.0, rss_every=10, stats=None, rate=None, skip_keys=None):
+    """Yield batches of new post containers. Each batch is pruned from the page once the
+    consumer asks for the next one, so extract everything needed before that. With a
+    skip_keys set (resuming after a browser restart), batches are (container, resume_key)
+    pairs and containers whose key is in skip_keys are pruned without being yielded."""
+    stats = stats if stats is not None else LongListStats()
+    rate = rate or get_controller()
+    stats.sample_rss(driver)
+    idle = 0
+    position = 0    # containers harvested before this batch, in page order
+    last_height = driver.execute_script("return document.body.scrollHeight")
+    while True:
+        # step cost = harvest query + prune + scroll wait (not extraction or rate-limit waits)
+        t0 = time.monotonic()
+        batch = driver.execute_script(HARVEST_JS, list(selectors)) or []
+        step = time.monotonic() - t0
+        stop = False
+        harvested = batch
+        if skip_keys is not None and batch:
+            links = post_links(driver, batch)
+            links += [""] * (len(batch) - len(links))
+            keyed = [(e, resume_key(link, position + i)) for i, (e, link) in enumerate(zip(batch, links))]
+            batch = [pair for pair in keyed if pair[1] not in skip_keys]
+            stats.skipped += len(harvested) - len(batch)
+        position += len(harvested)
+        if known_keys and batch:
+            elems = [e for e, _key in batch] if skip_keys is not None else batch
+            i = first_known_index(post_links(driver, elems), known_keys)
+            if i is not None:
+                print(f"Reached an already archived post after {stats.posts + i} new posts; stopping scroll.")
+                batch, stop = batch[:i], True
+        if max_posts is not None and stats.posts + len(batch) >= max_posts:
+            batch, stop = batch[:max_posts - stats.posts], True
+        if batch:
+            stats.posts += len(batch)
+            yield batch
+        if harvested:
+            idle = 0
+            t0 = time.monotonic()
+            pruned, nodes = driver.execute_script(PRUNE_JS, harvested)
+            step += time.monotonic() - t0
+            stats.pruned += pruned
+            stats.dom_nodes.append(nodes)
+        else:
+            idle += 1
+        if stop or idle > max_idle_scrolls or stats.scrolls >= max_scrolls:
+            break
+
+        rate.acquire("page")
+        t0 = time.monotonic()
+        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+        height, waited = wait_for_scroll_growth(driver, last_height, timeout=scroll_wait_max)
+        if height != last_height:
+            rate.observe("page", latency=waited)
+        last_height = height
+        stats.scrolls += 1
+        stats.step_ms.append((step + time.monotonic() - t0) * 1000)
+        STAGE_SECONDS.observe(stats.step_ms[-1] / 1000, stage="scroll")
+        if looks_like_challenge(driver):
+            rate.penalize("page", "login/challenge redirect while scrolling")
+            break
+        if rss_every and stats.scrolls % rss_every == 0:
+            stats.sample_rss(driver)
+    stats.sample_rss(driver)
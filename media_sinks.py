@@ -0,0 +1,351 @@
+import os
+import uuid
+import time
+import mimetypes
+import threading
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import ERRORS, MEDIA_BYTES, QUEUE_DEPTH, STAGE_SECONDS
+from rate_control import get_controller
+from records import digest_bytes
+
+
+# -------------------------
+# Media sinks + the media pipeline
+# -------------------------
+# Scraping finds image URLs (or captured bytes) per post; where the bytes end up is
+# a sink:
+#   LocalSink       files under a directory            -> MediaItem.path
+#   CloudinarySink  uploads through an uploader        -> MediaItem.remote_url
+#   TeeSink         several sinks for the same image   -> both
+#   SpoolSink       files queued for a later bulk upload (upload_spool.py)
+#                                                      -> MediaItem.path until uploaded
+#
+# MediaPipeline is the one engine in front of every sink. submit() reserves the
+# post's next media slot immediately (so order and names are stable) and returns;
+# fetch -> normalize -> hash -> sink.put then run on a thread pool while the
+# scraper moves on to the next post. A bounded number of items may be in flight,
+# so captured bytes cannot pile up in memory when a sink is slow.
+
+SINK_KINDS = ("local", "cloudinary", "tee", "spool")
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36"
+
+
+def guess_extension(url, content_type=""):
+    # 1) Try URL path
+    path = urlparse(url).path
+    base, ext = os.path.splitext(path)
+    if ext and len(ext) <= 5:
+        return ext
+    # 2) Try content-type header
+    ctype = (content_type or "").split(";")[0].strip()
+    if ctype:
+        ext = mimetypes.guess_extension(ctype)
+        if ext:
+            return ext
+    # 3) Default
+    return ".jpg"
+
+
+def fetch_image(url, session=None, timeout=25, rate=None):
+    """Download one image. Returns (bytes, content_type)."""
+    if not (url.startswith("http://") or url.startswith("https://")):
+        raise ValueError("Unsupported image URL: " + url)
+    import requests
+    session = session or requests.Session()
+    rate = rate or get_controller()
+    with rate.timed("image"):
+        resp = session.get(url, headers={"User-Agent": USER_AGENT}, timeout=timeout)
+        resp.raise_for_status()
+        data = resp.content
+        # a dropped connection can end the body early without an error
+        expected = resp.headers.get("Content-Length", "")
+        if expected.isdigit() and not resp.headers.get("Content-Encoding") and int(expected) != len(data):
+            raise IOError(f"truncated download: got {len(data)} of {expected} bytes")
+        return data, resp.headers.get("Content-Type", "")
+
+
+def write_atomic(path, data):
+    """Write next to the target and rename, so a failed write never leaves a truncated file."""
+    tmp = f"{path}.{uuid.uuid4().hex[:8]}.part"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+# -------------------------
+# Sinks
+# -------------------------
+class MediaSink:
+    """put() stores one image's bytes and fills the matching MediaItem fields. Must be thread-safe."""
+    name = "sink"
+
+    def put(self, record, item, data, ext):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class LocalSink(MediaSink):
+    name = "local"
+
+    def __init__(self, dest_dir):
+        self.dest_dir = dest_dir
+        os.makedirs(dest_dir, exist_ok=True)
+
+    def put(self, record, item, data, ext):
+        fpath = os.path.join(self.dest_dir, f"{record.media_prefix(item.index)}{ext}")
+        write_atomic(fpath, data)
+        item.path = fpath
+        MEDIA_BYTES.inc(len(data), direction="written")
+
+
+_cloudinary_ready = False
+
+
+def configure_cloudinary(cloud_name=None, api_key=None, api_secret=None):
+    """Configure the SDK once; arguments default to the CLOUDINARY_* environment variables."""
+    global _cloudinary_ready
+    if _cloudinary_ready:
+        return
+    cloud_name = cloud_name or os.getenv("CLOUDINARY_CLOUD_NAME")
+    api_key = api_key or os.getenv("CLOUDINARY_API_KEY")
+    api_secret = api_secret or os.getenv("CLOUDINARY_API_SECRET")
+    if not (cloud_name and api_key and api_secret):
+        raise SystemExit(
+            "Cloudinary credentials not found in environment. Please set CLOUDINARY_CLOUD_NAME, "
+            "CLOUDINARY_API_KEY and CLOUDINARY_API_SECRET, or edit the script to include them."
+        )
+    import cloudinary
+    cloudinary.config(cloud_name=cloud_name, api_key=api_key, api_secret=api_secret, secure=True)
+    _cloudinary_ready = True
+
+
+def cloudinary_uploader(data, public_id, tags=None):
+    """Default uploader: the Cloudinary SDK (configure_cloudinary() must have run)."""
+    import io
+    import cloudinary.uploader
+    res = cloudinary.uploader.upload(io.BytesIO(data), public_id=public_id, resource_type="image", tags=tags or [])
+    return res.get("secure_url")
+
+
+class DirectoryUploader:
+    """Local stand-in for Cloudinary: same call signature, writes into a directory and returns a
+    file:// URL. Optional fixed latency to mimic a remote service. Used for dry runs and benchmarks."""
+
+    def __init__(self, root, latency=0.0):
+        self.root = root
+        self.latency = latency
+        os.makedirs(root, exist_ok=True)
+
+    def __call__(self, data, public_id, tags=None):
+        if self.latency:
+            time.sleep(self.latency)
+        path = os.path.join(self.root, public_id)
+        with open(path, "wb") as f:
+            f.write(data)
+        return "file:///" + os.path.abspath(path).replace("\\", "/").lstrip("/")
+
+
+class CloudinarySink(MediaSink):
+    name = "cloudinary"
+
+    def __init__(self, uploader=None, tags=None, rate=None):
+        self.uploader = uploader or cloudinary_uploader
+        self.tags = tags
+        self.rate = rate or get_controller()
+
+    def put(self, record, item, data, ext):
+        public_id = f"{record.media_prefix(item.index)}_{uuid.uuid4().hex[:8]}"
+        with self.rate.timed("upload"):
+            item.remote_url = self.uploader(data, public_id, self.tags)
+        MEDIA_BYTES.inc(len(data), direction="uploaded")
+
+
+class TeeSink(MediaSink):
+    """Send every image to several sinks. Succeeds if at least one of them does."""
+    name = "tee"
+
+    def __init__(self, *sinks):
+        self.sinks = sinks
+
+    def put(self, record, item, data, ext):
+        errors = []
+        for sink in self.sinks:
+            try:
+                sink.put(record, item, data, ext)
+            except Exception as e:
+                errors.append(f"{sink.name}: {e}")
+        if len(errors) == len(self.sinks):
+            raise RuntimeError("; ".join(errors))
+        for err in errors:
+            print(f"Sink failed for {item.source_url[:80]}...: {err}")
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+class SpoolSink(MediaSink):
+    """Write the bytes into an UploadSpool and return at once; the upload happens in spool.drain()."""
+    name = "spool"
+
+    def __init__(self, spool):
+        self.spool = spool
+
+    def put(self, record, item, data, ext):
+        public_id = f"{record.media_prefix(item.index)}_{uuid.uuid4().hex[:8]}"
+        fpath = os.path.join(self.spool.files_dir, public_id + ext)
+        write_atomic(fpath, data)
+        self.spool.add(record.post_key, record.permalink, item.index, item.source_url, public_id, fpath, len(data),
+                       scraped_at=record.scraped_at)
+        item.path = fpath
+        MEDIA_BYTES.inc(len(data), direction="spooled")
+
+
+def make_uploader(uploader=None):
+    """The Cloudinary uploader, or DirectoryUploader when CLOUDINARY_STANDIN_DIR is set."""
+    if uploader is not None:
+        return uploader
+    standin = os.getenv("CLOUDINARY_STANDIN_DIR", "")
+    if standin:
+        return DirectoryUploader(standin)
+    configure_cloudinary()
+    return cloudinary_uploader
+
+
+def make_sink(kind, images_dir=None, uploader=None, rate=None, spool_dir=None, keep_files=False):
+    """Build a sink by name. CLOUDINARY_STANDIN_DIR swaps the Cloudinary SDK for DirectoryUploader."""
+    if kind not in SINK_KINDS:
+        raise ValueError(f"Unknown MEDIA_SINK '{kind}'. Expected one of: {', '.join(SINK_KINDS)}")
+    if kind == "local":
+        return LocalSink(images_dir)
+    if kind == "spool":
+        from upload_spool import UploadSpool
+        return SpoolSink(UploadSpool(spool_dir, keep_files=keep_files))
+    uploader = make_uploader(uploader)
+    if kind == "cloudinary":
+        return CloudinarySink(uploader, rate=rate)
+    return TeeSink(LocalSink(images_dir), CloudinarySink(uploader, rate=rate))
+
+
+# -------------------------
+# Pipeline
+# -------------------------
+class MediaPipeline:
+    def __init__(self, sink, workers=8, normalizer=None, session=None, rate=None, max_pending=None):
+        self.sink = sink
+        self.workers = max(1, int(workers))
+        self.normalizer = normalizer
+        self.session = session
+        self.rate = rate or get_controller()
+        self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="media")
+        self.slots = threading.BoundedSemaphore(max_pending or self.workers * 4)
+        self.lock = threading.Lock()
+        self.futures = []
+        self.records = []
+        self.fallbacks = {}     # id(record) -> (record, URLs to try if none of its images can be stored)
+        self.stats = {"submitted": 0, "stored": 0, "failed": 0, "captured": 0, "bytes": 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def submit(self, record, url, data=None, content_type=""):
+        """Queue one image of `record`. Its slot (index, file name) is fixed now; the bytes are
+        fetched/stored in the background. Blocks only when max_pending items are in flight."""
+        item = record.add_media(source_url=url)
+        if not self.records or self.records[-1] is not record:
+            self.records.append(record)
+        self.slots.acquire()
+        with self.lock:
+            self.stats["submitted"] += 1
+            if data is not None:
+                self.stats["captured"] += 1
+        QUEUE_DEPTH.inc(queue="media")
+        fut = self.pool.submit(self._process, record, item, data, content_type)
+        fut.add_done_callback(self._done)
+        self.futures.append(fut)
+        return fut
+
+    def submit_fallback(self, record, urls):
+        """URLs for drain() to try once if none of the images submitted for `record` could be stored."""
+        if urls:
+            self.fallbacks[id(record)] = (record, list(urls))
+
+    def _done(self, _future):
+        QUEUE_DEPTH.dec(queue="media")
+        self.slots.release()
+
+    def _process(self, record, item, data, content_type):
+        stage = "fetch"
+        try:
+            if data is None:
+                data, content_type = fetch_image(item.source_url, session=self.session, rate=self.rate)
+                MEDIA_BYTES.inc(len(data), direction="fetched")
+            else:
+                MEDIA_BYTES.inc(len(data), direction="captured")
+            ext = guess_extension(item.source_url, content_type)
+            if self.normalizer is not None:
+                stage = "normalize"
+                with STAGE_SECONDS.time(stage="normalize"):
+                    new_data, new_ext = self.normalizer.normalize_bytes([data])[0]
+                if new_ext:
+                    data, ext = new_data, new_ext
+            item.sha256, item.size = digest_bytes(data)
+            item.mime = mimetypes.guess_type("x" + ext)[0] or (content_type or "").split(";")[0].strip()
+            stage = "store"
+            with STAGE_SECONDS.time(stage=f"store_{self.sink.name}"):
+                self.sink.put(record, item, data, ext)
+            with self.lock:
+                self.stats["stored"] += 1
+                self.stats["bytes"] += item.size
+        except Exception as e:
+            with self.lock:
+                self.stats["failed"] += 1
+            ERRORS.inc(reason=f"media_{stage}")
+            print(f"Failed to save image {item.source_url[:80]}...: {e}")
+
+    def drain(self):
+        """Wait for everything submitted so far; drop media that could not be stored. A record
+        that is left without any image gets its fallback URLs (submit_fallback) tried once."""
+        while True:
+            futures, self.futures = self.futures, []
+            for fut in futures:
+                fut.result()
+            records, self.records = self.records, []
+            retry = []
+            for record in records:
+                tried = {m.source_url for m in record.media}
+                record.media = [m for m in record.media if m.path or m.remote_url]
+                _record, urls = self.fallbacks.pop(id(record), (None, ()))
+                urls = [u for u in urls if u not in tried]
+                if tried and not record.media and urls:
+                    retry.append((record, urls))
+            if not retry:
+                break
+            for record, urls in retry:
+                for url in urls:
+                    self.submit(record, url)
+
+    def close(self):
+        try:
+            self.drain()
+        finally:
+            self.pool.shutdown(wait=True)
+            self.sink.close()
+
+    def summary(self):
+        s = self.stats
+        return (f"Media ({self.sink.name}, {self.workers} workers) | submitted={s['submitted']} "
+                f"stored={s['stored']} failed={s['failed']} from_browser={s['captured']} "
+                f"{s['bytes'] / 1024 / 1024:.2f} MB")
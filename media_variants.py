@@ -0,0 +1,180 @@
+import re
+
+
+# -------------------------
+# Responsive image variant resolution
+# -------------------------
+# <img src> is often a small placeholder while the real choices live in srcset /
+# <picture><source srcset>. Collect every candidate per image in ONE script round
+# trip, then pick one URL per image by policy:
+#   "max"       - the largest variant available
+#   "target"    - the smallest variant at least target_width wide (else the largest)
+#   "min_above" - the smallest variant at least min_width wide (else the largest)
+
+VARIANT_POLICIES = ("max", "target", "min_above")
+
+# Variants narrower than this are treated as placeholders/thumbnails and are only
+# used when nothing bigger exists for that image.
+PLACEHOLDER_MAX_WIDTH = 150
+
+# Describes one <img> / one element with a CSS background image (shared with carousel.py).
+DESCRIBE_IMAGE_JS = r"""
+const attr = (el, names) => { for (const n of names) { const v = el.getAttribute(n); if (v) return v; } return ''; };
+const describeImg = img => {
+  const sources = [];
+  const pic = img.parentElement && img.parentElement.tagName === 'PICTURE' ? img.parentElement : null;
+  if (pic) {
+    pic.querySelectorAll('source').forEach(s => {
+      const ss = s.getAttribute('srcset') || s.getAttribute('data-srcset');
+      if (ss) sources.push({srcset: ss, media: s.getAttribute('media') || '', type: s.getAttribute('type') || ''});
+    });
+  }
+  return {
+    kind: 'img',
+    src: img.currentSrc || img.getAttribute('src') || '',
+    lazy_src: attr(img, ['data-src', 'data-lazy-src', 'data-original']),
+    srcset: img.getAttribute('srcset') || '',
+    lazy_srcset: attr(img, ['data-srcset', 'data-lazy-srcset']),
+    sizes: img.getAttribute('sizes') || '',
+    width: img.naturalWidth || parseInt(img.getAttribute('width') || '0', 10) || 0,
+    sources: sources,
+  };
+};
+const describeBackground = el => {
+  const m = /url\(["']?(.*?)["']?\)/.exec(el.style.backgroundImage || el.getAttribute('style') || '');
+  return m && m[1] ? {kind: 'background', src: m[1], srcset: '', sizes: '', width: 0, sources: []} : null;
+};
+"""
+
+# For each <img> (and CSS background image) inside the element, in document order.
+IMAGE_SOURCES_JS = DESCRIBE_IMAGE_JS + r"""
+const root = arguments[0];
+const out = [];
+root.querySelectorAll('img').forEach(img => out.push(describeImg(img)));
+root.querySelectorAll('[style*="background-image"]').forEach(el => {
+  const info = describeBackground(el);
+  if (info) out.push(info);
+});
+return out;
+"""
+
+
+def parse_srcset(srcset):
+    """Parse a srcset attribute into [{"url", "width", "density"}]. Follows the HTML
+    tokenizer closely enough that URLs containing commas (e.g. w_100,h_100) survive."""
+    out = []
+    if not srcset:
+        return out
+    s = srcset
+    n = len(s)
+    i = 0
+    while i < n:
+        while i < n and (s[i].isspace() or s[i] == ","):
+            i += 1
+        if i >= n:
+            break
+        start = i
+        while i < n and not s[i].isspace():
+            i += 1
+        url = s[start:i]
+        descriptor = ""
+        if url.endswith(","):
+            url = url.rstrip(",")
+        else:
+            start = i
+            depth = 0
+            while i < n:
+                ch = s[i]
+                if ch == "(":
+                    depth += 1
+                elif ch == ")":
+                    depth = max(0, depth - 1)
+                elif ch == "," and depth == 0:
+                    break
+                i += 1
+            descriptor = s[start:i].strip()
+            i += 1
+        if not url:
+            continue
+        width = density = None
+        for token in descriptor.split():
+            m = re.fullmatch(r"(\d+)w", token)
+            if m:
+                width = int(m.group(1))
+                continue
+            m = re.fullmatch(r"(\d*\.?\d+)x", token)
+            if m:
+                density = float(m.group(1))
+        if width is None and density is None:
+            density = 1.0
+        out.append({"url": url, "width": width, "density": density})
+    return out
+
+
+def _usable(url):
+    return bool(url) and url.startswith(("http://", "https://"))
+
+
+def candidates_for_image(info):
+    """All variants for one image description returned by IMAGE_SOURCES_JS."""
+    cands = []
+    base_width = info.get("width") or 0
+    for srcset in [info.get("srcset"), info.get("lazy_srcset")] + [s.get("srcset") for s in info.get("sources") or []]:
+        for c in parse_srcset(srcset):
+            if c["width"] is None and c["density"] and base_width:
+                c["width"] = int(c["density"] * base_width)
+            cands.append(c)
+    for key in ("lazy_src", "src"):
+        url = info.get(key)
+        if url:
+            known = next((c for c in cands if c["url"] == url), None)
+            if known is None:
+                cands.append({"url": url, "width": base_width or None, "density": None})
+    return [c for c in cands if _usable(c["url"])]
+
+
+def _rank(c):
+    # Width is the real size signal; density only orders variants without widths
+    return (c["width"] or 0, c["density"] or 0.0)
+
+
+def choose_variant(cands, policy="max", target_width=1080, min_width=320):
+    """Pick one candidate dict (or None) according to policy."""
+    if not cands:
+        return None
+    if policy not in VARIANT_POLICIES:
+        raise ValueError(f"Unknown image variant policy '{policy}'. Expected one of: {', '.join(VARIANT_POLICIES)}")
+    ordered = sorted(cands, key=_rank)
+    largest = ordered[-1]
+    if policy == "max":
+        return largest
+    threshold = target_width if policy == "target" else min_width
+    for c in ordered:
+        if c["width"] and c["width"] >= threshold:
+            return c
+    return largest
+
+
+def pick_variant_url(cands, policy="max", target_width=1080, min_width=320):
+    """URL of the candidate the policy picks, placeholders skipped ("" when there is none)."""
+    real = [c for c in cands if not c["width"] or c["width"] > PLACEHOLDER_MAX_WIDTH]
+    best = choose_variant(real or cands, policy, target_width, min_width)
+    return best["url"] if best else ""
+
+
+def urls_from_infos(infos, policy="max", target_width=1080, min_width=320):
+    """One URL per image description (placeholders skipped, duplicates dropped), in the given order."""
+    urls = []
+    seen = set()
+    for info in infos:
+        url = pick_variant_url(candidates_for_image(info), policy, target_width, min_width)
+        if url and url not in seen:
+            seen.add(url)
+            urls.append(url)
+    return urls
+
+
+def resolve_image_urls(driver, elem, policy="max", target_width=1080, min_width=320):
+    """One URL per image inside elem, chosen from src/srcset/<picture> variants, in document order."""
+    infos = driver.execute_script(IMAGE_SOURCES_JS, elem) or []
+    return urls_from_infos(infos, policy, target_width, min_width)
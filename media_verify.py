@@ -0,0 +1,194 @@
+import os
+import json
+import mimetypes
+from concurrent.futures import ThreadPoolExecutor
+
+from records import digest_bytes, digest_file
+from media_sinks import fetch_image, guess_extension, write_atomic
+
+
+# -------------------------
+# Media integrity check + repair
+# -------------------------
+# Every local image a record points at is checked for:
+#   missing    the file is gone
+#   truncated  its size differs from the size recorded when it was stored (that size
+#              is the full body: fetch_image rejects bodies shorter than Content-Length)
+#   corrupt    wrong magic bytes or a missing end marker (JPEG EOI, PNG IEND, GIF
+#              trailer, WebP RIFF length); an HTML error page saved as .jpg lands here
+#   hash       the SHA-256 differs from the recorded one
+# Only the first and last few bytes are read for the structure check; hashing is the
+# expensive part, so files whose size and mtime have not changed since they last
+# passed are skipped (state in a small JSON file next to the record store).
+# repair() re-downloads broken items from their source URL and rewrites them atomically.
+
+HEAD_BYTES = 32
+TAIL_BYTES = 32
+
+
+def sniff_format(head):
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    if head[4:8] == b"ftyp":
+        return "isobmff"  # AVIF / HEIC
+    return ""
+
+
+def check_structure(head, tail, size):
+    """Cheap decodability check from the first/last bytes. Returns an error string or ''."""
+    fmt = sniff_format(head)
+    if not fmt:
+        return "unrecognised image header"
+    if fmt == "jpeg" and b"\xff\xd9" not in tail:
+        return "JPEG end marker missing"
+    if fmt == "png" and not tail.endswith(b"IEND\xaeB`\x82"):
+        return "PNG IEND chunk missing"
+    if fmt == "gif" and not tail.rstrip(b"\x00").endswith(b";"):
+        return "GIF trailer missing"
+    if fmt == "webp" and int.from_bytes(head[4:8], "little") + 8 > size:
+        return "WebP shorter than its RIFF header says"
+    return ""
+
+
+def read_ends(path, size):
+    with open(path, "rb") as f:
+        head = f.read(HEAD_BYTES)
+        f.seek(max(0, size - TAIL_BYTES))
+        tail = f.read(TAIL_BYTES)
+    return head, tail
+
+
+class VerifyState:
+    """path -> [mtime_ns, size, sha256] of files that passed their last check."""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if path and os.path.isfile(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except Exception as e:
+                print(f"Ignoring unreadable verify state {path}: {e}")
+
+    def fresh(self, path, st, sha256):
+        entry = self.entries.get(path)
+        return bool(entry) and entry[0] == st.st_mtime_ns and entry[1] == st.st_size and (not sha256 or entry[2] == sha256)
+
+    def mark(self, path, sha256):
+        st = os.stat(path)
+        self.entries[path] = [st.st_mtime_ns, st.st_size, sha256]
+
+    def forget(self, path):
+        self.entries.pop(path, None)
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, separators=(",", ":"))
+        os.replace(tmp, self.path)
+
+
+def verify_item(item, state=None):
+    """Check one MediaItem's local file. Returns (status, detail); status 'ok', 'skipped' or a problem."""
+    path = item.path
+    try:
+        st = os.stat(path)
+    except OSError:
+        return "missing", path
+    if state is not None and state.fresh(path, st, item.sha256):
+        return "skipped", ""
+    if item.size and st.st_size != item.size:
+        return "truncated", f"{st.st_size} of {item.size} bytes"
+    head, tail = read_ends(path, st.st_size)
+    err = check_structure(head, tail, st.st_size)
+    if err:
+        return "corrupt", err
+    sha256, _size = digest_file(path)
+    if item.sha256 and sha256 != item.sha256:
+        return "hash", f"{sha256[:12]} != {item.sha256[:12]}"
+    if state is not None:
+        state.mark(path, sha256)
+    return "ok", ""
+
+
+class MediaVerifier:
+    def __init__(self, workers=None, state_path=None, full=False):
+        self.workers = workers or min(32, (os.cpu_count() or 1) * 4)
+        self.state = VerifyState(state_path)
+        if full:
+            self.state.entries = {}
+        self.counts = {}
+
+    def verify(self, records):
+        """Check every local image of `records` in parallel. Returns [(record, item, status, detail)] for problems."""
+        jobs = [(r, m) for r in records for m in r.media if m.path]
+        problems = []
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="verify") as pool:
+            results = pool.map(lambda job: verify_item(job[1], self.state), jobs)
+            for (record, item), (status, detail) in zip(jobs, results):
+                self.counts[status] = self.counts.get(status, 0) + 1
+                if status not in ("ok", "skipped"):
+                    self.state.forget(item.path)
+                    problems.append((record, item, status, detail))
+        self.state.save()
+        return problems
+
+    def repair(self, problems, session=None, rate=None):
+        """Re-download broken items and rewrite them in place. Returns the number repaired;
+        items whose path changed (different format than before) get the new path."""
+        import requests
+        session = session or requests.Session()
+
+        def fix(job):
+            record, item, _status, _detail = job
+            if not item.source_url.startswith(("http://", "https://")):
+                return "no source URL"
+            try:
+                data, content_type = fetch_image(item.source_url, session=session, rate=rate)
+            except Exception as e:
+                return str(e)
+            head = data[:HEAD_BYTES]
+            err = check_structure(head, data[-TAIL_BYTES:], len(data))
+            if err:
+                return "re-download is not an image either: " + err
+            path = item.path
+            ext = guess_extension(item.source_url, content_type)
+            base, old_ext = os.path.splitext(path)
+            if sniff_format(head) != _format_of_ext(old_ext):
+                path = base + ext
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            write_atomic(path, data)
+            item.path = path
+            item.sha256, item.size = digest_bytes(data)
+            item.mime = mimetypes.guess_type(path)[0] or (content_type or "").split(";")[0].strip()
+            self.state.mark(path, item.sha256)
+            return ""
+
+        repaired = 0
+        with ThreadPoolExecutor(max_workers=min(self.workers, 8), thread_name_prefix="repair") as pool:
+            for job, err in zip(problems, pool.map(fix, problems)):
+                if err:
+                    print(f"Could not repair {job[1].path}: {err}")
+                else:
+                    repaired += 1
+        self.state.save()
+        return repaired
+
+    def summary(self):
+        order = ("ok", "skipped", "missing", "truncated", "corrupt", "hash")
+        return "Verify | " + " ".join(f"{k}={self.counts.get(k, 0)}" for k in order)
+
+
+def _format_of_ext(ext):
+    ext = ext.lower()
+    return {".jpg": "jpeg", ".jpeg": "jpeg", ".png": "png", ".gif": "gif", ".webp": "webp",
+            ".avif": "isobmff", ".heic": "isobmff"}.get(ext, "")
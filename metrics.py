@@ -0,0 +1,207 @@
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# -------------------------
+# Metrics (Prometheus text format, standard library only)
+# -------------------------
+# Counters, gauges and histograms live in one process-wide registry and are always
+# updated (a lock and an add). Nothing is exposed unless serve() is called: the
+# scripts do that when METRICS_PORT is set, then
+#   curl http://127.0.0.1:9108/metrics
+# shows everything below. Point Prometheus (or any scraper of the text format) at it.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _fmt_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in pairs) + "}"
+
+
+def _fmt_value(v):
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, doc, labels=()):
+        self.name = name
+        self.doc = doc
+        self.label_names = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            items = sorted(self.values.items())
+        for key, value in items:
+            lines.extend(self._render_one(key, value))
+        return lines
+
+    def _render_one(self, key, value):
+        return [f"{self.name}{_fmt_labels(self.label_names, key)} {_fmt_value(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, doc, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, doc, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            counts, total, count = self.values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            # overflow beyond the last bucket only shows in _count / +Inf
+            self.values[key] = (counts, total + value, count + 1)
+
+    def totals(self, **labels):
+        """(count, sum) observed so far for one label set."""
+        with self.lock:
+            _counts, total, count = self.values.get(self._key(labels)) or (None, 0.0, 0)
+        return count, total
+
+    def time(self, **labels):
+        """Context manager observing the block's wall time in seconds."""
+        return _Timer(self, labels)
+
+    def _render_one(self, key, value):
+        counts, total, count = value
+        lines = []
+        cumulative = 0
+        for bound, n in zip(self.buckets, counts):
+            cumulative += n
+            lines.append(f"{self.name}_bucket{_fmt_labels(self.label_names, key, [('le', _fmt_value(float(bound)))])} {cumulative}")
+        lines.append(f"{self.name}_bucket{_fmt_labels(self.label_names, key, [('le', '+Inf')])} {count}")
+        lines.append(f"{self.name}_sum{_fmt_labels(self.label_names, key)} {_fmt_value(float(total))}")
+        lines.append(f"{self.name}_count{_fmt_labels(self.label_names, key)} {count}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, hist, labels):
+        self.hist = hist
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.hist.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+def render():
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for m in metrics:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+
+# -------------------------
+# What the scraper reports
+# -------------------------
+POSTS_DISCOVERED = Counter("scraper_posts_discovered_total", "Post containers/feed items found on the saved page", ("mode",))
+POSTS_PROCESSED = Counter("scraper_posts_processed_total", "Posts turned into records", ("mode",))
+STAGE_SECONDS = Histogram("scraper_stage_seconds", "Time spent per stage (extract, fetch, normalize, store, scroll, ...)", ("stage",))
+QUEUE_DEPTH = Gauge("scraper_queue_depth", "Items waiting or in flight", ("queue",))
+MEDIA_BYTES = Counter("scraper_media_bytes_total", "Image bytes by direction (fetched, captured, written, spooled, uploaded)", ("direction",))
+ERRORS = Counter("scraper_errors_total", "Errors by reason", ("reason",))
+RATE_EVENTS = Counter("scraper_rate_events_total", "Rate controller outcomes (ok, slow, throttled, error)", ("resource", "outcome"))
+RATE_LIMIT = Gauge("scraper_rate_limit_rps", "Current adaptive rate per resource class", ("resource",))
+RATE_WAIT = Counter("scraper_rate_wait_seconds_total", "Time spent waiting for rate limit tokens", ("resource",))
+BROWSER_RSS = Gauge("scraper_browser_rss_bytes", "Resident memory of the browser and its child processes")
+DRIVER_RECYCLES = Counter("scraper_driver_recycles_total", "Browsers replaced by the watchdog (posts, rss, unresponsive, session_lost)", ("reason",))
+CYCLES = Counter("scraper_daemon_cycles_total", "Daemon cycles by outcome (ok, failed)", ("outcome",))
+LAST_SUCCESS = Gauge("scraper_daemon_last_success_timestamp_seconds", "Unix time the last daemon cycle finished without error")
+
+
+# -------------------------
+# HTTP endpoint
+# -------------------------
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+
+
+def serve(port, addr="127.0.0.1"):
+    """Start the /metrics endpoint on a daemon thread (once per process). Returns the server,
+    or None when the port cannot be bound (metrics are optional; the run goes on without them)."""
+    global _server
+    if _server is None:
+        try:
+            _server = ThreadingHTTPServer((addr, int(port)), _Handler)
+        except OSError as e:
+            print(f"Metrics endpoint not started on {addr}:{port}: {e}")
+            return None
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+        print(f"Metrics on http://{addr}:{_server.server_address[1]}/metrics")
+    return _server
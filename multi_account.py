@@ -0,0 +1,296 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import importlib
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from exporters import write_csv_and_xlsx, merge_with_existing_csv, append_parquet, csv_columns
+from records import PostRecord, RecordStore
+
+
+# -------------------------
+# Multi-account / multi-profile runner
+# -------------------------
+# Runs one scraper per account in its own process with its own Chrome instance and
+# user-data-dir, at most `concurrency` at a time, then merges every account's rows
+# into one archive with an `account` column. Total runtime approaches that of the
+# slowest account rather than the sum.
+#
+# Each worker is a fresh (spawned) process: the account's settings are exported as
+# environment variables before the scraper module is imported, exactly as if the
+# script had been started by hand with those variables set. The scraper reads them
+# once, at import, so a worker process runs one account only (max_tasks_per_child=1;
+# on Python 3.10 a reused worker reloads the module instead).
+#
+# accounts.json:
+#   [
+#     {"name": "main", "profile_dir": "Default"},
+#     {"name": "art", "profile_dir": "Profile 2", "saved_url": "https://www.threads.com/saved"},
+#     {"name": "alt", "user_data_dir": "C:/chrome-alt", "profile_dir": "Default",
+#      "threads_id": "alt_handle", "threads_password": "..."}
+#   ]
+
+TARGET_MODULES = {
+    "local": "threads_saved_to_local",
+    "cloudinary": "threads_saved_to_cloudinary",
+}
+IMAGE_COLUMNS = {
+    "local": "image_paths",
+    "cloudinary": "image_urls",
+}
+
+# Rough per-browser budget used to cap concurrency
+CHROME_MB_PER_INSTANCE = int(os.getenv("CHROME_MB_PER_INSTANCE", "800"))
+CPUS_PER_INSTANCE = float(os.getenv("CPUS_PER_INSTANCE", "1.5"))
+
+# Profile folders that are pure cache and never needed to stay logged in
+_PROFILE_CACHE_DIRS = {"Cache", "Code Cache", "GPUCache", "DawnCache", "GrShaderCache", "ShaderCache",
+                       "Service Worker", "Media Cache", "Crashpad", "optimization_guide_model_store"}
+
+
+def load_accounts(path):
+    with open(path, "r", encoding="utf-8") as f:
+        accounts = json.load(f)
+    names = set()
+    for i, acc in enumerate(accounts):
+        acc.setdefault("name", acc.get("profile_dir") or f"account{i + 1}")
+        if acc["name"] in names:
+            raise ValueError(f"Duplicate account name in {path}: {acc['name']}")
+        names.add(acc["name"])
+    return accounts
+
+
+def available_memory_mb():
+    try:
+        import psutil
+        return psutil.virtual_memory().available / 1024 / 1024
+    except ImportError:
+        pass
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def compute_concurrency(requested, n_jobs):
+    """Cap concurrency by CPU cores and free memory (one Chrome per job)."""
+    limit = max(1, int((os.cpu_count() or 2) / CPUS_PER_INSTANCE))
+    mem = available_memory_mb()
+    if mem is not None:
+        limit = min(limit, max(1, int(mem // CHROME_MB_PER_INSTANCE)))
+    if requested:
+        limit = min(limit, requested)
+    return max(1, min(limit, n_jobs))
+
+
+def clone_profile(user_data_dir, profile_dir, dest_root):
+    """Copy one profile (minus caches) into a private user-data-dir. Chrome locks a whole
+    user-data-dir, so two profiles of the same dir cannot run side by side otherwise."""
+    dest = os.path.join(dest_root, "user-data")
+    os.makedirs(dest, exist_ok=True)
+    local_state = os.path.join(user_data_dir, "Local State")
+    if os.path.isfile(local_state):
+        shutil.copy2(local_state, dest)
+    shutil.copytree(os.path.join(user_data_dir, profile_dir), os.path.join(dest, profile_dir),
+                    ignore=lambda _d, names: [n for n in names if n in _PROFILE_CACHE_DIRS or n.startswith("Singleton")],
+                    dirs_exist_ok=True)
+    return dest
+
+
+def _account_env(account, target, work_dir, user_data_dir):
+    env = {
+        "CHROME_PROFILE_DIR": account.get("profile_dir", "Default"),
+        # shard output; the parent merges all shards into the real archive
+        "OUTPUT_XLSX_LOCAL": os.path.join(work_dir, "shard.xlsx"),
+        "OUTPUT_XLSX": os.path.join(work_dir, "shard.xlsx"),
+        "PARQUET_DIR": "",
+        # the shard's record store would be deleted with work_dir; the parent keeps one for all
+        "RECORDS_PATH": "",
+        "DAEMON": "0",
+        # one session cache file per account, shared by every run of that account
+        "SESSION_CACHE_NAME": account["name"],
+        # workers would all bind the parent's port; an account can set its own in "env"
+        "METRICS_PORT": "0",
+        # workers only queue images; the parent uploads the spool once every account is done
+        "SPOOL_UPLOAD": "0",
+    }
+    if user_data_dir:
+        env["CHROME_USER_DATA_DIR"] = user_data_dir
+    if target == "local":
+        images_root = os.getenv("IMAGES_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "pictures"))
+        env["IMAGES_DIR"] = os.path.join(images_root, account["name"])
+    if account.get("saved_url"):
+        env["THREADS_SAVED_URL"] = account["saved_url"]
+    if account.get("threads_id"):
+        env["THREADS_ID"] = account["threads_id"]
+    if account.get("threads_password"):
+        env["THREADS_PASSWORD"] = account["threads_password"]
+    for k, v in (account.get("env") or {}).items():
+        env[k] = str(v)
+    return env
+
+
+def run_account(account, target, max_posts, headless, clone):
+    """Worker entry point (runs in its own process)."""
+    started = time.time()
+    work_dir = tempfile.mkdtemp(prefix=f"threads_{account['name']}_")
+    try:
+        user_data_dir = account.get("user_data_dir")
+        if clone:
+            src = user_data_dir or os.getenv("CHROME_USER_DATA_DIR") or _default_user_data_dir()
+            user_data_dir = clone_profile(src, account.get("profile_dir", "Default"), work_dir)
+        env = _account_env(account, target, work_dir, user_data_dir)
+        os.environ.update(env)
+        if target == "local":
+            os.makedirs(env["IMAGES_DIR"], exist_ok=True)
+        name = TARGET_MODULES[target]
+        if name in sys.modules:
+            # this process ran another account before; its settings are still in the module
+            module = importlib.reload(sys.modules[name])
+        else:
+            module = importlib.import_module(name)
+        results = module.run(max_posts=max_posts, headless=headless) or []
+        for r in results:
+            r.account = account["name"]
+        # compact form keeps what crosses the process boundary small
+        return account["name"], [r.to_compact() for r in results], time.time() - started, None
+    except (Exception, SystemExit) as e:
+        # SystemExit too (e.g. missing Cloudinary credentials): one account must not end the whole run
+        return account["name"], [], time.time() - started, str(e) or type(e).__name__
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _default_user_data_dir():
+    if os.name == "nt":
+        return os.path.expandvars(r"%LOCALAPPDATA%\\Google\\Chrome\\User Data")
+    linux = os.path.expanduser("~/.config/google-chrome")
+    return linux if os.path.isdir(linux) else os.path.expanduser("~/Library/Application Support/Google/Chrome")
+
+
+def _spool_dirs(accounts):
+    default = os.getenv("SPOOL_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "upload_spool")
+    dirs = []
+    for acc in accounts:
+        d = (acc.get("env") or {}).get("SPOOL_DIR") or default
+        if d not in dirs and os.path.isfile(os.path.join(d, "spool.db")):
+            dirs.append(d)
+    return dirs
+
+
+def drain_spools(accounts, results):
+    """Upload the spools the cloudinary workers filled, once, from the parent (two workers
+    draining one spool would each only see the uploads they did themselves). Fills remote_url
+    on `results`; returns [(spool, jobs of posts archived by earlier runs)]."""
+    from upload_spool import UploadSpool, apply_to_records
+    from media_sinks import make_uploader
+    if os.getenv("SPOOL_UPLOAD", "1") not in ("1", "true", "True", "YES", "yes"):
+        return []
+    drained = []
+    for spool_dir in _spool_dirs(accounts):
+        spool = UploadSpool(spool_dir, keep_files=os.getenv("SPOOL_KEEP_FILES", "0") in ("1", "true", "True", "YES", "yes"))
+        try:
+            done = spool.drain(make_uploader(), workers=int(os.getenv("UPLOAD_WORKERS", "4")),
+                               max_attempts=int(os.getenv("UPLOAD_MAX_ATTEMPTS", "5")))
+        except (Exception, SystemExit) as e:
+            # e.g. missing credentials: the images stay spooled for `cli.py upload`
+            print(f"Spool {spool_dir} not uploaded: {e}")
+            spool.close()
+            continue
+        print(f"Uploaded {len(done)} spooled images")
+        print(spool.summary())
+        drained.append((spool, apply_to_records(results, done)))
+    return drained
+
+
+def run_accounts(accounts, target="local", max_posts=200, concurrency=None, headless=True,
+                 output_xlsx="saved_posts_multi.xlsx", parquet_dir=None, records_path=None):
+    """Scrape every account concurrently and merge everything into one archive. The post
+    records go to records_path (default: <output>.records.jsonl)."""
+    if target not in TARGET_MODULES:
+        raise ValueError(f"Unknown target '{target}'. Expected one of: {', '.join(TARGET_MODULES)}")
+    workers = compute_concurrency(concurrency, len(accounts))
+    # Accounts sharing a user-data-dir (the default one included) get a private copy each
+    dirs = [a.get("user_data_dir") or "" for a in accounts]
+    shared = {d for d in dirs if dirs.count(d) > 1}
+    print(f"Scraping {len(accounts)} accounts with up to {workers} browsers in parallel")
+
+    all_results = []
+    started = time.time()
+    ctx = multiprocessing.get_context("spawn")
+    pool_args = {"max_tasks_per_child": 1} if sys.version_info >= (3, 11) else {}
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, **pool_args) as pool:
+        futures = [pool.submit(run_account, a, target, max_posts, headless, (a.get("user_data_dir") or "") in shared)
+                   for a in accounts]
+        for fut in as_completed(futures):
+            name, results, secs, err = fut.result()
+            if err:
+                print(f"[{name}] failed after {secs:.0f}s: {err}")
+                continue
+            print(f"[{name}] {len(results)} posts in {secs:.0f}s")
+            all_results.extend(PostRecord.from_compact(r) for r in results)
+    print(f"All accounts done in {time.time() - started:.0f}s")
+    drained = drain_spools(accounts, all_results) if target == "cloudinary" else []
+
+    if records_path is None:
+        records_path = output_xlsx.replace(".xlsx", ".records.jsonl")
+    if records_path:
+        try:
+            RecordStore(records_path).append(all_results)
+        except Exception as e:
+            print(f"Could not append post records to {records_path}: {e}")
+
+    image_col = IMAGE_COLUMNS[target]
+    rows_new = [r.to_row(image_col) for r in all_results]
+    columns = ["account", "source_url", "text", image_col, "num_images", "scraped_at"]
+    csv_out = output_xlsx.replace(".xlsx", ".csv")
+    columns += [c for c in csv_columns(csv_out) if c not in columns]
+    if any(r.prompt for r in all_results) and "prompt" not in columns:
+        columns.append("prompt")
+    if parquet_dir:
+        try:
+            n = append_parquet(rows_new, parquet_dir, list_columns=(image_col,),
+                               extra_columns=("account", "prompt") if "prompt" in columns else ("account",))
+            print(f"Appended {n} rows to Parquet archive {parquet_dir}")
+        except Exception as e:
+            print(f"Parquet export failed: {e}")
+    rows = merge_with_existing_csv(csv_out, rows_new, key_columns=["account", "source_url", "text", image_col])
+    n = write_csv_and_xlsx(rows, columns, csv_out, output_xlsx)
+    print(f"Saved {n} total rows to {csv_out} and {output_xlsx}")
+    for spool, older_uploads in drained:
+        if older_uploads:
+            from upload_spool import publish_uploads
+            n = publish_uploads(spool, older_uploads, records_path, csv_out, output_xlsx, image_column=image_col)
+            print(f"Updated image URLs of {n} previously archived posts")
+        spool.close()
+    return all_results
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Scrape saved posts from several accounts/profiles in parallel")
+    ap.add_argument("accounts", help="JSON file with a list of accounts (name, profile_dir, user_data_dir, ...)")
+    ap.add_argument("--target", choices=sorted(TARGET_MODULES), default="local")
+    ap.add_argument("--max-posts", type=int, default=200)
+    ap.add_argument("--concurrency", type=int, default=0, help="upper bound; also capped by CPU and memory")
+    ap.add_argument("--headed", action="store_true", help="show browser windows")
+    ap.add_argument("--output", default=os.getenv("MULTI_OUTPUT_XLSX", "saved_posts_multi.xlsx"))
+    ap.add_argument("--parquet-dir", default=os.getenv("PARQUET_DIR", ""))
+    ap.add_argument("--records", default=os.getenv("MULTI_RECORDS_PATH"),
+                    help="post record store (default: <output>.records.jsonl; empty string disables it)")
+    args = ap.parse_args(argv)
+    run_accounts(load_accounts(args.accounts), target=args.target, max_posts=args.max_posts,
+                 concurrency=args.concurrency or None, headless=not args.headed,
+                 output_xlsx=args.output, parquet_dir=args.parquet_dir or None, records_path=args.records)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+import json
+import time
+import base64
+from collections import OrderedDict
+
+
+# -------------------------
+# Network-level media capture
+# -------------------------
+# Instead of re-downloading every image with `requests`, listen to the browser's
+# own network traffic (chromedriver performance log) and pull the response bodies
+# through DevTools (Network.getResponseBody). Images are then saved straight from
+# what the page already loaded, including lazy/responsive variants that never show
+# up in img.src.
+
+# dom: download DOM image URLs; network: save media bodies from the browser;
+# feed: rebuild posts from the page's JSON feed responses (see feed_capture.py)
+CAPTURE_MODES = ("dom", "network", "feed")
+
+# Keep at most this many captured bodies in memory (oldest evicted first)
+MAX_CAPTURED_ITEMS = 400
+MAX_CAPTURED_BYTES = 256 * 1024 * 1024
+
+
+def enable_performance_logging(opts):
+    """ChromeOptions must carry this capability before the driver starts."""
+    opts.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    return opts
+
+
+def fetch_response_body(driver, request_id):
+    res = driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": request_id})
+    body = res.get("body", "")
+    if res.get("base64Encoded"):
+        return base64.b64decode(body)
+    return body.encode("utf-8", errors="ignore")
+
+
+class NetworkEventReader:
+    """Drains the performance log once and hands Network.* events to every listener.
+    chromedriver's log is consumed on read, so all capture modes share one reader."""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self._listeners = []
+
+    def add_listener(self, fn):
+        self._listeners.append(fn)
+
+    def poll(self):
+        try:
+            entries = self.driver.get_log("performance")
+        except Exception:
+            return 0
+        n = 0
+        for entry in entries:
+            try:
+                msg = json.loads(entry["message"])["message"]
+            except Exception:
+                continue
+            method = msg.get("method", "")
+            if not method.startswith("Network."):
+                continue
+            params = msg.get("params", {})
+            for fn in self._listeners:
+                fn(method, params)
+            n += 1
+        return n
+
+
+class MediaCapture:
+    """Collects image responses (url, mime type, body bytes) seen by the browser."""
+
+    def __init__(self, driver, mime_prefixes=("image/",), min_bytes=512, reader=None):
+        self.driver = driver
+        self.reader = reader or NetworkEventReader(driver)
+        self.reader.add_listener(self._on_event)
+        self.mime_prefixes = tuple(mime_prefixes)
+        self.min_bytes = min_bytes
+        self._pending = {}            # requestId -> {url, mime, status}
+        self._captured = OrderedDict()  # url -> {url, mime, data}
+        self._captured_bytes = 0
+        self.bytes_captured = 0
+        self.enabled = False
+        try:
+            # Larger buffers so bodies are still available when we ask for them
+            driver.execute_cdp_cmd("Network.enable", {
+                "maxTotalBufferSize": 100 * 1024 * 1024,
+                "maxResourceBufferSize": 20 * 1024 * 1024,
+            })
+            self.enabled = True
+        except Exception as e:
+            print(f"Network capture unavailable, falling back to DOM downloads: {e}")
+
+    def _wanted(self, mime):
+        return bool(mime) and mime.lower().startswith(self.mime_prefixes)
+
+    def _store(self, url, mime, data):
+        if url in self._captured:
+            self._captured_bytes -= len(self._captured.pop(url)["data"])
+        self._captured[url] = {"url": url, "mime": mime, "data": data}
+        self._captured_bytes += len(data)
+        self.bytes_captured += len(data)
+        while self._captured and (len(self._captured) > MAX_CAPTURED_ITEMS or self._captured_bytes > MAX_CAPTURED_BYTES):
+            _, old = self._captured.popitem(last=False)
+            self._captured_bytes -= len(old["data"])
+
+    def _on_event(self, method, params):
+        if method == "Network.responseReceived":
+            resp = params.get("response", {})
+            mime = resp.get("mimeType", "")
+            url = resp.get("url", "")
+            if self._wanted(mime) and url.startswith(("http://", "https://")) and resp.get("status", 200) < 400:
+                self._pending[params.get("requestId")] = {"url": url, "mime": mime}
+        elif method == "Network.loadingFinished":
+            info = self._pending.pop(params.get("requestId"), None)
+            if not info:
+                return
+            try:
+                data = fetch_response_body(self.driver, params.get("requestId"))
+            except Exception:
+                return
+            if len(data) >= self.min_bytes:
+                self._store(info["url"], info["mime"], data)
+        elif method == "Network.loadingFailed":
+            self._pending.pop(params.get("requestId"), None)
+
+    def poll(self):
+        """Drain the performance log and fetch bodies for finished media responses."""
+        if not self.enabled:
+            return 0
+        return self.reader.poll()
+
+    def match_urls(self, urls, timeout=1.0):
+        """Captured media for each of the given DOM URLs, None where it was not captured, in
+        the order of `urls`. Waits up to `timeout` seconds for responses that are still in
+        flight. Only the exact URL matches: CDN size variants of one image differ only in the
+        query, and the URL asked for is the variant IMAGE_VARIANT_POLICY picked."""
+        deadline = time.time() + timeout
+        self.poll()
+        while self._pending and time.time() < deadline and any(u not in self._captured for u in urls):
+            time.sleep(0.1)
+            self.poll()
+        return [self._captured.get(u) for u in urls]
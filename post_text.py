@@ -0,0 +1,171 @@
+import re
+
+
+# -------------------------
+# Structured post text (one DOM pass)
+# -------------------------
+# Instead of guessing one caption line from innerText, a single script walks the
+# post container's text nodes in document order and files each one by where it
+# sits: the author's profile link (handle), <time> (timestamp and its "16h" label),
+# buttons (UI words and counters: the icon's aria-label plus the number next to it),
+# and everything else, grouped into blocks by their outermost span[dir=auto]
+# (line breaks from <br> kept). Links whose text starts with "#" are hashtags.
+# Python then drops UI-only blocks, joins the rest into the multi-line caption, and
+# splits off hashtags and a "Prompt:" section, so later filtering and search use the
+# stored fields instead of re-parsing caption text.
+
+POST_TEXT_JS = r"""
+const root = arguments[0];
+const norm = s => (s || '').replace(/\u00a0/g, ' ').replace(/[ \t]+/g, ' ').trim();
+const out = {handle: '', time: '', time_label: '', blocks: [], tags: [], counters: [], ui: []};
+
+for (const a of root.querySelectorAll('a[href*="/@"]')) {
+  const m = (a.getAttribute('href') || '').match(/\/@([^/?#]+)\/?(post\/)?/);
+  if (m && !m[2]) { out.handle = decodeURIComponent(m[1]); break; }
+}
+const time = root.querySelector('time');
+if (time) {
+  out.time = time.getAttribute('datetime') || '';
+  out.time_label = norm(time.innerText || time.getAttribute('title'));
+}
+for (const b of root.querySelectorAll('[role="button"], button')) {
+  if (b.parentElement && b.parentElement.closest('[role="button"], button')) continue;
+  const icon = b.querySelector('svg[aria-label]');
+  const label = norm(icon ? icon.getAttribute('aria-label') : b.getAttribute('aria-label'));
+  const text = norm(b.innerText);
+  if (label) out.counters.push([label, text]);
+  else if (text) out.ui.push(text);
+}
+
+const SKIP = 'time, button, [role="button"], script, style, svg';
+const blocks = new Map();
+const walker = document.createTreeWalker(root, NodeFilter.SHOW_TEXT | NodeFilter.SHOW_ELEMENT);
+for (let node = walker.nextNode(); node; node = walker.nextNode()) {
+  if (node.nodeType === 1 && node.tagName !== 'BR') continue;
+  const el = node.nodeType === 1 ? node : node.parentElement;
+  if (!el || el.closest(SKIP)) continue;
+  if (node.nodeType === 3 && !el.getClientRects().length) continue;  // hidden
+  const link = el.closest('a');
+  const href = link ? link.getAttribute('href') || '' : '';
+  if (link && out.handle && /\/@[^/?#]+\/?$/.test(href) && !/^[#@]/.test(norm(link.innerText))) continue;
+  let owner = el.closest('span[dir="auto"]');
+  for (let up = owner; up; up = up.parentElement && up.parentElement.closest('span[dir="auto"]')) {
+    if (!root.contains(up)) break;
+    owner = up;
+  }
+  owner = owner || el.closest('p, h1, h2, h3, li') || el;
+  if (!blocks.has(owner)) blocks.set(owner, []);
+  if (node.nodeType === 1) { blocks.get(owner).push('\n'); continue; }
+  blocks.get(owner).push(node.nodeValue);
+  if (link && node.nodeValue.trim().startsWith('#')) out.tags.push(norm(node.nodeValue));
+}
+for (const parts of blocks.values()) {
+  const text = parts.join('').split('\n').map(norm).join('\n').trim();
+  if (text) out.blocks.push(text);
+}
+return out;
+"""
+
+_NOISE_WORDS = {
+    "like", "likes", "reply", "replies", "repost", "reposts", "share", "follow", "following", "followers",
+    "translate", "see translation", "more", "see more", "less", "author", "edited", "verified", "views",
+    "comments", "posts", "·", "•", "…",
+}
+_TIME_LABEL_RE = re.compile(r"^\d{1,3}\s?[smhdw]$|^\d{1,2}/\d{1,2}/\d{2,4}$", re.I)
+_COUNT_RE = re.compile(r"^(\d+(?:[.,]\d+)?)\s*([kmb])?$", re.I)
+HASHTAG_RE = re.compile(r"(?<![\w&])#(\w[\w.]*\w|\w)", re.U)
+PROMPT_RE = re.compile(r"^\s*prompt\s*[:\-]\s*", re.I | re.M)
+_TRAILING_TAGS_RE = re.compile(r"(?:\s+#\w[\w.]*)+\s*$", re.U)
+
+# counter names by the icon's aria-label (first word, lower case)
+COUNTER_NAMES = {"like": "likes", "unlike": "likes", "reply": "replies", "comment": "replies",
+                 "repost": "reposts", "share": "shares", "send": "shares", "quote": "quotes"}
+
+
+def parse_count(text):
+    """'1,234' / '1.2K' / '3M' -> int; None when it is not a number."""
+    s = (text or "").strip().replace(" ", "")
+    if "," in s and re.fullmatch(r"\d{1,3}(,\d{3})+", s):
+        s = s.replace(",", "")
+    m = _COUNT_RE.match(s)
+    if not m:
+        return None
+    value = float(m.group(1).replace(",", "."))
+    return int(round(value * {"k": 1e3, "m": 1e6, "b": 1e9}.get((m.group(2) or "").lower(), 1)))
+
+
+def is_noise_line(line, handle=""):
+    low = line.lower().strip()
+    if not low or low in _NOISE_WORDS or low.isdigit() or _TIME_LABEL_RE.match(low):
+        return True
+    if handle and low.lstrip("@") == handle.lower():
+        return True
+    return parse_count(low) is not None
+
+
+def extract_hashtags(text, linked=()):
+    """Lower-case hashtags without '#', in order of first appearance."""
+    tags = []
+    for t in list(linked) + HASHTAG_RE.findall(text or ""):
+        t = t.lstrip("#").strip().lower()
+        if t and t not in tags:
+            tags.append(t)
+    return tags
+
+
+def split_prompt(caption):
+    """The paragraph after a "Prompt:" label in the caption ('' if there is none); it ends
+    at the first blank or hashtag-only line, and hashtags at its very end are dropped."""
+    m = PROMPT_RE.search(caption or "")
+    if not m:
+        return ""
+    lines = []
+    for line in caption[m.end():].splitlines():
+        if not line.strip() or all(w.startswith("#") for w in line.split()):
+            break
+        lines.append(line.strip())
+    return _TRAILING_TAGS_RE.sub("", "\n".join(lines))
+
+
+def counters_from(pairs):
+    out = {}
+    for label, text in pairs:
+        name = COUNTER_NAMES.get(label.lower().split(" ")[0])
+        n = parse_count(text)
+        if name and n is not None:
+            out[name] = n
+    return out
+
+
+def fields_from_dom(res):
+    """Turn POST_TEXT_JS output into {caption, author, posted_at, time_label, hashtags, counters, prompt}."""
+    handle = res.get("handle") or ""
+    time_label = res.get("time_label") or ""
+    ui = {u.lower() for u in res.get("ui") or []}
+    lines = []
+    for block in res.get("blocks") or []:
+        if block.lower() in ui or block == time_label:
+            continue
+        if all(is_noise_line(ln, handle) for ln in block.splitlines()):
+            continue
+        if block not in lines:
+            lines.append(block)
+    caption = "\n".join(lines)
+    return {
+        "caption": caption,
+        "author": handle,
+        "posted_at": res.get("time") or "",
+        "time_label": time_label,
+        "hashtags": extract_hashtags(caption, res.get("tags") or ()),
+        "counters": counters_from(res.get("counters") or ()),
+        "prompt": split_prompt(caption),
+    }
+
+
+def extract_post_fields(driver, elem):
+    """Structured text fields of one post container (one script round trip), or None on failure."""
+    try:
+        res = driver.execute_script(POST_TEXT_JS, elem)
+    except Exception:
+        return None
+    return fields_from_dom(res or {})
@@ -0,0 +1,246 @@
+import os
+import time
+import threading
+
+from metrics import RATE_EVENTS, RATE_LIMIT, RATE_WAIT, STAGE_SECONDS
+
+
+# -------------------------
+# Adaptive rate control
+# -------------------------
+# One controller paces every outbound action: page actions (scrolls, post
+# expansion), image fetches and uploads. Each resource class has its own token
+# bucket whose rate adapts AIMD-style:
+#   - success at normal latency  -> rate grows additively (up to max_rate)
+#   - slow responses             -> rate shrinks a little
+#   - 429 / 5xx / login challenge -> rate is halved and the class cools down
+# A global bucket caps the combined request rate (politeness budget).
+# Thread-safe, so concurrent download/upload workers can share it.
+
+RESOURCE_CLASSES = ("page", "image", "upload")
+
+
+def _env_float(name, default):
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return float(default)
+
+
+class TokenBucket:
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1.0, rate))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        """Take one token, returning how long the caller must wait for it (0 if available)."""
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1.0
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+
+class AdaptiveLimiter:
+    """Token bucket whose rate follows additive-increase / multiplicative-decrease."""
+
+    def __init__(self, name, rate, min_rate, max_rate, target_latency, increase=0.25, decrease=0.5, cooldown=5.0):
+        self.name = name
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.target_latency = target_latency
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.bucket = TokenBucket(rate, burst=max(1.0, rate))
+        RATE_LIMIT.set(rate, resource=name)
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+        self.stats = {"ok": 0, "slow": 0, "throttled": 0, "errors": 0, "waited_s": 0.0}
+
+    @property
+    def rate(self):
+        return self.bucket.rate
+
+    def _set_rate(self, rate):
+        rate = max(self.min_rate, min(self.max_rate, rate))
+        with self.bucket.lock:
+            self.bucket.rate = rate
+            self.bucket.burst = max(1.0, rate)
+            self.bucket.tokens = min(self.bucket.tokens, self.bucket.burst)
+        RATE_LIMIT.set(rate, resource=self.name)
+
+    def acquire(self):
+        waited = 0.0
+        pause = self.blocked_until - time.monotonic()
+        if pause > 0:
+            time.sleep(pause)
+            waited += pause
+        waited += self.bucket.acquire()
+        self.stats["waited_s"] += waited
+        if waited:
+            RATE_WAIT.inc(waited, resource=self.name)
+        return waited
+
+    def observe(self, latency=None, status=None, ok=True):
+        with self.lock:
+            if status == "challenge" or status == 429 or (isinstance(status, int) and status >= 500):
+                self.stats["throttled"] += 1
+                RATE_EVENTS.inc(resource=self.name, outcome="throttled")
+                self._set_rate(self.rate * self.decrease)
+                self.blocked_until = max(self.blocked_until, time.monotonic() + self.cooldown)
+            elif not ok:
+                self.stats["errors"] += 1
+                RATE_EVENTS.inc(resource=self.name, outcome="error")
+                self._set_rate(self.rate * 0.8)
+            elif latency is not None and latency > 2 * self.target_latency:
+                self.stats["slow"] += 1
+                RATE_EVENTS.inc(resource=self.name, outcome="slow")
+                self._set_rate(self.rate * 0.9)
+            else:
+                self.stats["ok"] += 1
+                RATE_EVENTS.inc(resource=self.name, outcome="ok")
+                self._set_rate(self.rate + self.increase)
+
+
+class RateController:
+    def __init__(self, limits=None, global_rate=None):
+        limits = limits or default_limits()
+        self.limiters = {name: AdaptiveLimiter(name, **cfg) for name, cfg in limits.items()}
+        global_rate = global_rate if global_rate is not None else _env_float("RATE_GLOBAL_RPS", "15")
+        self.global_bucket = TokenBucket(global_rate, burst=max(1.0, global_rate)) if global_rate > 0 else None
+
+    def acquire(self, cls):
+        waited = self.limiters[cls].acquire()
+        if self.global_bucket is not None:
+            waited += self.global_bucket.acquire()
+        return waited
+
+    def observe(self, cls, latency=None, status=None, ok=True):
+        self.limiters[cls].observe(latency=latency, status=status, ok=ok)
+
+    def penalize(self, cls="page", reason="challenge"):
+        """Back off hard, e.g. when the site shows a login/challenge page."""
+        print(f"Rate controller: backing off '{cls}' ({reason}); rate now {self.limiters[cls].rate * 0.5:.2f}/s")
+        self.limiters[cls].observe(status="challenge")
+
+    def timed(self, cls):
+        """Context manager: acquire a token, time the block and report the outcome.
+        Exceptions carrying a response/http status (requests.HTTPError) count as throttling when 429/5xx."""
+        return _Timed(self, cls)
+
+    def summary(self):
+        parts = []
+        for name, lim in self.limiters.items():
+            s = lim.stats
+            parts.append(f"{name}: {lim.rate:.2f}/s ok={s['ok']} slow={s['slow']} throttled={s['throttled']} "
+                         f"errors={s['errors']} waited={s['waited_s']:.1f}s")
+        return "Rate control | " + " | ".join(parts)
+
+
+class _Timed:
+    def __init__(self, controller, cls):
+        self.controller = controller
+        self.cls = cls
+
+    def __enter__(self):
+        self.controller.acquire(self.cls)
+        self.started = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        latency = time.monotonic() - self.started
+        STAGE_SECONDS.observe(latency, stage=self.cls)
+        if exc is None:
+            self.controller.observe(self.cls, latency=latency)
+        else:
+            status = None
+            resp = getattr(exc, "response", None)
+            if resp is not None:
+                status = getattr(resp, "status_code", None)
+            status = status or getattr(exc, "http_code", None)
+            self.controller.observe(self.cls, latency=latency, status=status, ok=False)
+        return False
+
+
+def default_limits():
+    return {
+        "page": dict(rate=_env_float("RATE_PAGE_RPS", "3"), min_rate=0.2, max_rate=_env_float("RATE_PAGE_MAX_RPS", "10"),
+                     target_latency=1.0, increase=0.25),
+        "image": dict(rate=_env_float("RATE_IMAGE_RPS", "8"), min_rate=0.5, max_rate=_env_float("RATE_IMAGE_MAX_RPS", "30"),
+                      target_latency=1.5, increase=0.5),
+        "upload": dict(rate=_env_float("RATE_UPLOAD_RPS", "4"), min_rate=0.2, max_rate=_env_float("RATE_UPLOAD_MAX_RPS", "15"),
+                       target_latency=3.0, increase=0.25),
+    }
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_controller():
+    """Process-wide controller shared by both scrapers and every worker thread."""
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = RateController()
+        return _controller
+
+
+# -------------------------
+# Page settling helpers (replace fixed sleeps)
+# -------------------------
+# Resolve after two animation frames: the browser has laid out and painted whatever
+# the last action changed. Capped so hidden/headless tabs cannot stall.
+SETTLE_JS = """
+const done = arguments[arguments.length - 1];
+const cap = setTimeout(() => done(false), arguments[0]);
+requestAnimationFrame(() => requestAnimationFrame(() => { clearTimeout(cap); done(true); }));
+"""
+
+
+def settle(driver, max_ms=250):
+    try:
+        driver.execute_async_script(SETTLE_JS, int(max_ms))
+    except Exception:
+        time.sleep(max_ms / 1000.0)
+
+
+def wait_for_scroll_growth(driver, last_height, timeout=3.0, poll=0.1):
+    """After scrolling, wait only until the page grows (new posts loaded) instead of a fixed pause.
+    Returns (new_height, elapsed_seconds)."""
+    started = time.monotonic()
+    height = last_height
+    while time.monotonic() - started < timeout:
+        time.sleep(poll)
+        try:
+            height = driver.execute_script("return document.body.scrollHeight")
+        except Exception:
+            break
+        if height != last_height:
+            break
+    return height, time.monotonic() - started
+
+
+def looks_like_challenge(driver):
+    """Cheap URL-only check (no DOM queries) for login/checkpoint redirects."""
+    try:
+        url = driver.current_url.lower()
+    except Exception:
+        return False
+    return any(m in url for m in ("login", "signin", "challenge", "checkpoint", "suspended"))
@@ -0,0 +1,245 @@
+import os
+import re
+import json
+import hashlib
+import itertools
+from dataclasses import dataclass, field
+
+
+# -------------------------
+# Post / media record model
+# -------------------------
+# One structure shared by both scrapers. Every output (CSV/XLSX rows, Parquet,
+# the record store) is produced from PostRecord, and a post's images stay grouped
+# under the post with a stable order and a single naming scheme:
+#   <scrape date>_<post slug>_<index>.<ext>     e.g. 20250102_C1abcDEF_00.jpg
+# A post is keyed by its normalized /post/ permalink. Containers where only the
+# saved-page URL or the author's profile link was found get an "unlinked:<hash>"
+# key of their own (see new_record), and that hash is their slug, so two such
+# posts never share a key or a file name.
+#
+# Records are slotted dataclasses (no per-instance __dict__) and serialize to a
+# compact positional JSON array, so large runs and the on-disk store stay small.
+
+RECORD_VERSION = 3
+
+
+@dataclass(slots=True)
+class MediaItem:
+    index: int
+    source_url: str = ""    # where the bytes came from (CDN URL)
+    path: str = ""          # local file, if stored locally
+    remote_url: str = ""    # e.g. Cloudinary secure_url
+    sha256: str = ""
+    size: int = 0
+    mime: str = ""
+
+    def to_compact(self):
+        return [self.index, self.source_url, self.path, self.remote_url, self.sha256, self.size, self.mime]
+
+    @classmethod
+    def from_compact(cls, data):
+        return cls(*data)
+
+
+@dataclass(slots=True)
+class PostRecord:
+    post_key: str           # normalized /post/ permalink (or "unlinked:<hash>"); identifies the post
+    permalink: str
+    caption: str = ""
+    scraped_at: str = ""
+    post_id: str = ""
+    author: str = ""
+    posted_at: str = ""
+    account: str = ""
+    prompt: str = ""        # "Prompt:" section of the caption, or the author's reply (comment_prompts.py)
+    hashtags: list = field(default_factory=list)    # lower case, without '#'
+    counters: dict = field(default_factory=dict)    # likes/replies/reposts/... when scraped
+    media: list = field(default_factory=list)
+
+    @property
+    def slug(self):
+        return post_slug(self.permalink, self.post_id, self.post_key)
+
+    def media_prefix(self, index):
+        """Filename / public_id prefix for the index-th image of this post."""
+        date = re.sub(r"[^0-9]", "", (self.scraped_at or "")[:10]) or "00000000"
+        return f"{date}_{self.slug}_{index:02d}"
+
+    def add_media(self, **kwargs):
+        item = MediaItem(index=len(self.media), **kwargs)
+        self.media.append(item)
+        return item
+
+    @property
+    def image_paths(self):
+        return [m.path for m in self.media if m.path]
+
+    @property
+    def image_urls(self):
+        return [m.remote_url for m in self.media if m.remote_url]
+
+    def to_row(self, image_column="image_paths"):
+        """Flat output row (lists are joined by the exporters)."""
+        images = self.image_paths if image_column == "image_paths" else self.image_urls
+        row = {
+            "source_url": self.permalink,
+            "text": self.caption,
+            image_column: images,
+            "num_images": len(images),
+            "scraped_at": self.scraped_at,
+        }
+        if self.account:
+            row["account"] = self.account
+        if self.prompt:
+            row["prompt"] = self.prompt
+        return row
+
+    def to_compact(self):
+        return [RECORD_VERSION, self.post_key, self.permalink, self.caption, self.scraped_at, self.post_id,
+                self.author, self.posted_at, self.account, self.prompt, self.hashtags, self.counters,
+                [m.to_compact() for m in self.media]]
+
+    @classmethod
+    def from_compact(cls, data):
+        version = data[0]
+        if version == 1:
+            # v1 had no prompt field
+            data = data[:9] + [""] + data[9:]
+        if version in (1, 2):
+            # v2 had no hashtags / counters
+            data = data[:10] + [[], {}] + data[10:]
+        elif version != RECORD_VERSION:
+            raise ValueError(f"Unsupported record version {version}")
+        rec = cls(*data[1:12])
+        rec.media = [MediaItem.from_compact(m) for m in data[12]]
+        return rec
+
+    def dumps(self):
+        return json.dumps(self.to_compact(), ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def loads(cls, line):
+        return cls.from_compact(json.loads(line))
+
+
+UNLINKED_PREFIX = "unlinked:"
+_unlinked_seq = itertools.count()
+
+
+def is_post_permalink(url):
+    return "/post/" in (url or "")
+
+
+def post_slug(permalink, post_id="", post_key=""):
+    m = re.search(r"/post/([A-Za-z0-9_-]+)", permalink or "")
+    if m:
+        return m.group(1)
+    if post_id:
+        return str(post_id)
+    if post_key.startswith(UNLINKED_PREFIX):
+        return post_key[len(UNLINKED_PREFIX):]
+    return hashlib.sha1((permalink or "").encode("utf-8")).hexdigest()[:10]
+
+
+def unlinked_key(*parts):
+    return UNLINKED_PREFIX + hashlib.sha1("\x1f".join(str(p) for p in parts).encode("utf-8")).hexdigest()[:12]
+
+
+def new_record(permalink, caption="", scraped_at="", unlinked_id=None, **kwargs):
+    """A record keyed by its /post/ permalink, else by its post id. Without either (the saved-page
+    URL, a profile link) the key is a hash of the URL, scrape time, caption and `unlinked_id`, which defaults to
+    this process and a running number, so every such post is its own record."""
+    from daemon import normalize_post_key
+    if is_post_permalink(permalink):
+        key = normalize_post_key(permalink)
+    elif kwargs.get("post_id"):
+        key = unlinked_key("post_id", kwargs["post_id"])
+    else:
+        if unlinked_id is None:
+            unlinked_id = f"{os.getpid()}.{next(_unlinked_seq)}"
+        key = unlinked_key(permalink or "", scraped_at or "", caption or "", unlinked_id)
+    return PostRecord(post_key=key, permalink=permalink or "", caption=caption or "", scraped_at=scraped_at, **kwargs)
+
+
+def record_from_row(row, image_column="image_paths", row_number=0):
+    """Rebuild a record from a CSV/XLSX row (archives written before the record store existed).
+    Hashes and sizes are unknown at this point. A row without a /post/ permalink is keyed by its
+    image files (by its row number when it has none), so rebuilding the same sheet gives the same keys."""
+    images = row.get(image_column) or ""
+    if isinstance(images, str):
+        images = [p.strip() for p in images.split(",") if p.strip()]
+    rec = new_record(row.get("source_url") or "", row.get("text") or "", row.get("scraped_at") or "",
+                     unlinked_id=",".join(images) or f"row {row_number}",
+                     account=row.get("account") or "", prompt=row.get("prompt") or "")
+    for img in images:
+        if image_column == "image_paths":
+            rec.add_media(path=img)
+        else:
+            rec.add_media(remote_url=img)
+    return rec
+
+
+def digest_bytes(data):
+    return hashlib.sha256(data).hexdigest(), len(data)
+
+
+def digest_file(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            h.update(chunk)
+            size += len(chunk)
+    return h.hexdigest(), size
+
+
+# -------------------------
+# Record store (append-only JSONL of compact records)
+# -------------------------
+class RecordStore:
+    def __init__(self, path):
+        self.path = path
+
+    def append(self, records):
+        n = 0
+        if not records:
+            return 0
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            for r in records:
+                f.write(r.dumps() + "\n")
+                n += 1
+        return n
+
+    def rewrite(self, records):
+        """Atomically replace the store's contents (temp file + rename)."""
+        tmp = self.path + ".tmp"
+        n = 0
+        with open(tmp, "w", encoding="utf-8") as f:
+            for r in records:
+                f.write(r.dumps() + "\n")
+                n += 1
+        os.replace(tmp, self.path)
+        return n
+
+    def __iter__(self):
+        if not os.path.isfile(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield PostRecord.loads(line)
+
+    def latest(self):
+        """Newest record per post_key (later lines win), in first-seen order."""
+        out = {}
+        for r in self:
+            out[r.post_key] = r
+        return list(out.values())
+
+    def keys(self):
+        return {r.post_key for r in self}
@@ -0,0 +1,269 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+
+# -------------------------
+# Record and replay of a saved-page session
+# -------------------------
+# Recording (needs a live, logged-in browser): scroll the saved page like the
+# scrapers do and, at every scroll step, keep the outerHTML of the post containers
+# that appeared in that step plus the bytes of every image the scraper would fetch.
+#
+# Replay (no network, no login): a local page appends the recorded steps one by one
+# as it is scrolled to the bottom, in a Chrome whose host resolver fails every
+# lookup, and ReplaySession serves the recorded image bytes to the media pipeline
+# in place of requests. The scrape engine runs unchanged on top, so extraction and
+# scroll changes can be timed on the same data run after run.
+#
+# A recording is a directory:
+#   manifest.json   source page, selector, counts
+#   steps.jsonl     one JSON list of container HTML per scroll step
+#   images.jsonl    {"url", "file", "content_type"} per recorded image
+#   images/         the image bytes, named by content hash
+# Feed mode is not covered; use FEED_RECORD_PATH fixtures for that.
+
+RECORD_STEP_JS = """
+const sels = arguments[0];
+if (!window.__psRecSel) {
+  window.__psRecSel = sels.find(s => document.querySelector(s)) || '';
+}
+if (!window.__psRecSel) return [window.__psRecSel, [], []];
+const els = [], html = [];
+for (const el of document.querySelectorAll(window.__psRecSel + ':not([data-ps-rec])')) {
+  if (el.closest('[data-ps-rec]')) continue;
+  html.push(el.outerHTML);
+  el.setAttribute('data-ps-rec', '1');
+  els.push(el);
+}
+return [window.__psRecSel, els, html];
+"""
+
+IMG_SRCS_JS = """
+return Array.from(arguments[0].querySelectorAll('img')).map(i => i.currentSrc || i.src || '');
+"""
+
+# Minimum height per container and a trailing spacer keep the page scrollable even
+# without the site's CSS, so scrollTo(bottom) always moves and the next step loads.
+REPLAY_HTML = """<!doctype html>
+<html><head><meta charset="utf-8"><base href="__BASE__"><title>Saved (replay)</title>
+<style>#ps-replay > * { display: block; min-height: 120px; } #ps-spacer { height: 110vh; }</style>
+</head><body>
+<div id="ps-replay"></div><div id="ps-spacer"></div>
+<script>
+const STEPS = __STEPS__;
+const DELAY_MS = __DELAY__;
+let next = 0, loading = false;
+function appendStep() {
+  if (next >= STEPS.length) return;
+  const tpl = document.createElement('template');
+  tpl.innerHTML = STEPS[next++].join('');
+  document.getElementById('ps-replay').appendChild(tpl.content);
+}
+function check() {
+  if (loading || next >= STEPS.length) return;
+  if (window.innerHeight + window.scrollY < document.body.scrollHeight - 200) return;
+  loading = true;
+  setTimeout(() => { appendStep(); loading = false; }, DELAY_MS);
+}
+appendStep();
+window.addEventListener('scroll', check);
+setInterval(check, 50);
+</script></body></html>
+"""
+
+
+# -------------------------
+# Recording
+# -------------------------
+class SessionRecorder:
+    def __init__(self, driver, out_dir, selectors=None, workers=4, rate=None):
+        from scrape_engine import CANDIDATE_POST_SELECTORS
+        from rate_control import get_controller
+        self.driver = driver
+        self.out_dir = out_dir
+        self.selectors = list(selectors or CANDIDATE_POST_SELECTORS)
+        self.workers = workers
+        self.rate = rate or get_controller()
+        self.image_dir = os.path.join(out_dir, "images")
+        os.makedirs(self.image_dir, exist_ok=True)
+        self.seen_urls = set()
+        self.stats = {"steps": 0, "posts": 0, "images": 0, "image_errors": 0, "bytes": 0}
+
+    def _image_urls(self, elem):
+        from scrape_engine import extract_image_urls_from_element
+        urls = list(extract_image_urls_from_element(elem))
+        try:
+            # the scraper falls back to plain src when nothing else was found
+            urls += self.driver.execute_script(IMG_SRCS_JS, elem) or []
+        except Exception:
+            pass
+        return [u for u in urls if u.startswith(("http://", "https://"))]
+
+    def _save_image(self, url):
+        from media_sinks import fetch_image, guess_extension
+        try:
+            data, content_type = fetch_image(url, rate=self.rate)
+        except Exception as e:
+            print(f"Could not record image {url[:80]}...: {e}")
+            return None
+        name = hashlib.sha256(data).hexdigest()[:24] + guess_extension(url, content_type)
+        path = os.path.join(self.image_dir, name)
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.write(data)
+        return {"url": url, "file": name, "content_type": content_type, "size": len(data)}
+
+    def record(self, max_posts=200, max_steps=50, max_idle_steps=3, scroll_wait_max=3.0):
+        from rate_control import wait_for_scroll_growth
+        driver = self.driver
+        selector = ""
+        idle = 0
+        last_height = driver.execute_script("return document.body.scrollHeight")
+        with open(os.path.join(self.out_dir, "steps.jsonl"), "w", encoding="utf-8") as steps_f, \
+                open(os.path.join(self.out_dir, "images.jsonl"), "w", encoding="utf-8") as images_f, \
+                ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="record") as pool:
+            while True:
+                selector, elems, html = driver.execute_script(RECORD_STEP_JS, self.selectors)
+                if max_posts is not None:
+                    elems, html = elems[:max_posts - self.stats["posts"]], html[:max_posts - self.stats["posts"]]
+                if html:
+                    idle = 0
+                    steps_f.write(json.dumps(html, ensure_ascii=False) + "\n")
+                    self.stats["steps"] += 1
+                    self.stats["posts"] += len(html)
+                    urls = []
+                    for elem in elems:
+                        for url in self._image_urls(elem):
+                            if url not in self.seen_urls:
+                                self.seen_urls.add(url)
+                                urls.append(url)
+                    for entry in pool.map(self._save_image, urls):
+                        if entry is None:
+                            self.stats["image_errors"] += 1
+                            continue
+                        images_f.write(json.dumps(entry) + "\n")
+                        self.stats["images"] += 1
+                        self.stats["bytes"] += entry["size"]
+                    print(f"Step {self.stats['steps']}: {len(html)} posts, {len(urls)} images")
+                else:
+                    idle += 1
+                if (max_posts is not None and self.stats["posts"] >= max_posts) or idle > max_idle_steps \
+                        or self.stats["steps"] >= max_steps:
+                    break
+                self.rate.acquire("page")
+                driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+                last_height, _waited = wait_for_scroll_growth(driver, last_height, timeout=scroll_wait_max)
+        manifest = dict(self.stats, version=1, source_url=driver.current_url, selector=selector,
+                        recorded_at=datetime.now().isoformat(timespec="seconds"))
+        with open(os.path.join(self.out_dir, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        return manifest
+
+
+# -------------------------
+# Replay
+# -------------------------
+class Recording:
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "manifest.json"), "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        with open(os.path.join(path, "steps.jsonl"), "r", encoding="utf-8") as f:
+            self.steps = [json.loads(line) for line in f if line.strip()]
+        self.images = {}
+        with open(os.path.join(path, "images.jsonl"), "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.images[entry["url"]] = entry
+
+    @property
+    def posts(self):
+        return sum(len(step) for step in self.steps)
+
+    def image(self, url):
+        """(bytes, content_type) of a recorded image, or None."""
+        entry = self.images.get(url)
+        if entry is None:
+            return None
+        with open(os.path.join(self.path, "images", entry["file"]), "rb") as f:
+            return f.read(), entry.get("content_type", "")
+
+    def page_path(self, delay_ms=0):
+        """Write (once per delay) and return the replay page for this recording."""
+        path = os.path.join(self.path, f"replay_{int(delay_ms)}ms.html")
+        if not os.path.exists(path):
+            origin = "https://www.threads.com/"
+            src = self.manifest.get("source_url") or ""
+            if src.startswith(("http://", "https://")):
+                origin = "/".join(src.split("/")[:3]) + "/"
+            steps = json.dumps(self.steps, ensure_ascii=False).replace("</", "<\\/")
+            html = REPLAY_HTML.replace("__BASE__", origin).replace("__DELAY__", str(int(delay_ms))).replace("__STEPS__", steps)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(html)
+        return path
+
+    def open(self, driver, delay_ms=0):
+        """Load the replay page in `driver`; the scrape engine can start right after."""
+        url = "file:///" + os.path.abspath(self.page_path(delay_ms)).replace("\\", "/").lstrip("/")
+        driver.get(url)
+        return url
+
+
+class _ReplayResponse:
+    def __init__(self, url, status_code, content=b"", content_type=""):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = {"Content-Type": content_type, "Content-Length": str(len(content))} if status_code == 200 else {}
+
+    def raise_for_status(self):
+        if self.status_code != 200:
+            import requests
+            raise requests.HTTPError(f"{self.status_code} not recorded: {self.url}", response=self)
+
+
+class ReplaySession:
+    """Stands in for requests.Session in fetch_image: recorded bytes, optional fixed latency,
+    404 for anything not recorded."""
+
+    def __init__(self, recording, latency=0.0):
+        self.recording = recording
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.misses = []
+
+    def get(self, url, headers=None, timeout=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        found = self.recording.image(url)
+        if found is None:
+            with self.lock:
+                self.misses.append(url)
+            return _ReplayResponse(url, 404)
+        data, content_type = found
+        return _ReplayResponse(url, 200, data, content_type)
+
+
+def make_replay_driver(headless=True, window_size="1920,1080"):
+    """Chrome that can only open local files: every host name fails to resolve."""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service as ChromeService
+    from selenium.webdriver.chrome.options import Options
+    from webdriver_manager.chrome import ChromeDriverManager
+    options = Options()
+    if headless:
+        options.add_argument("--headless=new")
+        options.add_argument("--disable-gpu")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument(f"--window-size={window_size}")
+    options.add_argument("--host-resolver-rules=MAP * ~NOTFOUND")
+    options.add_argument("--allow-file-access-from-files")
+    service = ChromeService(ChromeDriverManager().install())
+    return webdriver.Chrome(service=service, options=options)
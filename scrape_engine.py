@@ -0,0 +1,507 @@
+import os
+import re
+import time
+from datetime import datetime
+
+from tqdm import tqdm
+from selenium.webdriver.common.by import By
+
+from daemon import post_links, first_known_index
+from feed_capture import collect_feed_posts
+from carousel import carousel_image_urls
+from long_list import LongListStats, harvest_long_list
+from media_variants import VARIANT_POLICIES, resolve_image_urls, pick_variant_url
+from post_text import extract_post_fields, extract_hashtags, split_prompt
+from metrics import ERRORS, POSTS_DISCOVERED, POSTS_PROCESSED, STAGE_SECONDS
+from rate_control import get_controller, settle, wait_for_scroll_growth, looks_like_challenge
+from records import new_record
+
+RATE = get_controller()
+
+
+# -------------------------
+# Scrape engine (shared by both scripts)
+# -------------------------
+# Walks the saved page (DOM, long-list or JSON feed mode) and turns every post into
+# a PostRecord. Images are handed to a MediaPipeline (media_sinks.py), which decides
+# where the bytes go, so the same code feeds local files, Cloudinary or both.
+
+# Responsive images: which srcset/<picture> variant to download per image.
+# "max" (largest), "target" (smallest >= IMAGE_TARGET_WIDTH) or "min_above" (smallest >= IMAGE_MIN_WIDTH)
+IMAGE_VARIANT_POLICY = os.getenv("IMAGE_VARIANT_POLICY", "max").lower()
+IMAGE_TARGET_WIDTH = int(os.getenv("IMAGE_TARGET_WIDTH", "1080"))
+IMAGE_MIN_WIDTH = int(os.getenv("IMAGE_MIN_WIDTH", "320"))
+if IMAGE_VARIANT_POLICY not in VARIANT_POLICIES:
+    # checked here: the extractors below fall back quietly on any error, which would hide a typo
+    raise ValueError(f"Unknown IMAGE_VARIANT_POLICY '{IMAGE_VARIANT_POLICY}'. Expected one of: {', '.join(VARIANT_POLICIES)}")
+
+# Post text: classify the container's text nodes in one pass (post_text.py) into the full
+# caption, author, time, hashtags, counters and a "Prompt:" section. STRUCTURED_TEXT=0
+# goes back to the single best-guess caption line.
+STRUCTURED_TEXT = os.getenv("STRUCTURED_TEXT", "1") in ("1", "true", "True", "YES", "yes")
+
+# Multi-image posts: one async script per post (carousel.py) reads every carousel slide,
+# scrolling the carousel only to slides that have no URL yet and waiting at most
+# CAROUSEL_STEP_WAIT_MS per step. CAROUSEL_MEDIA=0 reads only the images already in the DOM.
+CAROUSEL_MEDIA = os.getenv("CAROUSEL_MEDIA", "1") in ("1", "true", "True", "YES", "yes")
+CAROUSEL_MAX_SLIDES = int(os.getenv("CAROUSEL_MAX_SLIDES", "20"))
+CAROUSEL_STEP_WAIT_MS = int(os.getenv("CAROUSEL_STEP_WAIT_MS", "250"))
+
+CANDIDATE_POST_SELECTORS = [
+    'article',
+    'div[role="article"]',
+    'div[data-testid="post"]',
+    'div[class*="post"]',
+    'div[class*="card"]',
+    'div[class*="thread"]',
+    'div[class*="item"]'
+]
+
+
+def utc_now_iso():
+    return datetime.utcnow().isoformat()
+
+
+# Heuristic caption picker from block text
+_UI_NOISE_WORDS = {
+    "like", "reply", "repost", "share", "follow", "translate", "more", "see more",
+    "followers", "following", "posts", "views", "comments"
+}
+
+def _pick_caption_from_text_block(text_block):
+    try:
+        lines = [" ".join(line.split()) for line in text_block.splitlines()]
+        candidates = []
+        for line in lines:
+            if not line:
+                continue
+            low = line.lower()
+            if any(w in low for w in _UI_NOISE_WORDS):
+                # skip pure UI lines
+                if len(low) <= 14:
+                    continue
+            if low.endswith("h") or low.endswith("m") or low.endswith("d"):
+                # likely a "16h" time label
+                if len(low) <= 3 and low[:-1].isdigit():
+                    continue
+            if low.isdigit():
+                continue
+            if len(line) < 2:
+                continue
+            candidates.append(line)
+        # Prefer the longest candidate as caption
+        if candidates:
+            candidates.sort(key=lambda s: len(s), reverse=True)
+            return candidates[0]
+        return ""
+    except Exception:
+        return ""
+
+
+def safe_get_text(elem):
+    try:
+        txt = elem.text
+        return txt.strip() if txt else ""
+    except Exception:
+        return ""
+
+
+PLAIN_IMG_SRCS_JS = """
+return Array.from(arguments[0].querySelectorAll('img')).map(i => i.getAttribute('src') || '');
+"""
+
+
+def extract_image_urls_from_element(elem):
+    # Preferred: one script round trip that resolves srcset/<picture> variants per image,
+    # every carousel slide included (in slide order)
+    if CAROUSEL_MEDIA:
+        try:
+            return carousel_image_urls(elem.parent, elem, max_slides=CAROUSEL_MAX_SLIDES,
+                                       step_wait_ms=CAROUSEL_STEP_WAIT_MS, policy=IMAGE_VARIANT_POLICY,
+                                       target_width=IMAGE_TARGET_WIDTH, min_width=IMAGE_MIN_WIDTH)
+        except Exception:
+            pass
+    try:
+        return resolve_image_urls(elem.parent, elem, policy=IMAGE_VARIANT_POLICY,
+                                  target_width=IMAGE_TARGET_WIDTH, min_width=IMAGE_MIN_WIDTH)
+    except Exception:
+        pass
+
+    urls = set()
+    try:
+        imgs = elem.find_elements(By.TAG_NAME, "img")
+        for im in imgs:
+            try:
+                src = im.get_attribute("src")
+                if src:
+                    urls.add(src)
+            except Exception:
+                pass
+
+        all_descendants = elem.find_elements(By.XPATH, ".//*")
+        for d in all_descendants:
+            try:
+                style = d.get_attribute("style")
+                if style and "background-image" in style:
+                    m = re.search(r'url\(["\']?(.*?)["\']?\)', style)
+                    if m:
+                        urls.add(m.group(1))
+            except Exception:
+                pass
+    except Exception:
+        pass
+    return list(urls)
+
+
+def expand_more(driver, elem):
+    """Click the "see more" / "more" buttons inside a post so the whole caption is rendered."""
+    try:
+        more_buttons = elem.find_elements(By.XPATH, ".//*[self::button or @role='button'][contains(translate(normalize-space(.), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'see more') or contains(translate(normalize-space(.), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'more') or contains(., '…')]")
+        for btn in more_buttons:
+            try:
+                driver.execute_script("arguments[0].click();", btn)
+            except Exception:
+                try:
+                    btn.click()
+                except Exception:
+                    pass
+    except Exception:
+        pass
+
+
+def extract_text_from_element(driver, elem, timeout=2, expand=True):
+    try:
+        # Ensure element is in viewport for virtualized UIs
+        try:
+            driver.execute_script("arguments[0].scrollIntoView({block:'center'});", elem)
+            settle(driver)
+        except Exception:
+            pass
+
+        # 1) Expand any "see more" / "more" buttons within the element
+        if expand:
+            expand_more(driver, elem)
+
+        # 2) Prefer the browser-computed innerText which respects visibility and CSS
+        inner_text = None
+        try:
+            inner_text = driver.execute_script("return arguments[0].innerText;", elem)
+            if inner_text and inner_text.strip():
+                # Try to extract likely caption from block text
+                picked = _pick_caption_from_text_block(inner_text)
+                if picked:
+                    return picked
+                return " ".join(inner_text.split())
+        except Exception:
+            pass
+
+        # 3) Fallback to WebElement.text
+        txt = safe_get_text(elem)
+        if txt:
+            return txt
+
+        # 4) Threads-specific: try to capture caption near a Translate button
+        try:
+            translate_btns = elem.find_elements(By.XPATH, ".//*[self::button or @role='button'][contains(translate(normalize-space(.), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'translate')]")
+            for tbtn in translate_btns:
+                try:
+                    container = tbtn
+                    for _ in range(3):
+                        container = container.find_element(By.XPATH, "..")
+                    candidates = container.find_elements(By.XPATH, ".//span|.//p|.//div")
+                    texts = []
+                    for c in candidates:
+                        s = safe_get_text(c)
+                        if not s:
+                            continue
+                        ss = s.strip()
+                        if len(ss) < 2:
+                            continue
+                        if ss.lower() in ("translate", "more", "see more"):
+                            continue
+                        if ss.isdigit():
+                            continue
+                        texts.append(ss)
+                    if texts:
+                        # Use heuristic on joined text
+                        joined = "\n".join(texts)
+                        picked = _pick_caption_from_text_block(joined)
+                        if picked:
+                            return picked
+                        return " ".join(joined.split())
+                except Exception:
+                    continue
+        except Exception:
+            pass
+
+        # 5) Last resort: join span/p/div texts within elem
+        try:
+            text_nodes = elem.find_elements(By.XPATH, ".//span|.//p|.//div")
+            combined = " ".join([safe_get_text(x) for x in text_nodes if safe_get_text(x)])
+            combined = combined.strip()
+            if combined:
+                picked = _pick_caption_from_text_block(combined)
+                if picked:
+                    return picked
+            return combined
+        except Exception:
+            return ""
+    except Exception:
+        return ""
+
+
+def scrape_from_feed(driver, media, max_posts=None, known_keys=None, timestamp=utc_now_iso, record_to=None):
+    """Build posts from the saved page's JSON feed responses instead of walking the DOM."""
+    posts = collect_feed_posts(driver, max_posts=max_posts, record_to=record_to, known_keys=known_keys)
+    POSTS_DISCOVERED.inc(len(posts), mode="feed")
+    results = []
+    for post in tqdm(posts, desc="Processing posts"):
+        record = new_record(post["permalink"], post["caption"], timestamp(), post_id=str(post.get("post_id") or ""),
+                            author=post.get("username") or "", posted_at=post.get("posted_at") or "",
+                            hashtags=extract_hashtags(post["caption"]), counters=post.get("counters") or {},
+                            prompt=split_prompt(post["caption"]))
+        for cands in post["image_variants"]:
+            img_url = pick_variant_url(cands, IMAGE_VARIANT_POLICY, IMAGE_TARGET_WIDTH, IMAGE_MIN_WIDTH)
+            if img_url:
+                media.submit(record, img_url)
+        results.append(record)
+        POSTS_PROCESSED.inc(mode="feed")
+    return results
+
+
+def scrape_post_element(driver, elem, media, capture=None, timestamp=utc_now_iso):
+    """Extract one post container into a PostRecord and queue its images on the media pipeline."""
+    RATE.acquire("page")
+    started = time.perf_counter()
+    src_url = ""
+    try:
+        # Prefer the post permalink over the author's profile link
+        try:
+            a = elem.find_element(By.CSS_SELECTOR, "a[href*='/post/']")
+        except Exception:
+            a = elem.find_element(By.TAG_NAME, "a")
+        src_url = a.get_attribute("href") or ""
+    except Exception:
+        src_url = driver.current_url
+
+    # Scroll into view then use robust text extractor
+    try:
+        driver.execute_script("arguments[0].scrollIntoView({block:'center'});", elem)
+        settle(driver)
+    except Exception:
+        pass
+    fields = None
+    if STRUCTURED_TEXT:
+        expand_more(driver, elem)
+        fields = extract_post_fields(driver, elem)
+    if fields and fields["caption"]:
+        record = new_record(src_url, fields["caption"], timestamp(), author=fields["author"],
+                            posted_at=fields["posted_at"], hashtags=fields["hashtags"],
+                            counters=fields["counters"], prompt=fields["prompt"])
+    else:
+        text = extract_text_from_element(driver, elem, expand=not STRUCTURED_TEXT)
+        record = new_record(src_url, text, timestamp(), author=(fields or {}).get("author", ""),
+                            posted_at=(fields or {}).get("posted_at", ""), hashtags=extract_hashtags(text))
+
+    img_urls = extract_image_urls_from_element(elem)
+    # Keep what the browser already received and only download what it never loaded;
+    # submit in page order either way, since the order fixes each image's index
+    hits = capture.match_urls(img_urls) if capture is not None else [None] * len(img_urls)
+    for img_url, m in zip(img_urls, hits):
+        if m is not None:
+            media.submit(record, m["url"], m["data"], m["mime"])
+        elif img_url.startswith("http://") or img_url.startswith("https://"):
+            media.submit(record, img_url)
+
+    # Plain <img src> as the last resort: at once when nothing was found above, else (read
+    # now, while the element exists) once the pipeline drains without storing any image
+    try:
+        plain = [u for u in driver.execute_script(PLAIN_IMG_SRCS_JS, elem) or [] if u.startswith(("http://", "https://"))]
+    except Exception:
+        plain = []
+    plain = [u for u in dict.fromkeys(plain) if u not in img_urls]
+    if not record.media:
+        for src in plain:
+            media.submit(record, src)
+    else:
+        media.submit_fallback(record, plain)
+    STAGE_SECONDS.observe(time.perf_counter() - started, stage="extract")
+    return record
+
+
+def scrape_long_list(driver, media, max_posts=None, capture=None, known_keys=None, timestamp=utc_now_iso,
+                     selectors=CANDIDATE_POST_SELECTORS):
+    """Long-list mode: extract posts batch by batch while scrolling and prune each batch from the DOM."""
+    stats = LongListStats()
+    results = []
+    progress = tqdm(desc="Processing posts", total=max_posts)
+    for batch in harvest_long_list(driver, selectors, max_posts=max_posts, known_keys=known_keys, stats=stats, rate=RATE):
+        POSTS_DISCOVERED.inc(len(batch), mode="long_list")
+        for elem in batch:
+            try:
+                results.append(scrape_post_element(driver, elem, media, capture, timestamp))
+                POSTS_PROCESSED.inc(mode="long_list")
+            except Exception as e:
+                ERRORS.inc(reason="element")
+                print(f"Error processing element #{progress.n}: {e}")
+            progress.update(1)
+    progress.close()
+    print(stats.summary())
+    return results
+
+
+def scrape_with_watchdog(watchdog, media, max_posts=None, known_keys=None, timestamp=utc_now_iso,
+                         selectors=CANDIDATE_POST_SELECTORS):
+    """DOM capture for long runs: long-list batches on a browser the watchdog (driver_watchdog.py)
+    may replace between posts. After a replacement the saved page has been opened again;
+    posts processed before (by permalink, else by list position) are skipped while
+    scrolling back down, and the run goes on."""
+    from driver_watchdog import RecycleNeeded
+    results = []
+    done = set()
+    progress = tqdm(desc="Processing posts", total=max_posts)
+    while True:
+        driver = watchdog.driver
+        stats = LongListStats()
+        reason = None
+        remaining = None if max_posts is None else max_posts - len(results)
+        try:
+            for batch in harvest_long_list(driver, selectors, max_posts=remaining, known_keys=known_keys, stats=stats,
+                                           rate=RATE, skip_keys=done):
+                POSTS_DISCOVERED.inc(len(batch), mode="long_list")
+                for elem, key in batch:
+                    reason = watchdog.check()
+                    if reason:
+                        raise RecycleNeeded(*reason)
+                    try:
+                        record = scrape_post_element(driver, elem, media, watchdog.capture, timestamp)
+                    except Exception as e:
+                        ERRORS.inc(reason="element")
+                        print(f"Error processing element #{progress.n}: {e}")
+                        reason = watchdog.note_error(e)
+                        if reason:
+                            raise RecycleNeeded(*reason)
+                        continue
+                    watchdog.note_ok()
+                    results.append(record)
+                    done.add(key)
+                    POSTS_PROCESSED.inc(mode="long_list")
+                    progress.update(1)
+        except RecycleNeeded as e:
+            reason = e.args
+        except Exception as e:
+            # scrolling/harvesting itself failed; only a dead browser is worth a restart
+            ERRORS.inc(reason="harvest")
+            if watchdog.ping():
+                print(f"Scrolling stopped: {e}")
+            else:
+                reason = ("unresponsive", f"while scrolling: {str(e).strip()[:120]}")
+        print(stats.summary())
+        if not reason:
+            break
+        if watchdog.exhausted:
+            print(f"Giving up after {len(watchdog.recycles)} browser restarts; keeping {len(results)} posts.")
+            break
+        watchdog.recycle(*reason)
+    progress.close()
+    print(watchdog.summary())
+    return results
+
+
+def scrape_from_dom(driver, media, max_posts=None, capture=None, known_keys=None, timestamp=utc_now_iso, long_list=False):
+    """Find post containers on the page, scroll for more, then extract text and images per post."""
+    if long_list:
+        return scrape_long_list(driver, media, max_posts, capture, known_keys, timestamp)
+
+    post_elements = []
+    for sel in CANDIDATE_POST_SELECTORS:
+        try:
+            elems = driver.find_elements(By.CSS_SELECTOR, sel)
+            if elems:
+                post_elements = elems
+                print(f"Found {len(elems)} elements using selector '{sel}'")
+                break
+        except Exception:
+            continue
+
+    if not post_elements:
+        imgs = driver.find_elements(By.TAG_NAME, "img")
+        print(f"No post elements found. Found {len(imgs)} images on page; will try to group them.")
+        for im in imgs:
+            try:
+                parent = im.find_element(By.XPATH, "..")
+                post_elements.append(parent)
+            except Exception:
+                continue
+
+    # Incremental mode: everything from the first already-archived post down is old
+    stop_at = first_known_index(post_links(driver, post_elements), known_keys) if known_keys else None
+
+    # Wait only as long as the page needs to load the next batch (capped), paced by the rate controller
+    SCROLL_WAIT_MAX = 3.0
+    last_height = driver.execute_script("return document.body.scrollHeight")
+    scrolls = 0
+    while stop_at is None and (max_posts is None or len(post_elements) < max_posts) and scrolls < 20:
+        RATE.acquire("page")
+        t0 = time.perf_counter()
+        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+        grown_height, waited = wait_for_scroll_growth(driver, last_height, timeout=SCROLL_WAIT_MAX)
+        STAGE_SECONDS.observe(time.perf_counter() - t0, stage="scroll")
+        if grown_height != last_height:
+            RATE.observe("page", latency=waited)
+        if looks_like_challenge(driver):
+            RATE.penalize("page", "login/challenge redirect while scrolling")
+            break
+        new_elems = []
+        for sel in CANDIDATE_POST_SELECTORS:
+            try:
+                elems = driver.find_elements(By.CSS_SELECTOR, sel)
+                if elems:
+                    new_elems = elems
+                    break
+            except Exception:
+                continue
+        if new_elems:
+            post_elements = new_elems
+            if known_keys:
+                stop_at = first_known_index(post_links(driver, post_elements), known_keys)
+        new_height = driver.execute_script("return document.body.scrollHeight")
+        if new_height == last_height:
+            break
+        last_height = new_height
+        scrolls += 1
+
+    if stop_at is not None:
+        print(f"Reached an already archived post after {stop_at} new posts; stopping scroll.")
+        post_elements = post_elements[:stop_at]
+    print(f"Total candidate post elements: {len(post_elements)}")
+    if max_posts:
+        post_elements = post_elements[:max_posts]
+    POSTS_DISCOVERED.inc(len(post_elements), mode="dom")
+
+    results = []
+    for idx, elem in enumerate(tqdm(post_elements, desc="Processing posts")):
+        try:
+            results.append(scrape_post_element(driver, elem, media, capture, timestamp))
+            POSTS_PROCESSED.inc(mode="dom")
+        except Exception as e:
+            ERRORS.inc(reason="element")
+            print(f"Error processing element #{idx}: {e}")
+            continue
+    return results
+
+
+def scrape_saved_page(driver, media, capture_mode="dom", max_posts=None, capture=None, known_keys=None,
+                      timestamp=utc_now_iso, long_list=False, feed_record_path=None, watchdog=None):
+    """Scrape the already opened saved page in the given capture mode. Call media.drain()
+    before using the records' media. With a watchdog, DOM and network capture run in
+    long-list batches and survive browser restarts (the watchdog's driver is used).
+    With known_keys, every post above the first archived one is taken and max_posts is
+    ignored: the next cycle stops at this cycle's newest post, so a cap would lose the rest."""
+    if known_keys:
+        max_posts = None
+    if watchdog is not None and capture_mode != "feed":
+        return scrape_with_watchdog(watchdog, media, max_posts, known_keys, timestamp)
+    if capture_mode == "feed":
+        return scrape_from_feed(driver, media, max_posts, known_keys, timestamp, record_to=feed_record_path)
+    return scrape_from_dom(driver, media, max_posts, capture, known_keys, timestamp, long_list=long_list)
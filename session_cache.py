@@ -0,0 +1,177 @@
+import os
+import re
+import json
+import time
+from urllib.parse import urlparse
+
+
+# -------------------------
+# Encrypted login/session cache
+# -------------------------
+# After a run that ends logged in, the site's cookies and localStorage are saved,
+# encrypted, to a local file. The next run (or another process) restores them into
+# its fresh browser before opening the saved page, so the login form, the OTP poll
+# and the interactive prompts are skipped almost always.
+#
+# Encryption uses Fernet (cryptography package). The key comes from SESSION_CACHE_KEY
+# or from a key file created next to the cache (owner-only permissions). Without
+# cryptography installed the cache is simply not used.
+
+# Cookies that only exist while logged in
+AUTH_COOKIES = tuple(c.strip() for c in os.getenv("SESSION_AUTH_COOKIES", "sessionid").split(",") if c.strip())
+
+DUMP_STORAGE_JS = """
+const out = {};
+for (let i = 0; i < localStorage.length; i++) { const k = localStorage.key(i); out[k] = localStorage.getItem(k); }
+return out;
+"""
+LOAD_STORAGE_JS = """
+const items = arguments[0];
+for (const k in items) { try { localStorage.setItem(k, items[k]); } catch (e) {} }
+return Object.keys(items).length;
+"""
+
+
+def _read_key(key_path):
+    try:
+        with open(key_path, "rb") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return b""
+
+
+def _shared_key(key_path, generate):
+    """The key in key_path, creating it if needed. Parallel runs race on the first use: the
+    key is written to a private temp file and linked into place, which fails for every run
+    but the first, and those read the winner's (complete) key instead."""
+    key = _read_key(key_path)
+    if key:
+        return key
+    os.makedirs(os.path.dirname(os.path.abspath(key_path)), exist_ok=True)
+    tmp = f"{key_path}.{os.getpid()}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(generate())
+    try:
+        try:
+            os.link(tmp, key_path)
+        except FileExistsError:
+            if _read_key(key_path):
+                return _read_key(key_path)
+            os.replace(tmp, key_path)  # an empty key file left by a crash
+        except OSError:
+            os.replace(tmp, key_path)  # no hard links on this file system
+    finally:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+    return _read_key(key_path)
+
+
+def _fernet(key_path):
+    try:
+        from cryptography.fernet import Fernet
+    except ImportError:
+        return None
+    key = os.getenv("SESSION_CACHE_KEY", "").encode() or _shared_key(key_path, Fernet.generate_key)
+    return Fernet(key)
+
+
+def cache_name(*parts):
+    name = "_".join(str(p) for p in parts if p)
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", name) or "default"
+
+
+class SessionCache:
+    def __init__(self, cache_dir, name="default", ttl_hours=72.0):
+        self.path = os.path.join(cache_dir, f"{name}.session")
+        self.key_path = os.path.join(cache_dir, "session.key")
+        self.ttl = ttl_hours * 3600
+        self.fernet = _fernet(self.key_path)
+        if self.fernet is None:
+            print("Session cache disabled: install 'cryptography' to enable it.")
+
+    def load(self):
+        """Decrypted session dict, or None if missing, unreadable or expired (expired files are removed)."""
+        if self.fernet is None or not os.path.isfile(self.path):
+            return None
+        try:
+            with open(self.path, "rb") as f:
+                data = json.loads(self.fernet.decrypt(f.read()))
+        except Exception as e:
+            print(f"Ignoring unreadable session cache {self.path}: {e}")
+            return None
+        if data.get("expires_at", 0) <= time.time():
+            self.clear()
+            return None
+        return data
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def save(self, driver):
+        if self.fernet is None:
+            return False
+        now = time.time()
+        cookies = driver.get_cookies()
+        expires_at = now + self.ttl
+        for c in cookies:
+            # never trust the cache beyond the auth cookie's own expiry
+            if c.get("name") in AUTH_COOKIES and c.get("expiry"):
+                expires_at = min(expires_at, float(c["expiry"]))
+        try:
+            storage = driver.execute_script(DUMP_STORAGE_JS) or {}
+        except Exception:
+            storage = {}
+        data = {"saved_at": now, "expires_at": expires_at, "url": driver.current_url,
+                "cookies": cookies, "local_storage": storage}
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = self.path + ".tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(self.fernet.encrypt(json.dumps(data).encode("utf-8")))
+        os.replace(tmp, self.path)
+        return True
+
+    def restore(self, driver, site_url):
+        """Put cached cookies/localStorage into the browser. Needs one cheap navigation to the
+        site's origin first (cookies can only be set for the current domain). Returns True if restored."""
+        data = self.load()
+        if not data:
+            return False
+        origin = "{0.scheme}://{0.netloc}".format(urlparse(site_url))
+        try:
+            driver.get(origin + "/robots.txt")
+            for c in data.get("cookies", []):
+                cookie = {k: v for k, v in c.items() if k in ("name", "value", "path", "domain", "secure", "httpOnly", "expiry", "sameSite")}
+                if "expiry" in cookie:
+                    cookie["expiry"] = int(cookie["expiry"])
+                if cookie.get("sameSite") not in (None, "Strict", "Lax", "None"):
+                    cookie.pop("sameSite")
+                try:
+                    driver.add_cookie(cookie)
+                except Exception:
+                    continue
+            if data.get("local_storage"):
+                driver.execute_script(LOAD_STORAGE_JS, data["local_storage"])
+        except Exception as e:
+            print(f"Could not restore cached session: {e}")
+            return False
+        age_h = (time.time() - data.get("saved_at", 0)) / 3600
+        print(f"Restored cached session ({age_h:.1f}h old)")
+        return True
+
+
+def probe_logged_in(driver):
+    """Cheap check without DOM queries: an auth cookie is present and we were not sent to a login page."""
+    try:
+        url = driver.current_url.lower()
+        if any(m in url for m in ("login", "signin", "challenge", "checkpoint")):
+            return False
+        return any(driver.get_cookie(name) for name in AUTH_COOKIES)
+    except Exception:
+        return False
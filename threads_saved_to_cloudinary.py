@@ -1,10 +1,5 @@
 import os
 import time
-import io
-from datetime import datetime
-import requests
-import pandas as pd
-from tqdm import tqdm
 
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service as ChromeService
@@ -14,8 +9,18 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
 from webdriver_manager.chrome import ChromeDriverManager
-import cloudinary
-import cloudinary.uploader
+
+from browser_profiles import PROFILE_PRODUCTION, resolve_profile, apply_production_options, finish_driver_setup, browser_rss_mb
+from network_capture import CAPTURE_MODES, MediaCapture, enable_performance_logging
+from exporters import write_csv_and_xlsx, append_parquet, merge_with_existing_csv, csv_columns
+from daemon import run_forever, load_known_keys
+from rate_control import get_controller, looks_like_challenge
+from session_cache import probe_logged_in
+from records import RecordStore
+from media_sinks import MediaPipeline, make_sink, make_uploader
+import media_sinks
+from metrics import STAGE_SECONDS, serve as serve_metrics
+from scrape_engine import scrape_saved_page, utc_now_iso
 
 
 # -------------------------
@@ -42,7 +47,9 @@ DEFAULT_WIN_USER_DATA = os.path.expandvars(r"%LOCALAPPDATA%\\Google\\Chrome\\Use
 DEFAULT_LINUX_USER_DATA = os.path.expanduser("~/.config/google-chrome")
 DEFAULT_MAC_USER_DATA = os.path.expanduser("~/Library/Application Support/Google/Chrome")
 
-if os.name == "nt":
+if os.getenv("CHROME_USER_DATA_DIR"):
+    CHROME_USER_DATA_DIR = os.getenv("CHROME_USER_DATA_DIR")
+elif os.name == "nt":
     CHROME_USER_DATA_DIR = DEFAULT_WIN_USER_DATA
 else:
     # coarse fallback
@@ -51,32 +58,114 @@ else:
 # The folder inside user-data-dir that has your logged-in profile (e.g., "Default", "Profile 1")
 CHROME_PROFILE_DIR = os.getenv("CHROME_PROFILE_DIR", "Default")
 
+# Scrape profile: "interactive" (visible browser, loads everything) or "production"
+# (headless, small viewport, no image decoding, non-essential resources blocked)
+SCRAPE_PROFILE = os.getenv("SCRAPE_PROFILE", "interactive")
+HEADLESS = os.getenv("HEADLESS", "0") in ("1", "true", "True", "YES", "yes")
+
+# Media capture: "dom" downloads image URLs found in the DOM with requests;
+# "network" uploads the bytes the browser already loaded (DevTools performance log);
+# "feed" builds posts from the page's JSON feed responses instead of the DOM
+CAPTURE_MODE = os.getenv("CAPTURE_MODE", "dom").lower()
+# Optional: append raw feed responses here (.jsonl) to use as parser fixtures
+FEED_RECORD_PATH = os.getenv("FEED_RECORD_PATH", "")
+
 # 4) Output Excel filename
 OUTPUT_XLSX = os.getenv("OUTPUT_XLSX", "saved_posts_cloudinary.xlsx")
+# Make source_url / image_urls cells clickable links in the XLSX (first link per cell)
+XLSX_HYPERLINKS = os.getenv("XLSX_HYPERLINKS", "0") in ("1", "true", "True", "YES", "yes")
+# Optional columnar archive (requires pyarrow): each run appends to <PARQUET_DIR>/scrape_date=YYYY-MM-DD/
+PARQUET_DIR = os.getenv("PARQUET_DIR", "")
+# Full post records (ordered media with hashes, post id, author, ...) as compact JSON lines
+RECORDS_PATH = os.getenv("RECORDS_PATH", OUTPUT_XLSX.replace(".xlsx", ".records.jsonl"))
+
+# Daemon mode: keep one browser open and re-check the top of the saved page every
+# DAEMON_INTERVAL seconds (+/- DAEMON_JITTER), processing only posts not yet archived
+DAEMON = os.getenv("DAEMON", "0") in ("1", "true", "True", "YES", "yes")
+DAEMON_INTERVAL = float(os.getenv("DAEMON_INTERVAL", "600"))
+DAEMON_JITTER = float(os.getenv("DAEMON_JITTER", "60"))
+DAEMON_MAX_POSTS = int(os.getenv("DAEMON_MAX_POSTS", "50"))
+# Optional metrics endpoint for unattended runs: http://METRICS_ADDR:METRICS_PORT/metrics
+# (Prometheus text format: posts, stage latency, queue depth, bytes, errors, browser memory)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_ADDR = os.getenv("METRICS_ADDR", "127.0.0.1")
+# Record mode: instead of scraping, save the saved page's post HTML per scroll step and
+# the images into RECORD_DIR, for offline replay benchmarks (see replay.py)
+RECORD_DIR = os.getenv("RECORD_DIR", "")
+# Long-list mode (DOM capture): extract while scrolling and empty each harvested post
+# container, so browser memory and per-scroll cost stay flat on saved lists of thousands
+LONG_LIST = os.getenv("LONG_LIST", "0") in ("1", "true", "True", "YES", "yes")
+# Browser watchdog for long backfills (driver_watchdog.py): replace Chrome after
+# DRIVER_RECYCLE_POSTS posts (0 = never), above DRIVER_MAX_RSS_MB, or when it crashes or
+# stops answering for DRIVER_PING_TIMEOUT_S, then reopen the saved page and continue after
+# the last processed post. DOM/network capture then always harvests in long-list batches.
+DRIVER_WATCHDOG = os.getenv("DRIVER_WATCHDOG", "0") in ("1", "true", "True", "YES", "yes")
+DRIVER_RECYCLE_POSTS = int(os.getenv("DRIVER_RECYCLE_POSTS", "500"))
+DRIVER_MAX_RSS_MB = float(os.getenv("DRIVER_MAX_RSS_MB", "2500"))
+DRIVER_PING_TIMEOUT_S = float(os.getenv("DRIVER_PING_TIMEOUT_S", "20"))
+
+# Encrypted cache of the logged-in cookies/localStorage (requires cryptography). Restored
+# into fresh browsers so unattended runs skip the login form, OTP poll and prompts.
+SESSION_CACHE = os.getenv("SESSION_CACHE", "0") in ("1", "true", "True", "YES", "yes")
+SESSION_CACHE_DIR = os.getenv("SESSION_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".session_cache"))
+SESSION_CACHE_NAME = os.getenv("SESSION_CACHE_NAME", "")  # default: derived from the Chrome profile
+SESSION_CACHE_TTL_HOURS = float(os.getenv("SESSION_CACHE_TTL_HOURS", "72"))
+
+# Prompts from the comment thread: open each new post's page in COMMENT_TABS extra tabs,
+# expand replies at most COMMENT_MAX_EXPANSIONS times and keep the author's reply text
+# (at most COMMENT_BUDGET_S seconds per post)
+COMMENT_PROMPTS = os.getenv("COMMENT_PROMPTS", "0") in ("1", "true", "True", "YES", "yes")
+COMMENT_TABS = int(os.getenv("COMMENT_TABS", "2"))
+COMMENT_MAX_EXPANSIONS = int(os.getenv("COMMENT_MAX_EXPANSIONS", "5"))
+COMMENT_BUDGET_S = float(os.getenv("COMMENT_BUDGET_S", "8"))
+
+# 5) Where image bytes go: "spool" (default: written to SPOOL_DIR and uploaded afterwards,
+# see upload_spool.py), "cloudinary" (uploaded while scraping), "local" (files in IMAGES_DIR)
+# or "tee" (local + Cloudinary; the sheet keeps the Cloudinary URLs). MEDIA_WORKERS images
+# are fetched/stored in the background while scrolling continues. CLOUDINARY_STANDIN_DIR
+# replaces the SDK with a local directory (dry runs without credentials).
+MEDIA_SINK = os.getenv("MEDIA_SINK", "spool").lower()
+MEDIA_WORKERS = int(os.getenv("MEDIA_WORKERS", "8"))
+IMAGES_DIR = os.getenv("IMAGES_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "pictures"))
+# Spool: upload it at the end of every run (SPOOL_UPLOAD=0 leaves that to `cli.py upload`).
+# UPLOAD_WORKERS parallel uploads, UPLOAD_MAX_ATTEMPTS tries per image before it is parked as failed.
+SPOOL_DIR = os.getenv("SPOOL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "upload_spool"))
+SPOOL_UPLOAD = os.getenv("SPOOL_UPLOAD", "1") in ("1", "true", "True", "YES", "yes")
+SPOOL_KEEP_FILES = os.getenv("SPOOL_KEEP_FILES", "0") in ("1", "true", "True", "YES", "yes")
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "4"))
+UPLOAD_MAX_ATTEMPTS = int(os.getenv("UPLOAD_MAX_ATTEMPTS", "5"))
+
+# 6) Optional image normalization before upload (requires Pillow). Re-encodes in a
+# process pool to NORMALIZE_FORMAT, caps the longest side and strips metadata.
+NORMALIZE_IMAGES = os.getenv("NORMALIZE_IMAGES", "0") in ("1", "true", "True", "YES", "yes")
+NORMALIZE_FORMAT = os.getenv("NORMALIZE_FORMAT", "WEBP")
+NORMALIZE_QUALITY = int(os.getenv("NORMALIZE_QUALITY", "82"))
+NORMALIZE_MAX_DIM = int(os.getenv("NORMALIZE_MAX_DIM", "2048"))
+NORMALIZE_WORKERS = int(os.getenv("NORMALIZE_WORKERS", "0")) or None  # 0 = one per CPU core
+
+
+# One adaptive rate controller for page actions, image fetches and uploads (see rate_control.py)
+RATE = get_controller()
 
 
 # -------------------------
 # Safety checks
 # -------------------------
-if not (CLOUD_NAME and CLOUD_KEY and CLOUD_SECRET):
-    raise SystemExit(
-        "Cloudinary credentials not found in environment. Please set CLOUDINARY_CLOUD_NAME, "
-        "CLOUDINARY_API_KEY and CLOUDINARY_API_SECRET, or edit the script to include them."
-    )
-
-# Configure Cloudinary
-cloudinary.config(
-    cloud_name=CLOUD_NAME,
-    api_key=CLOUD_KEY,
-    api_secret=CLOUD_SECRET,
-    secure=True
-)
+# Done on first use rather than at import, so importing this module (CLI help,
+# offline export) neither needs credentials nor pays for importing the SDK.
+def configure_cloudinary():
+    if MEDIA_SINK == "local" or (MEDIA_SINK == "spool" and not SPOOL_UPLOAD) or os.getenv("CLOUDINARY_STANDIN_DIR"):
+        return
+    media_sinks.configure_cloudinary(CLOUD_NAME, CLOUD_KEY, CLOUD_SECRET)
 
 
 # -------------------------
 # Helper functions
 # -------------------------
-def make_driver(use_profile=True, user_data_dir=None, profile_dir=None, headless=False):
+def make_driver(use_profile=True, user_data_dir=None, profile_dir=None, headless=False, scrape_profile=SCRAPE_PROFILE,
+                capture_mode=CAPTURE_MODE):
+    scrape_profile = resolve_profile(scrape_profile)
+    capture_network = capture_mode in ("network", "feed")
     chrome_options = Options()
     if headless:
         chrome_options.add_argument("--headless=new")
@@ -90,352 +179,257 @@ def make_driver(use_profile=True, user_data_dir=None, profile_dir=None, headless
         chrome_options.add_argument(f"--user-data-dir={user_data_dir}")
         if profile_dir:
             chrome_options.add_argument(f"--profile-directory={profile_dir}")
+    if scrape_profile == PROFILE_PRODUCTION:
+        apply_production_options(chrome_options, load_images=capture_mode == "network")
+    if capture_network:
+        enable_performance_logging(chrome_options)
 
     # Create driver using webdriver-manager
     service = ChromeService(ChromeDriverManager().install())
     driver = webdriver.Chrome(service=service, options=chrome_options)
-    return driver
+    return finish_driver_setup(driver, scrape_profile)
 
 
-def safe_get_text(elem):
-    try:
-        txt = elem.text
-        return txt.strip() if txt else ""
-    except Exception:
-        return ""
+def drain_spool(spool):
+    """Upload everything waiting in the spool. Returns the completed jobs."""
+    done = spool.drain(make_uploader(), workers=UPLOAD_WORKERS, max_attempts=UPLOAD_MAX_ATTEMPTS, rate=RATE)
+    print(f"Uploaded {len(done)} spooled images")
+    print(spool.summary())
+    return done
 
 
-# NEW: More robust text extraction
-from selenium.webdriver.support.ui import WebDriverWait as _WebDriverWait
+def publish_spool_uploads(spool, jobs):
+    """Put URLs of images uploaded for posts archived by earlier runs into the record store and sheet."""
+    from upload_spool import publish_uploads
+    if jobs:
+        n = publish_uploads(spool, jobs, RECORDS_PATH, OUTPUT_XLSX.replace(".xlsx", ".csv"), OUTPUT_XLSX,
+                            hyperlinks=XLSX_HYPERLINKS)
+        print(f"Updated image URLs of {n} previously archived posts")
 
-# Heuristic caption picker from block text
-_UI_NOISE_WORDS = {
-    "like", "reply", "repost", "share", "follow", "translate", "more", "see more",
-    "followers", "following", "posts", "views", "comments"
-}
 
-def _pick_caption_from_text_block(text_block):
-    try:
-        lines = [" ".join(line.split()) for line in text_block.splitlines()]
-        candidates = []
-        for line in lines:
-            if not line:
-                continue
-            low = line.lower()
-            if any(w in low for w in _UI_NOISE_WORDS):
-                if len(low) <= 14:
-                    continue
-            if low.endswith("h") or low.endswith("m") or low.endswith("d"):
-                if len(low) <= 3 and low[:-1].isdigit():
-                    continue
-            if low.isdigit():
-                continue
-            if len(line) < 2:
-                continue
-            candidates.append(line)
-        if candidates:
-            candidates.sort(key=lambda s: len(s), reverse=True)
-            return candidates[0]
-        return ""
-    except Exception:
-        return ""
-
-
-def extract_text_from_element(driver, elem, timeout=2):
-    try:
-        # Ensure element is in viewport for virtualized UIs
-        try:
-            driver.execute_script("arguments[0].scrollIntoView({block:'center'});", elem)
-            time.sleep(0.15)
-        except Exception:
-            pass
+def open_session_cache():
+    """Encrypted session cache for this profile/account, or None when SESSION_CACHE is off."""
+    if not SESSION_CACHE:
+        return None
+    from session_cache import SessionCache, cache_name
+    return SessionCache(SESSION_CACHE_DIR, SESSION_CACHE_NAME or cache_name(CHROME_PROFILE_DIR, os.getenv("THREADS_ID", "")), SESSION_CACHE_TTL_HOURS)
 
-        # 1) Expand any "see more" / "more" buttons within the element
-        try:
-            more_buttons = elem.find_elements(By.XPATH, ".//*[self::button or @role='button'][contains(translate(normalize-space(.), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'see more') or contains(translate(normalize-space(.), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'more') or contains(., '…')]")
-            for btn in more_buttons:
-                try:
-                    driver.execute_script("arguments[0].click();", btn)
-                except Exception:
-                    try:
-                        btn.click()
-                    except Exception:
-                        pass
-        except Exception:
-            pass
-
-        # 2) Prefer the browser-computed innerText which respects visibility and CSS
-        inner_text = None
-        try:
-            inner_text = driver.execute_script("return arguments[0].innerText;", elem)
-            if inner_text and inner_text.strip():
-                picked = _pick_caption_from_text_block(inner_text)
-                if picked:
-                    return picked
-                return " ".join(inner_text.split())
-        except Exception:
-            pass
-
-        # 3) Fallback to WebElement.text
-        txt = safe_get_text(elem)
-        if txt:
-            return txt
-
-        # 4) Threads-specific: try to capture caption near a Translate button
-        try:
-            translate_btns = elem.find_elements(By.XPATH, ".//*[self::button or @role='button'][contains(translate(normalize-space(.), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'translate')]")
-            for tbtn in translate_btns:
-                try:
-                    container = tbtn
-                    for _ in range(3):
-                        container = container.find_element(By.XPATH, "..")
-                    candidates = container.find_elements(By.XPATH, ".//span|.//p|.//div")
-                    texts = []
-                    for c in candidates:
-                        s = safe_get_text(c)
-                        if not s:
-                            continue
-                        ss = s.strip()
-                        if len(ss) < 2:
-                            continue
-                        if ss.lower() in ("translate", "more", "see more"):
-                            continue
-                        if ss.isdigit():
-                            continue
-                        texts.append(ss)
-                    if texts:
-                        joined = "\n".join(texts)
-                        picked = _pick_caption_from_text_block(joined)
-                        if picked:
-                            return picked
-                        return " ".join(joined.split())
-                except Exception:
-                    continue
-        except Exception:
-            pass
-
-        # 5) Last resort: join span/p/div texts within elem
-        try:
-            text_nodes = elem.find_elements(By.XPATH, ".//span|.//p|.//div")
-            combined = " ".join([safe_get_text(x) for x in text_nodes if safe_get_text(x)])
-            combined = combined.strip()
-            if combined:
-                picked = _pick_caption_from_text_block(combined)
-                if picked:
-                    return picked
-            return combined
-        except Exception:
-            return ""
-    except Exception:
-        return ""
 
+def open_saved_page(driver, saved_page_url=SAVED_PAGE_URL, session_cache=None, restore=True):
+    """Open the saved page (restoring a cached session into the browser first) and let it settle."""
+    if session_cache is not None and restore:
+        session_cache.restore(driver, saved_page_url)
+    print("Opening saved page:", saved_page_url)
+    driver.get(saved_page_url)
 
-def extract_image_urls_from_element(elem):
-    urls = set()
+    # If auth is required, allow manual login window
     try:
-        imgs = elem.find_elements(By.TAG_NAME, "img")
-        for im in imgs:
-            try:
-                src = im.get_attribute("src")
-                if src:
-                    urls.add(src)
-            except Exception:
-                pass
-
-        # search for background-image style
-        all_descendants = elem.find_elements(By.XPATH, ".//*")
-        for d in all_descendants:
-            try:
-                style = d.get_attribute("style")
-                if style and "background-image" in style:
-                    import re
-                    m = re.search(r'url\(["\']?(.*?)["\']?\)', style)
-                    if m:
-                        urls.add(m.group(1))
-            except Exception:
-                pass
+        WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
     except Exception:
         pass
-    return list(urls)
+    time.sleep(3)
+    if looks_like_challenge(driver):
+        RATE.penalize("page", "login/challenge page on open")
+    if session_cache is not None and probe_logged_in(driver):
+        session_cache.save(driver)
 
 
-def download_image_bytes(url, session=None, timeout=20):
-    session = session or requests.Session()
-    headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36"}
-    resp = session.get(url, headers=headers, timeout=timeout, stream=True)
-    resp.raise_for_status()
-    return resp.content
+def make_watchdog(driver=None, capture=None, saved_page_url=SAVED_PAGE_URL, headless=False,
+                  scrape_profile=SCRAPE_PROFILE, capture_mode=CAPTURE_MODE, session_cache=None):
+    """DriverWatchdog that replaces the browser with an identically configured one and reopens the saved page."""
+    from driver_watchdog import DriverWatchdog
 
+    def factory():
+        return make_driver(use_profile=USE_EXISTING_PROFILE, user_data_dir=CHROME_USER_DATA_DIR,
+                           profile_dir=CHROME_PROFILE_DIR, headless=headless, scrape_profile=scrape_profile,
+                           capture_mode=capture_mode)
 
-def upload_to_cloudinary_bytes(image_bytes, public_id_prefix=None, tags=None):
-    fobj = io.BytesIO(image_bytes)
-    import uuid
-    public_id = (public_id_prefix + "_" + uuid.uuid4().hex) if public_id_prefix else uuid.uuid4().hex
-    res = cloudinary.uploader.upload(fobj, public_id=public_id, resource_type="image", tags=tags or [])
-    return res.get("secure_url")
+    return DriverWatchdog(factory, reopen=lambda d: open_saved_page(d, saved_page_url, session_cache),
+                          driver=driver, capture=capture,
+                          capture_factory=MediaCapture if capture_mode == "network" else None,
+                          recycle_posts=DRIVER_RECYCLE_POSTS, max_rss_mb=DRIVER_MAX_RSS_MB,
+                          ping_timeout=DRIVER_PING_TIMEOUT_S)
 
 
 # -------------------------
 # Main pipeline
 # -------------------------
-def run(saved_page_url=SAVED_PAGE_URL, max_posts=None, headless=False):
-    driver = make_driver(use_profile=USE_EXISTING_PROFILE, user_data_dir=CHROME_USER_DATA_DIR,
-                         profile_dir=CHROME_PROFILE_DIR, headless=headless)
-    wait = WebDriverWait(driver, 20)
+def run(saved_page_url=SAVED_PAGE_URL, max_posts=None, headless=False, scrape_profile=SCRAPE_PROFILE,
+        capture_mode=CAPTURE_MODE, driver=None, known_keys=None, capture=None, watchdog=None):
+    """One scrape. Pass `driver` to reuse an open browser (it is then left running), and
+    `known_keys` to stop at the first already-archived post (incremental mode). A `watchdog`
+    (the daemon's) brings its own browser and may replace it during the run."""
+    if capture_mode not in CAPTURE_MODES:
+        raise ValueError(f"Unknown CAPTURE_MODE '{capture_mode}'. Expected one of: {', '.join(CAPTURE_MODES)}")
+    if METRICS_PORT:
+        serve_metrics(METRICS_PORT, METRICS_ADDR)
+    # fail before opening a browser when credentials are missing
+    if not RECORD_DIR:
+        configure_cloudinary()
+    if watchdog is not None:
+        driver, capture = watchdog.driver, watchdog.capture
+    own_driver = driver is None
+    if own_driver:
+        driver = make_driver(use_profile=USE_EXISTING_PROFILE, user_data_dir=CHROME_USER_DATA_DIR,
+                             profile_dir=CHROME_PROFILE_DIR, headless=headless, scrape_profile=scrape_profile,
+                             capture_mode=capture_mode)
+    if capture is None and capture_mode == "network":
+        capture = MediaCapture(driver)
+    spool = None
 
     try:
-        print("Opening saved page:", saved_page_url)
-        driver.get(saved_page_url)
-
-        # If auth is required, allow manual login window
+        session_cache = open_session_cache()
+        open_saved_page(driver, saved_page_url, session_cache, restore=own_driver)
+        if own_driver and DRIVER_WATCHDOG and not RECORD_DIR:
+            watchdog = make_watchdog(driver, capture, saved_page_url, headless, scrape_profile, capture_mode,
+                                     session_cache)
+
+        if RECORD_DIR:
+            from replay import SessionRecorder
+            manifest = SessionRecorder(driver, RECORD_DIR, rate=RATE).record(max_posts=max_posts)
+            print(f"Recorded {manifest['posts']} posts in {manifest['steps']} scroll steps and "
+                  f"{manifest['images']} images ({manifest['bytes'] / 1024 / 1024:.1f} MB) to {RECORD_DIR}")
+            return []
+
+        normalizer = None
+        if NORMALIZE_IMAGES:
+            from image_normalize import ImageNormalizer
+            normalizer = ImageNormalizer(fmt=NORMALIZE_FORMAT, quality=NORMALIZE_QUALITY,
+                                         max_dim=NORMALIZE_MAX_DIM, workers=NORMALIZE_WORKERS)
+        sink = make_sink(MEDIA_SINK, images_dir=IMAGES_DIR, rate=RATE, spool_dir=SPOOL_DIR, keep_files=SPOOL_KEEP_FILES)
+        spool = getattr(sink, "spool", None)
         try:
-            wait.until(EC.presence_of_element_located((By.TAG_NAME, "body")))
-        except Exception:
-            pass
-        time.sleep(3)
-
-        CANDIDATE_POST_SELECTORS = [
-            'article',
-            'div[role="article"]',
-            'div[data-testid="post"]',
-            'div[class*="post"]',
-            'div[class*="card"]',
-            'div[class*="thread"]',
-            'div[class*="item"]'
-        ]
-
-        post_elements = []
-        for sel in CANDIDATE_POST_SELECTORS:
-            try:
-                elems = driver.find_elements(By.CSS_SELECTOR, sel)
-                if elems:
-                    post_elements = elems
-                    print(f"Found {len(elems)} elements using selector '{sel}'")
-                    break
-            except Exception:
-                continue
-
-        if not post_elements:
-            imgs = driver.find_elements(By.TAG_NAME, "img")
-            print(f"No post elements found. Found {len(imgs)} images on page; will try to group them.")
-            for im in imgs:
-                try:
-                    parent = im.find_element(By.XPATH, "..")
-                    post_elements.append(parent)
-                except Exception:
-                    continue
-
-        SCROLL_PAUSE = 1.0
-        last_height = driver.execute_script("return document.body.scrollHeight")
-        scrolls = 0
-        while (max_posts is None or len(post_elements) < max_posts) and scrolls < 20:
-            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(SCROLL_PAUSE)
-            new_elems = []
-            for sel in CANDIDATE_POST_SELECTORS:
+            with MediaPipeline(sink, workers=MEDIA_WORKERS, normalizer=normalizer, rate=RATE) as media:
                 try:
-                    elems = driver.find_elements(By.CSS_SELECTOR, sel)
-                    if elems:
-                        new_elems = elems
-                        break
-                except Exception:
-                    continue
-            if new_elems:
-                post_elements = new_elems
-            new_height = driver.execute_script("return document.body.scrollHeight")
-            if new_height == last_height:
-                break
-            last_height = new_height
-            scrolls += 1
-
-        print(f"Total candidate post elements: {len(post_elements)}")
-        if max_posts:
-            post_elements = post_elements[:max_posts]
-
-        results = []
-        session = requests.Session()
-
-        for idx, elem in enumerate(tqdm(post_elements, desc="Processing posts")):
+                    results = scrape_saved_page(driver, media, capture_mode, max_posts, capture, known_keys,
+                                                timestamp=utc_now_iso, long_list=LONG_LIST,
+                                                feed_record_path=FEED_RECORD_PATH or None, watchdog=watchdog)
+                finally:
+                    if watchdog is not None:
+                        # the browser may have been replaced; carry on (and clean up) with the current one
+                        driver, capture = watchdog.driver, watchdog.capture
+            print(media.summary())
+        finally:
+            if normalizer is not None:
+                from image_normalize import format_stats
+                normalizer.close()
+                print(format_stats(normalizer.stats))
+
+        if capture is not None:
+            print(f"Captured {capture.bytes_captured / 1024 / 1024:.2f} MB of media from the browser's network traffic")
+
+        # Scraping is done; now upload the spool (this run's images and earlier leftovers)
+        older_uploads = []
+        if spool is not None:
+            if SPOOL_UPLOAD:
+                from upload_spool import apply_to_records
+                older_uploads = apply_to_records(results, drain_spool(spool))
+            else:
+                print(spool.summary())
+
+        if known_keys is not None and not results:
+            print("No new saved posts.")
+            publish_spool_uploads(spool, older_uploads)
+            return results
+
+        if COMMENT_PROMPTS:
+            from comment_prompts import CommentPromptExtractor
+            extractor = CommentPromptExtractor(driver, tabs=COMMENT_TABS, max_expansions=COMMENT_MAX_EXPANSIONS,
+                                               budget_s=COMMENT_BUDGET_S, rate=RATE)
+            with STAGE_SECONDS.time(stage="comment_prompts"):
+                extractor.extract(results)
+            print(extractor.summary())
+
+        if RECORDS_PATH:
             try:
-                src_url = ""
-                try:
-                    a = elem.find_element(By.TAG_NAME, "a")
-                    src_url = a.get_attribute("href") or ""
-                except Exception:
-                    src_url = driver.current_url
-
-                # Scroll into view then use robust text extractor
-                try:
-                    driver.execute_script("arguments[0].scrollIntoView({block:'center'});", elem)
-                    time.sleep(0.1)
-                except Exception:
-                    pass
-                text = extract_text_from_element(driver, elem)
-
-                img_urls = extract_image_urls_from_element(elem)
-                uploaded_urls = []
-                for i, img_url in enumerate(img_urls):
-                    if not (img_url.startswith("http://") or img_url.startswith("https://")):
-                        continue
-                    try:
-                        img_bytes = download_image_bytes(img_url, session=session)
-                        cloud_url = upload_to_cloudinary_bytes(img_bytes, public_id_prefix=f"{datetime.utcnow().strftime('%Y%m%d')}_{idx}_{i}")
-                        uploaded_urls.append(cloud_url)
-                    except Exception as e:
-                        print(f"Failed to process image {img_url[:80]}...: {e}")
-                        continue
-
-                if not uploaded_urls:
-                    imgs = elem.find_elements(By.TAG_NAME, "img")
-                    for i, im in enumerate(imgs):
-                        try:
-                            src = im.get_attribute("src")
-                            if not src:
-                                continue
-                            img_bytes = download_image_bytes(src, session=session)
-                            cloud_url = upload_to_cloudinary_bytes(img_bytes, public_id_prefix=f"{datetime.utcnow().strftime('%Y%m%d')}_{idx}_{i}")
-                            uploaded_urls.append(cloud_url)
-                        except Exception:
-                            continue
-
-                results.append({
-                    "source_url": src_url,
-                    "text": text,
-                    "image_urls": uploaded_urls,
-                    "num_images": len(uploaded_urls),
-                    "scraped_at": datetime.utcnow().isoformat()
-                })
-
-                time.sleep(0.3)
+                RecordStore(RECORDS_PATH).append(results)
+            except Exception as e:
+                print(f"Could not append post records to {RECORDS_PATH}: {e}")
 
+        if PARQUET_DIR:
+            try:
+                n = append_parquet((r.to_row("image_urls") for r in results), PARQUET_DIR, list_columns=("image_urls",),
+                                   extra_columns=("prompt",) if any(r.prompt for r in results) else ())
+                print(f"Appended {n} rows to Parquet archive {PARQUET_DIR}")
             except Exception as e:
-                print(f"Error processing element #{idx}: {e}")
-                continue
-
-        rows = []
-        for r in results:
-            rows.append({
-                "source_url": r["source_url"],
-                "text": r["text"],
-                "image_urls": ", ".join(r["image_urls"]),
-                "num_images": r["num_images"],
-                "scraped_at": r["scraped_at"]
-            })
-
-        df = pd.DataFrame(rows)
+                print(f"Parquet export failed: {e}")
+
         csv_out = OUTPUT_XLSX.replace(".xlsx", ".csv")
-        df.to_csv(csv_out, index=False, encoding="utf-8-sig")
-        df.to_excel(OUTPUT_XLSX, index=False)
-        print(f"Saved {len(df)} rows to {csv_out} and {OUTPUT_XLSX}")
+        # keep columns the archive already has (e.g. prompt) even when this run did not fill them
+        columns = ["source_url", "text", "image_urls", "num_images", "scraped_at"]
+        columns += [c for c in csv_columns(csv_out) if c not in columns]
+        if any(r.prompt for r in results) and "prompt" not in columns:
+            columns.append("prompt")
+        # Append to the previous CSV (de-duplicated, newest wins); CSV and XLSX are
+        # streamed in one pass (list columns are joined with ", ")
+        rows = merge_with_existing_csv(csv_out, [r.to_row("image_urls") for r in results], key_columns=["source_url", "text", "image_urls"])
+        n = write_csv_and_xlsx(rows, columns, csv_out, OUTPUT_XLSX,
+                               hyperlink_columns=["source_url", "image_urls"] if XLSX_HYPERLINKS else None)
+        print(f"Saved {n} total rows to {csv_out} and {OUTPUT_XLSX}")
+        publish_spool_uploads(spool, older_uploads)
+        print(RATE.summary())
+        rss = browser_rss_mb(driver)
+        if rss is not None:
+            print(f"Browser memory (RSS): {rss:.0f} MB")
+        return results
 
     finally:
-        try:
-            driver.quit()
-        except Exception:
-            pass
+        if spool is not None:
+            spool.close()
+        if own_driver:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+
+
+def run_daemon(interval=DAEMON_INTERVAL, jitter=DAEMON_JITTER, max_posts=DAEMON_MAX_POSTS, headless=HEADLESS,
+               scrape_profile=SCRAPE_PROFILE, capture_mode=CAPTURE_MODE, max_cycles=None):
+    """Poll the saved page for new saves on one long-lived browser."""
+    if METRICS_PORT:
+        serve_metrics(METRICS_PORT, METRICS_ADDR)
+    configure_cloudinary()
+    csv_out = OUTPUT_XLSX.replace(".xlsx", ".csv")
+    driver = make_driver(use_profile=USE_EXISTING_PROFILE, user_data_dir=CHROME_USER_DATA_DIR,
+                         profile_dir=CHROME_PROFILE_DIR, headless=headless, scrape_profile=scrape_profile,
+                         capture_mode=capture_mode)
+    capture = MediaCapture(driver) if capture_mode == "network" else None
+    session_cache = open_session_cache()
+    if session_cache is not None:
+        session_cache.restore(driver, SAVED_PAGE_URL)
+    watchdog = None
+    if DRIVER_WATCHDOG:
+        watchdog = make_watchdog(driver, capture, SAVED_PAGE_URL, headless, scrape_profile, capture_mode, session_cache)
+
+    def cycle():
+        if watchdog is not None:
+            # a browser that hung or bloated since the last cycle is replaced before this one
+            reason = watchdog.check(force=True)
+            if reason:
+                watchdog.recycle(*reason)
+            run(max_posts=max_posts, capture_mode=capture_mode, known_keys=load_known_keys(csv_out), watchdog=watchdog)
+            return
+        run(max_posts=max_posts, capture_mode=capture_mode, driver=driver,
+            known_keys=load_known_keys(csv_out), capture=capture)
+
+    try:
+        run_forever(cycle, interval=interval, jitter=jitter, max_cycles=max_cycles)
+    except KeyboardInterrupt:
+        print("Daemon stopped.")
+    finally:
+        if watchdog is not None:
+            watchdog.close()
+        else:
+            try:
+                driver.quit()
+            except Exception:
+                pass
 
 
 if __name__ == "__main__":
-    run(headless=False, max_posts=200)
+    if DAEMON:
+        run_daemon()
+    else:
+        run(headless=HEADLESS, max_posts=200)
 
 
@@ -0,0 +1,302 @@
+import os
+import time
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import ERRORS, MEDIA_BYTES, QUEUE_DEPTH
+from rate_control import get_controller
+
+
+# -------------------------
+# Upload spool (deferred, resumable Cloudinary uploads)
+# -------------------------
+# With MEDIA_SINK=spool the scraper never waits for Cloudinary: every image is
+# written to <spool>/files/ and queued in <spool>/spool.db (SQLite). drain() then
+# uploads the queue with a few threads. Failed uploads are retried with exponential
+# backoff (per job, persisted), and after max_attempts they stay in the spool as
+# "failed" instead of being dropped: `cli.py upload --retry-failed` tries them again.
+# Progress lives in the database, so an interrupted drain simply continues where it
+# stopped. Uploaded files are deleted from the spool unless keep_files is set.
+#
+# Every spooled file is its own job, keyed by its public id; two posts never share a
+# job, even when they share a link (see records.new_record). A post scraped again gets
+# new jobs, and the newest upload per image wins when URLs are published.
+#
+# Several processes may drain one spool: a claim takes the database write lock and
+# records the claiming process, so no job is handed out twice.
+#
+# Job states: pending -> uploading -> done | pending (retry later) | failed
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    post_key TEXT NOT NULL,
+    permalink TEXT NOT NULL DEFAULT '',
+    scraped_at TEXT NOT NULL DEFAULT '',
+    media_index INTEGER NOT NULL,
+    source_url TEXT NOT NULL DEFAULT '',
+    public_id TEXT NOT NULL UNIQUE,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_at REAL NOT NULL DEFAULT 0,
+    last_error TEXT NOT NULL DEFAULT '',
+    remote_url TEXT NOT NULL DEFAULT '',
+    claimed_by INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    done_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, next_at);
+CREATE INDEX IF NOT EXISTS jobs_post ON jobs (post_key, media_index);
+"""
+
+JOB_COLUMNS = ("id", "post_key", "permalink", "scraped_at", "media_index", "source_url", "public_id", "path", "size",
+               "status", "attempts", "next_at", "last_error", "remote_url")
+
+# Spools from before scraped_at existed had one job per (post_key, media_index)
+_OLD_COLUMNS = ("id", "post_key", "permalink", "media_index", "source_url", "public_id", "path", "size", "status",
+                "attempts", "next_at", "last_error", "remote_url", "created_at", "done_at")
+
+
+def _process_alive(pid):
+    if not pid:
+        return False
+    try:
+        import psutil
+        return psutil.pid_exists(pid)
+    except ImportError:
+        pass
+    if os.name == "nt":
+        # os.kill would terminate the process on Windows; treat the claim as stale
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+class UploadSpool:
+    def __init__(self, spool_dir, keep_files=False):
+        self.dir = spool_dir
+        self.files_dir = os.path.join(spool_dir, "files")
+        os.makedirs(self.files_dir, exist_ok=True)
+        self.keep_files = keep_files
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(os.path.join(spool_dir, "spool.db"), check_same_thread=False, isolation_level=None,
+                                  timeout=30.0)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self._migrate()
+        self.db.executescript(SCHEMA)
+        # an interrupted drain leaves jobs marked uploading; they were not confirmed. Jobs
+        # claimed by a process that is still running (another drain) are left alone.
+        with self.lock:
+            owners = [r[0] for r in self.db.execute("SELECT DISTINCT claimed_by FROM jobs WHERE status = 'uploading'")]
+            for pid in owners:
+                if not _process_alive(pid):
+                    self.db.execute("UPDATE jobs SET status = 'pending' WHERE status = 'uploading' AND claimed_by = ?",
+                                    (pid,))
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    def _migrate(self):
+        cols = [r[1] for r in self.db.execute("PRAGMA table_info(jobs)")]
+        if "scraped_at" in cols and "claimed_by" not in cols:
+            self.db.execute("ALTER TABLE jobs ADD COLUMN claimed_by INTEGER NOT NULL DEFAULT 0")
+        if not cols or "scraped_at" in cols:
+            return
+        names = ", ".join(_OLD_COLUMNS)
+        self.db.executescript(
+            "BEGIN; DROP INDEX IF EXISTS jobs_status; ALTER TABLE jobs RENAME TO jobs_old;" + SCHEMA +
+            f"INSERT INTO jobs ({names}) SELECT {names} FROM jobs_old; DROP TABLE jobs_old; COMMIT;")
+
+    def add(self, post_key, permalink, media_index, source_url, public_id, path, size, scraped_at=""):
+        """Queue one spooled file as a new job (adding the same public id again is a no-op)."""
+        with self.lock:
+            self.db.execute(
+                "INSERT OR IGNORE INTO jobs (post_key, permalink, scraped_at, media_index, source_url, public_id, path, "
+                "size, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (post_key, permalink, scraped_at, media_index, source_url, public_id, path, size, time.time()))
+
+    def counts(self):
+        with self.lock:
+            rows = self.db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+    def retry_failed(self):
+        with self.lock:
+            return self.db.execute("UPDATE jobs SET status = 'pending', attempts = 0, next_at = 0 "
+                                   "WHERE status = 'failed'").rowcount
+
+    def post_urls(self, post_keys):
+        """{post_key: [remote_url of uploaded images, in image order]}; the newest upload per image wins."""
+        by_index = {k: {} for k in post_keys}
+        keys = list(by_index)
+        with self.lock:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows = self.db.execute(
+                    f"SELECT post_key, media_index, remote_url FROM jobs WHERE status = 'done' "
+                    f"AND post_key IN ({','.join('?' * len(chunk))}) ORDER BY id", chunk).fetchall()
+                for key, index, url in rows:
+                    by_index[key][index] = url
+        return {k: [urls[i] for i in sorted(urls)] for k, urls in by_index.items()}
+
+    def _claim(self, limit):
+        now = time.time()
+        with self.lock:
+            # the write lock is taken before the SELECT, so another process draining the
+            # same spool cannot claim these jobs in between
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self.db.execute(
+                    f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE status = 'pending' AND next_at <= ? "
+                    "ORDER BY id LIMIT ?", (now, limit)).fetchall()
+                if rows:
+                    self.db.execute(f"UPDATE jobs SET status = 'uploading', claimed_by = ? "
+                                    f"WHERE id IN ({','.join('?' * len(rows))})", [os.getpid()] + [r[0] for r in rows])
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+        return [dict(zip(JOB_COLUMNS, r)) for r in rows]
+
+    def _next_retry_in(self):
+        with self.lock:
+            row = self.db.execute("SELECT MIN(next_at) FROM jobs WHERE status = 'pending'").fetchone()
+        return None if row[0] is None else max(0.0, row[0] - time.time())
+
+    def _finish(self, job, url):
+        with self.lock:
+            self.db.execute("UPDATE jobs SET status = 'done', remote_url = ?, done_at = ?, last_error = '' WHERE id = ?",
+                            (url, time.time(), job["id"]))
+        job["status"], job["remote_url"] = "done", url
+        if not self.keep_files:
+            try:
+                os.remove(job["path"])
+            except OSError:
+                pass
+            job["path"] = ""
+
+    def _fail(self, job, err, max_attempts, backoff):
+        attempts = job["attempts"] + 1
+        status = "failed" if attempts >= max_attempts else "pending"
+        next_at = time.time() + min(300.0, backoff * (2 ** (attempts - 1)))
+        with self.lock:
+            self.db.execute("UPDATE jobs SET status = ?, attempts = ?, next_at = ?, last_error = ? WHERE id = ?",
+                            (status, attempts, next_at, str(err)[:500], job["id"]))
+        ERRORS.inc(reason="upload")
+        if status == "failed":
+            print(f"Giving up on {job['path']} after {attempts} attempts (kept in the spool): {err}")
+
+    def drain(self, uploader, workers=4, max_attempts=5, backoff=2.0, rate=None, tags=None,
+              max_wait=600.0, on_progress=None, progress_every=200):
+        """Upload everything pending, waiting out retry backoffs (up to max_wait seconds in total).
+        Returns the jobs completed by this call. on_progress(done_jobs) is called every
+        progress_every completions so callers can publish URLs while the drain runs."""
+        rate = rate or get_controller()
+        done, unreported = [], []
+        waited = 0.0
+
+        def upload(job):
+            try:
+                with open(job["path"], "rb") as f:
+                    data = f.read()
+                with rate.timed("upload"):
+                    url = uploader(data, job["public_id"], tags)
+                if not url:
+                    raise IOError("uploader returned no URL")
+                MEDIA_BYTES.inc(len(data), direction="uploaded")
+                self._finish(job, url)
+                return job
+            except FileNotFoundError as e:
+                # nothing left to upload; retrying cannot help
+                self._fail(job, e, 1, backoff)
+            except Exception as e:
+                self._fail(job, e, max_attempts, backoff)
+            return None
+
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="upload") as pool:
+            while True:
+                pending = self.counts().get("pending", 0)
+                QUEUE_DEPTH.set(pending, queue="upload_spool")
+                batch = self._claim(max(1, workers) * 4)
+                if not batch:
+                    delay = self._next_retry_in()
+                    if delay is None or waited + delay > max_wait:
+                        break
+                    time.sleep(delay)
+                    waited += delay
+                    continue
+                for job in pool.map(upload, batch):
+                    if job is not None:
+                        done.append(job)
+                        unreported.append(job)
+                if on_progress is not None and len(unreported) >= progress_every:
+                    self._report(on_progress, unreported)
+                    unreported = []
+        if on_progress is not None and unreported:
+            self._report(on_progress, unreported)
+        QUEUE_DEPTH.set(self.counts().get("pending", 0), queue="upload_spool")
+        return done
+
+    def _report(self, on_progress, jobs):
+        # the uploads are recorded as done either way; a failed publish must not stop the drain
+        try:
+            on_progress(jobs)
+        except Exception as e:
+            ERRORS.inc(reason="upload_publish")
+            print(f"Could not publish {len(jobs)} uploaded URLs: {e}")
+
+    def summary(self):
+        c = self.counts()
+        return (f"Upload spool | pending={c.get('pending', 0)} done={c.get('done', 0)} "
+                f"failed={c.get('failed', 0)} ({self.dir})")
+
+
+def apply_to_records(records, jobs):
+    """Fill remote_url (and clear deleted spool paths) on in-memory records from completed jobs.
+    Returns the jobs that belong to posts not in `records`."""
+    by_key = {r.post_key: r for r in records}
+    rest = []
+    for job in jobs:
+        record = by_key.get(job["post_key"])
+        if record is None:
+            rest.append(job)
+            continue
+        for m in record.media:
+            if m.index == job["media_index"]:
+                m.remote_url = job["remote_url"]
+                m.path = job["path"]
+    return rest
+
+
+def publish_uploads(spool, jobs, records_path="", csv_path="", xlsx_path=None, image_column="image_urls",
+                    hyperlinks=False):
+    """Write completed uploads of already archived posts back: append updated records to the
+    record store and rewrite those posts' rows in the CSV/XLSX with their Cloudinary URLs."""
+    keys = {job["post_key"] for job in jobs}
+    if not keys:
+        return 0
+    if records_path and os.path.isfile(records_path):
+        from records import RecordStore
+        store = RecordStore(records_path)
+        updated = [r for r in store.latest() if r.post_key in keys]
+        apply_to_records(updated, jobs)
+        store.append(updated)
+    if csv_path and os.path.isfile(csv_path):
+        from exporters import write_csv_and_xlsx, patch_csv_rows, csv_columns, csv_row_key
+        # rows are matched by permalink, or by link + scrape time for posts without one
+        row_keys = {job["post_key"]: csv_row_key(job["permalink"], job["scraped_at"]) for job in jobs}
+        urls = spool.post_urls(keys)
+        patches = {row_keys[k]: {image_column: v, "num_images": len(v)} for k, v in urls.items()}
+        columns = csv_columns(csv_path)
+        write_csv_and_xlsx(patch_csv_rows(csv_path, patches, row_key=csv_row_key), columns, csv_path, xlsx_path,
+                           hyperlink_columns=["source_url", image_column] if hyperlinks else None)
+    return len(keys)